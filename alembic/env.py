@@ -19,10 +19,17 @@ if config.config_file_name is not None:
 # add your model's MetaData object here
 # for 'autogenerate' support
 from core.models import Base
+from core.models.db_helper import shard_urls
+from core.backfill import CHECKPOINT_TABLE
 from core.config import setting
 
 target_metadata = Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    # контрольные точки core/backfill.py создаются самим заполнением, моделей у них нет
+    return not (type_ == "table" and name == CHECKPOINT_TABLE)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,6 +53,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -55,7 +63,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -66,17 +74,24 @@ async def run_async_migrations() -> None:
     and associate a connection with the context.
 
     """
-
-    connectable = async_engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-
-    async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
-
-    await connectable.dispose()
+    # у каждого шарда полная схема; autogenerate сравнивает модели только с основным файлом
+    if getattr(config.cmd_opts, "autogenerate", False):
+        urls = shard_urls(setting.db.url, 1)
+    else:
+        urls = shard_urls(setting.db.url, setting.db.shards)
+
+    for url in urls:
+        connectable = async_engine_from_config(
+            config.get_section(config.config_ini_section, {}),
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
+            url=url,
+        )
+
+        async with connectable.connect() as connection:
+            await connection.run_sync(do_run_migrations)
+
+        await connectable.dispose()
 
 
 def run_migrations_online() -> None:
@@ -1,10 +1,16 @@
 from fastapi import APIRouter
 
 from .products.views import router as products_router
+from .orders.views import router as orders_router
 from .demo_auth.views import router as demo_auth_router
 from .demo_auth.demo_jwt_aut import router as demo_jwt_auth_router
+from .admin.views import router as admin_router
+from .batch.views import router as batch_router
 
 router = APIRouter()
 router.include_router(router=products_router, prefix="/products")
+router.include_router(router=orders_router, prefix="/orders")
 router.include_router(router=demo_auth_router)
 router.include_router(router=demo_jwt_auth_router)
+router.include_router(router=admin_router)
+router.include_router(router=batch_router)
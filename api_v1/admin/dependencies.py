@@ -0,0 +1,23 @@
+import secrets
+
+from fastapi import Header, HTTPException, status
+
+from core.config import setting
+
+
+async def verify_admin_token(
+        admin_token: str | None = Header(default=None, alias="x-admin-token"),
+) -> None:
+    if setting.admin.token is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="admin api disabled",
+        )
+    if admin_token is None or not secrets.compare_digest(
+            admin_token.encode("utf-8"),
+            setting.admin.token.encode("utf-8"),
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="admin token invalid",
+        )
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+
+class ProfilerToggle(BaseModel):
+    enabled: bool
+    sample_rate: float | None = Field(default=None, ge=0, le=1)
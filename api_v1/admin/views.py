@@ -0,0 +1,84 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from core.models import db_helper
+from core.profiler import Profile, profiler
+from core.slow_queries import slow_query_log
+from .dependencies import verify_admin_token
+from .schemas import ProfilerToggle
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(verify_admin_token)],
+)
+
+
+@router.get("/db/pool")
+async def get_pool_stats():
+    return db_helper.pool_stats()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+        order_by: Literal["total_time", "count", "max_time", "last_seen"] = "total_time",
+        limit: int = 50,
+):
+    return {
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "queries": slow_query_log.top(order_by=order_by, limit=limit),
+    }
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries() -> None:
+    slow_query_log.clear()
+
+
+@router.get("/profiler")
+async def get_profiler_state():
+    return {
+        "enabled": profiler.enabled,
+        "sample_rate": profiler.sample_rate,
+        "token_enabled": profiler.secret is not None,
+        "profiles": [profile.summary() for profile in reversed(profiler.profiles)],
+    }
+
+
+@router.put("/profiler")
+async def toggle_profiler(toggle: ProfilerToggle):
+    profiler.enabled = toggle.enabled
+    if toggle.sample_rate is not None:
+        profiler.sample_rate = toggle.sample_rate
+    return {"enabled": profiler.enabled, "sample_rate": profiler.sample_rate}
+
+
+def get_profile(profile_id: int) -> Profile:
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found!",
+        )
+    return profile
+
+
+@router.get("/profiler/{profile_id}")
+async def get_profile_detail(profile_id: int, top: int = 20):
+    profile = get_profile(profile_id)
+    return {
+        **profile.summary(),
+        "top_stacks": [
+            {"stack": stack.split(";"), "samples": count}
+            for stack, count in profile.stacks.most_common(top)
+        ],
+        "sql": profile.sql,
+    }
+
+
+@router.get("/profiler/{profile_id}/collapsed", response_class=PlainTextResponse)
+async def get_profile_collapsed(profile_id: int):
+    # формат flamegraph.pl / speedscope: "кадр;кадр;кадр число_сэмплов"
+    return get_profile(profile_id).collapsed()
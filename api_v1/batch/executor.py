@@ -0,0 +1,171 @@
+"""
+Выполнение подзапросов POST /batch внутри процесса: каждый подзапрос
+передаётся маршрутизатору приложения как ASGI-вызов, без HTTP и middleware.
+
+Подряд идущие GET выполняются одновременно (не больше max_concurrency)
+с одной общей сессией читателя, остальные методы - по одному в исходном
+порядке, поэтому чтения после записи видят её результат. Подпись JWT
+проверяется один раз на пакет. Подзапросы, не успевшие за timeout, получают 504.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+
+from fastapi import Request
+from starlette.exceptions import HTTPException
+
+from core.batch import BatchScope, SharedSession, current_batch
+from core.config import setting
+from core.models import db_helper
+from .schemas import SubRequest
+
+log = logging.getLogger(__name__)
+
+# заголовки пакета, которые не относятся к подзапросам
+NOT_INHERITED_HEADERS = {
+    b"content-length", b"content-type", b"transfer-encoding",
+    b"idempotency-key", b"x-profile-token", b"if-none-match",
+}
+# ключи scope, которые выставляет маршрутизация родительского запроса
+ROUTE_SCOPE_KEYS = {"route", "endpoint", "path_params"}
+
+
+@dataclass
+class SubResponse:
+    status: int = 500
+    headers: list[tuple[bytes, bytes]] = field(default_factory=list)
+    body: list[bytes] = field(default_factory=list)
+
+    @classmethod
+    def error(cls, status: int, detail, headers: dict[str, str] | None = None) -> "SubResponse":
+        return cls(
+            status,
+            [(b"content-type", b"application/json"),
+             *((name.encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items())],
+            [json.dumps({"detail": detail}).encode()],
+        )
+
+    def render(self, request_id: str | None) -> bytes:
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in self.headers
+            if name != b"content-length"
+        }
+        body = b"".join(self.body)
+        if not body:
+            body = b"null"
+        elif not headers.get("content-type", "").startswith("application/json"):
+            body = json.dumps(body.decode("utf-8", "replace")).encode()
+        # JSON-тело подзапроса вставляется как есть, без повторного разбора и сериализации
+        head = json.dumps({"id": request_id, "status": self.status, "headers": headers}).encode()
+        return head[:-1] + b', "body": ' + body + b"}"
+
+
+def _groups(requests: list[SubRequest]) -> list[list[int]]:
+    # подряд идущие GET - одна группа, каждый изменяющий запрос - отдельная
+    groups: list[list[int]] = []
+    for index, sub in enumerate(requests):
+        if sub.method == "GET" and groups and requests[groups[-1][0]].method == "GET":
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+    return groups
+
+
+class BatchExecutor:
+    def __init__(self, request: Request, max_concurrency: int, timeout: float):
+        self.app = request.app.router
+        self.parent = request.scope
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+
+    async def run(self, requests: list[SubRequest]) -> list[SubResponse]:
+        results: list[SubResponse | None] = [None] * len(requests)
+        batch = BatchScope()
+        token = current_batch.set(batch)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            for group in _groups(requests):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                if requests[group[0]].method != "GET":
+                    await self._run_group(requests, group, results, remaining)
+                    continue
+                async with db_helper.read_session_factory() as session:
+                    batch.session = SharedSession(session)
+                    try:
+                        await self._run_group(requests, group, results, remaining)
+                    finally:
+                        batch.session = None
+        finally:
+            current_batch.reset(token)
+        return [result or SubResponse.error(504, "batch timeout exceeded") for result in results]
+
+    async def _run_group(self, requests: list[SubRequest], group: list[int],
+                         results: list[SubResponse | None], timeout: float) -> None:
+        # задачи наследуют контекст: current_batch и статистику SQL пакета
+        tasks = {index: asyncio.create_task(self._call(requests[index])) for index in group}
+        _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for index, task in tasks.items():
+            if not task.cancelled():
+                results[index] = task.result()
+
+    def _scope(self, sub: SubRequest, body: bytes) -> dict:
+        path, _, query = sub.path.partition("?")
+        path = self.parent.get("root_path", "") + setting.api_v1_prefix + path
+        overridden = {name.lower().encode("latin-1") for name in sub.headers}
+        headers = [
+            (name, value) for name, value in self.parent["headers"]
+            if name not in NOT_INHERITED_HEADERS and name not in overridden
+        ]
+        headers += [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in sub.headers.items()]
+        if body:
+            headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        scope = {key: value for key, value in self.parent.items() if key not in ROUTE_SCOPE_KEYS}
+        scope.update(
+            method=sub.method,
+            path=path,
+            raw_path=path.encode(),
+            query_string=query.encode(),
+            headers=headers,
+        )
+        return scope
+
+    async def _call(self, sub: SubRequest) -> SubResponse:
+        if sub.path.partition("?")[0].rstrip("/") == "/batch":
+            return SubResponse.error(400, "nested batch requests are not allowed")
+        body = b"" if sub.body is None else json.dumps(sub.body).encode()
+        response = SubResponse()
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # клиент подзапроса не отключается: ждём до отмены по таймауту пакета
+            await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response.body.append(message.get("body", b""))
+
+        try:
+            async with self.semaphore:
+                await self.app(self._scope(sub, body), receive, send)
+        except HTTPException as exc:
+            # 404 и 405 маршрутизатор выбрасывает, а не отправляет
+            return SubResponse.error(exc.status_code, exc.detail, exc.headers)
+        except Exception:
+            log.exception("Batch sub-request %s %s failed", sub.method, sub.path)
+            return SubResponse.error(500, "Internal Server Error")
+        return response
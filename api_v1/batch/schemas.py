@@ -0,0 +1,17 @@
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field
+
+from core.config import setting
+
+
+class SubRequest(BaseModel):
+    id: str | None = None  # возвращается в ответе как есть
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(pattern=r"^/")  # относительно /api/v1, можно с query: /orders/?limit=5
+    headers: dict[str, str] = {}  # дополняют и переопределяют заголовки пакета
+    body: Any = None  # JSON-тело
+
+
+class BatchRequest(BaseModel):
+    requests: list[SubRequest] = Field(min_length=1, max_length=setting.batch.max_requests)
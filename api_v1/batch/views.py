@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request, Response
+
+from core.config import setting
+from .executor import BatchExecutor
+from .schemas import BatchRequest
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+
+@router.post("")
+async def run_batch(batch: BatchRequest, request: Request) -> Response:
+    executor = BatchExecutor(request, setting.batch.max_concurrency, setting.batch.timeout)
+    responses = await executor.run(batch.requests)
+    body = b'{"responses": [' + b", ".join(
+        response.render(sub.id) for sub, response in zip(batch.requests, responses)
+    ) + b"]}"
+    return Response(body, media_type="application/json")
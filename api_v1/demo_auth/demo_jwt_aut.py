@@ -1,4 +1,5 @@
 from datetime import timedelta
+from functools import cache
 
 from fastapi import APIRouter, Depends, Form, HTTPException, status
 from fastapi.security import (HTTPBearer, HTTPAuthorizationCredentials,
@@ -8,7 +9,9 @@ from pydantic import BaseModel
 
 from users.schemas import UserSchema
 from auth import utils as auth_utils
+from core.batch import batch_cached
 from core.config import setting
+from core.threadpool import run_sync
 
 
 class TokenInfo(BaseModel):
@@ -26,24 +29,36 @@ router = APIRouter(
     dependencies=[Depends(http_bearer)]
 )
 
-john = UserSchema(
-    username="john",
-    password=auth_utils.hash_password("qwerty"),
-    email="john@example.com",
-)
 
-sam = UserSchema(
-    username="sam",
-    password=auth_utils.hash_password("secret"),
-)
+# хеширование bcrypt дорогое, поэтому демо-пользователи создаются
+# при первом обращении, а не при импорте модуля
+@cache
+def get_user_db() -> dict[str, UserSchema]:
+    john = UserSchema(
+        username="john",
+        password=auth_utils.hash_password("qwerty"),
+        email="john@example.com",
+    )
+
+    sam = UserSchema(
+        username="sam",
+        password=auth_utils.hash_password("secret"),
+    )
+
+    return {
+        john.username: john,
+        sam.username: sam,
+    }
+
 
-user_db: dict[str, UserSchema] = {
-    john.username: john,
-    sam.username: sam,
-}
+async def users_db() -> dict[str, UserSchema]:
+    # первое обращение хеширует пароли - в пуле потоков, дальше из кэша без потока
+    if get_user_db.cache_info().currsize:
+        return get_user_db()
+    return await run_sync(get_user_db)
 
 
-def validate_auth_user(
+async def validate_auth_user(
         username: str = Form(),
         password: str = Form(),
 ):
@@ -52,10 +67,12 @@ def validate_auth_user(
         detail="Invalid username or password",
     )
 
-    if not (user := user_db.get(username)):
+    if not (user := (await users_db()).get(username)):
         raise unauthed_exc
 
-    if not auth_utils.validate_password(
+    # bcrypt намеренно медленный - единственная часть проверки, уходящая в поток
+    if not await run_sync(
+            auth_utils.validate_password,
             password=password,
             hashed_password=user.password,
     ):
@@ -70,13 +87,14 @@ def validate_auth_user(
     return user
 
 
-def get_current_token_payload(
+async def get_current_token_payload(
         token: str = Depends(oauth2_schema),
         # credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
 ) -> dict:
     # token = credentials.credentials
     try:
-        payload = auth_utils.decode_jwt(token=token)
+        # подзапросы одного пакета проверяют подпись один раз
+        payload = batch_cached(("jwt", token), lambda: auth_utils.decode_jwt(token=token))
     except InvalidTokenError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,7 +104,7 @@ def get_current_token_payload(
         return payload
 
 
-def get_current_auth_user(
+async def get_current_auth_user(
         payload: dict = Depends(get_current_token_payload),
 ) -> UserSchema:
     token_type: str = payload.get(TOKEN_TYPE_FIELD)
@@ -96,7 +114,7 @@ def get_current_auth_user(
             detail=f"invalid token type {token_type!r} expected {ACCESS_TOKEN_TYPE}",
         )
     username: str = payload.get("sub")
-    if not (user := user_db.get(username)):
+    if not (user := (await users_db()).get(username)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="token invalid"
@@ -104,7 +122,7 @@ def get_current_auth_user(
     return user
 
 
-def get_current_auth_user_for_refresh(
+async def get_current_auth_user_for_refresh(
         payload: dict = Depends(get_current_token_payload),
 ) -> UserSchema:
     token_type: str = payload.get(TOKEN_TYPE_FIELD)
@@ -114,7 +132,7 @@ def get_current_auth_user_for_refresh(
             detail=f"invalid token type {token_type!r} expected {REFRESH_TOKEN_TYPE}",
         )
     username: str = payload.get("sub")
-    if not (user := user_db.get(username)):
+    if not (user := (await users_db()).get(username)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="token invalid"
@@ -122,7 +140,7 @@ def get_current_auth_user_for_refresh(
     return user
 
 
-def get_current_active_auth_user(
+async def get_current_active_auth_user(
         user: UserSchema = Depends(get_current_auth_user)
 ):
     if not user.active:
@@ -181,6 +199,7 @@ def create_refresh_token(user: UserSchema) -> str:
     return token
 
 
+# выпуск токенов остаётся def: подпись RSA заметно дороже перехода в поток
 @router.post("/login", response_model=TokenInfo)
 def auth_user_issue_jwt(
         user: UserSchema = Depends(validate_auth_user),
@@ -194,7 +213,7 @@ def auth_user_issue_jwt(
 
 
 @router.get("/users/me/")
-def auth_user_check_self_info(
+async def auth_user_check_self_info(
         payload: dict = Depends(get_current_token_payload),
         user: UserSchema = Depends(get_current_active_auth_user)
 ):
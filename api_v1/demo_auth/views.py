@@ -8,11 +8,13 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 router = APIRouter(prefix="/demo-auth", tags=["Demo Auth"])
 
+# маршруты и зависимости - async def: работа в них короче перехода в пул потоков
+
 security = HTTPBasic()
 
 
 @router.get("/basic-auth/")
-def demo_basic_auth_credentials(
+async def demo_basic_auth_credentials(
         credentials: Annotated[HTTPBasicCredentials, Depends(security)],
 ):
     return {
@@ -34,7 +36,7 @@ static_auth_token_username = {
 }
 
 
-def get_auth_user_username(
+async def get_auth_user_username(
         credentials: Annotated[HTTPBasicCredentials, Depends(security)],
 ) -> str:
     unauthed_exe = HTTPException(
@@ -57,7 +59,7 @@ def get_auth_user_username(
     return credentials.username
 
 
-def get_username_by_static_auth_token(
+async def get_username_by_static_auth_token(
         static_token: str = Header(alias="x-auth-token"),
 ) -> str:
     if username := static_auth_token_username.get(static_token):
@@ -69,7 +71,7 @@ def get_username_by_static_auth_token(
 
 
 @router.get("/basic-auth-username/")
-def demo_basic_auth_username(
+async def demo_basic_auth_username(
         auth_username: str = Depends(get_auth_user_username),
 ):
     return {
@@ -79,7 +81,7 @@ def demo_basic_auth_username(
 
 
 @router.get("/some-http-header-auth/")
-def demo_auth_some_http_header(
+async def demo_auth_some_http_header(
         username: str = Depends(get_username_by_static_auth_token),
 ):
     return {
@@ -96,7 +98,7 @@ def generation_session_id() -> str:
     return uuid.uuid4().hex
 
 
-def get_session_data(
+async def get_session_data(
         session_id: str = Cookie(alias=COOKIE_SESSION_ID_KEY),
 ) -> dict:
     if session_id not in COOKIES:
@@ -108,7 +110,7 @@ def get_session_data(
 
 
 @router.post("/login-cookie/")
-def demo_auth_login_set_cookie(
+async def demo_auth_login_set_cookie(
         response: Response,
         auth_username: str = Depends(get_auth_user_username),
 ):
@@ -124,7 +126,7 @@ def demo_auth_login_set_cookie(
 
 
 @router.get("/check-cookie/")
-def demo_auth_check_cookie(
+async def demo_auth_check_cookie(
         user_session_data: dict = Depends(get_session_data)
 ):
     username = user_session_data["username"]
@@ -135,7 +137,7 @@ def demo_auth_check_cookie(
 
 
 @router.get("/logout-cookie/")
-def demo_auth_logout_cookie(
+async def demo_auth_logout_cookie(
         response: Response,
         session_id: str = Cookie(alias=COOKIE_SESSION_ID_KEY),
         user_session_data: dict = Depends(get_session_data)
@@ -0,0 +1,152 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from api_v1.products.crud import reserve_on_shard, reserve_stock
+from api_v1.products.shards import with_total_stock
+from core.archive import archived_order_lines, archived_orders
+from core.models import Order, OrderImport, OrderImportError, OrderProductAssociation, Product, db_helper
+from core.models.db_helper import next_shard_id
+from .schemas import OrderCreate
+
+def _with_products(stmt):
+    return stmt.options(selectinload(Order.products_details))
+
+
+async def attach_products(session: AsyncSession, orders: list[Order]) -> list[Order]:
+    # товары всех строк - один IN (...) в сессии вызывающего, без второго
+    # соединения из пула читателей: запрос уже держит одно, и при занятом
+    # пуле ожидание второго не кончилось бы. Сессия - шарда 0, где лежит каталог;
+    # сессий других шардов вызывающий держать не должен - из них читаются доли остатков
+    details = [detail for order in orders for detail in order.products_details]
+    product_ids = {detail.product_id for detail in details}
+    if not product_ids:
+        return orders
+    products = await with_total_stock(list(await session.scalars(select(Product).where(Product.id.in_(product_ids)))),
+                                      session)
+    by_id = {product.id: product for product in products}
+    for detail in details:
+        set_committed_value(detail, "product", by_id.get(detail.product_id))
+    return orders
+
+
+async def get_order_page(session: AsyncSession, after_id: int = 0, limit: int = 50) -> list[Order]:
+    # keyset-пагинация по id вместо OFFSET; товары строк не загружаются
+    stmt = _with_products(select(Order)).where(Order.id > after_id).order_by(Order.id).limit(limit)
+    result: Result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def get_orders(session: AsyncSession, after_id: int = 0, limit: int = 50) -> list[Order]:
+    return await attach_products(session, await get_order_page(session=session, after_id=after_id, limit=limit))
+
+
+async def get_order(session: AsyncSession, order_id: int, load_products: bool = True) -> Order | None:
+    stmt = _with_products(select(Order)).where(Order.id == order_id)
+    order = await session.scalar(stmt)
+    if order is not None and load_products:
+        await attach_products(session, [order])
+    return order
+
+
+async def get_archived_order(session: AsyncSession, order_id: int) -> Order | None:
+    # заказ из архива собирается в несохраняемые объекты Order: в сессию
+    # они не попадают, а схема ответа остаётся той же
+    row = (await session.execute(select(archived_orders).where(archived_orders.c.id == order_id))).first()
+    if row is None:
+        return None
+    lines = await session.execute(
+        select(archived_order_lines)
+        .where(archived_order_lines.c.orders_id == order_id)
+        .order_by(archived_order_lines.c.id)
+    )
+    order = Order(**row._mapping)
+    set_committed_value(
+        order,
+        "products_details",
+        [OrderProductAssociation(**line._mapping) for line in lines],
+    )
+    await attach_products(session, [order])
+    return order
+
+
+def _quantities(order_in: OrderCreate) -> dict[int, int]:
+    quantities: dict[int, int] = {}
+    for line in order_in.products:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.count
+    return quantities
+
+
+async def insert_order(session: AsyncSession, promocode: str | None, quantities: dict[int, int],
+                       prices: dict[int, int], order_id: int | None = None) -> Order:
+    order = Order(id=order_id, promocode=promocode)
+    order.products_details = [
+        OrderProductAssociation(product_id=product_id, count=count, unit_price=prices[product_id])
+        for product_id, count in quantities.items()
+    ]
+    session.add(order)
+    await session.flush()
+    return order
+
+
+async def create_order(session: AsyncSession, order_in: OrderCreate, shard: int = 0) -> Order:
+    quantities = _quantities(order_in)
+    # все строки резервируются одним запросом; цена берётся из его RETURNING
+    reserved = await reserve_stock(session=session, quantities=quantities)
+    prices = {product_id: row.price for product_id, row in reserved.items()}
+    # при шардах id заказа указывает на его шард: id % shards == shard
+    order_id = await next_shard_id(session, Order.id, shard, len(db_helper.shards)) if db_helper.sharded else None
+    return await insert_order(session, order_in.promocode, quantities, prices, order_id)
+
+
+async def place_order(order_in: OrderCreate) -> Order:
+    if db_helper.sharded:
+        # списание и заказ - одна транзакция в одном шарде, см. api_v1/products/shards.py
+        order = await reserve_on_shard(
+            _quantities(order_in),
+            lambda session, shard: create_order(session=session, order_in=order_in, shard=shard),
+        )
+        async with db_helper.read_session_factory() as session:
+            await attach_products(session, [order])
+        return order
+
+    async def operation(session: AsyncSession) -> Order:
+        order = await create_order(session=session, order_in=order_in)
+        await attach_products(session, [order])
+        return order
+
+    # короткая операция в очереди писателя, как у /products/{id}/reserve/
+    return await db_helper.run_write(operation)
+
+
+async def get_sharded_orders(session: AsyncSession, after_id: int = 0, limit: int = 50) -> list[Order]:
+    # каждый шард отдаёт первые limit своих заказов после after_id,
+    # общая страница - первые limit из их слияния по id. session - сессия
+    # запроса в шарде 0: она же читает его страницу и товары
+    pages = await db_helper.fan_out(
+        lambda shard_session: get_order_page(session=shard_session, after_id=after_id, limit=limit),
+        session=session,
+    )
+    orders = list(islice(heapq.merge(*pages, key=attrgetter("id")), limit))
+    return await attach_products(session, orders)
+
+
+async def get_order_import(session: AsyncSession, job_id: int) -> OrderImport | None:
+    return await session.get(OrderImport, job_id)
+
+
+async def get_order_import_errors(session: AsyncSession, job_id: int,
+                                  after_line: int = 0, limit: int = 100) -> list[OrderImportError]:
+    stmt = (
+        select(OrderImportError)
+        .where(OrderImportError.import_id == job_id, OrderImportError.line > after_line)
+        .order_by(OrderImportError.line)
+        .limit(limit)
+    )
+    return list(await session.scalars(stmt))
@@ -0,0 +1,42 @@
+from typing import Annotated
+from fastapi import Path, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import db_helper, Order, OrderImport
+from . import crud
+
+
+async def order_by_id(order_id: Annotated[int, Path],
+                      session: AsyncSession = Depends(db_helper.read_session)
+                      ) -> Order:
+    shard = db_helper.shard_for(order_id)
+    if shard is db_helper:
+        order = await crud.get_order(session=session, order_id=order_id)
+    else:
+        # заказ читается только из своего шарда; товары - сессией запроса в шарде 0
+        # после закрытия сессии шарда: доли остатков читаются и из него
+        async with shard.read_session_factory() as shard_session:
+            order = await crud.get_order(session=shard_session, order_id=order_id, load_products=False)
+        if order is not None:
+            await crud.attach_products(session, [order])
+    if order is None and setting.archive.enabled:
+        order = await crud.get_archived_order(session=session, order_id=order_id)
+    if order:
+        return order
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Order {order_id} not found!",
+    )
+
+
+async def order_import_by_id(job_id: Annotated[int, Path],
+                             session: AsyncSession = Depends(db_helper.read_session)
+                             ) -> OrderImport:
+    job = await crud.get_order_import(session=session, job_id=job_id)
+    if job:
+        return job
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Order import {job_id} not found!",
+    )
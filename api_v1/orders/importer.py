@@ -0,0 +1,296 @@
+"""
+Импорт заказов из файла: POST /orders/imports/.
+
+Тело запроса по мере получения пишется во временный файл, ответ 202 с id
+задачи приходит сразу после загрузки. Задача читает файл потоково (разбор -
+в пуле потоков) и обрабатывает его порциями по chunk_size заказов: цены
+и остатки всех товаров порции - один SELECT, заказы и их строки - вставка
+пачкой, остатки - один UPDATE. Порция - одна транзакция в очереди писателя
+вместе со счётчиками задачи и ошибками строк, поэтому GET /orders/imports/{id}/
+показывает ровно то, что уже зафиксировано. В памяти - не больше одной порции.
+
+Форматы:
+- ndjson: строка - заказ в формате POST /orders/ ({"promocode", "products"});
+- csv: строка - позиция заказа, заголовок order_ref,product_id,count,promocode
+  (обязателен только product_id); подряд идущие строки с одним order_ref -
+  один заказ, пустой order_ref - заказ из одной строки.
+
+Заказ с ошибкой (неверная строка, неизвестный товар, нехватка остатка)
+пропускается целиком, в ошибках - номер его первой строки. Задачу выполняет
+воркер, принявший файл: при остановке воркера она помечается interrupted,
+после падения процесса остаётся running.
+"""
+import asyncio
+import contextvars
+import csv
+import io
+import logging
+import os
+import tempfile
+from datetime import datetime
+from itertools import groupby, islice
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api_v1.products.changes import record_changes
+from api_v1.products.snapshot import refresh_stock_after_commit
+from core.config import setting
+from core.models import Order, OrderImport, OrderImportError, OrderProductAssociation, Product, db_helper
+from core.threadpool import run_sync
+from .schemas import OrderCreate, OrderImportJob, OrderLine
+
+log = logging.getLogger(__name__)
+
+SPOOL_BUFFER = 1024 ** 2  # тело пишется в файл блоками не меньше этого
+
+# (первая строка, последняя строка, заказ или текст ошибки)
+ParsedOrder = tuple[int, int, OrderCreate | str]
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        (".".join(map(str, error["loc"])) + ": " if error["loc"] else "") + error["msg"]
+        for error in exc.errors()
+    )
+
+
+def ndjson_orders(file: BinaryIO) -> Iterator[ParsedOrder]:
+    for number, raw in enumerate(file, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield number, number, OrderCreate.model_validate_json(raw)
+        except ValidationError as exc:
+            yield number, number, _describe(exc)
+
+
+def csv_orders(file: BinaryIO) -> Iterator[ParsedOrder]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if "product_id" not in (reader.fieldnames or ()):
+            raise ImportFormatError("CSV header must contain product_id")
+        # line_num - последняя физическая строка записи (в значениях бывают переводы строк)
+        rows = ((reader.line_num, row) for row in reader)
+        # пустой order_ref - отдельный заказ: ключ группы уникален
+        for _, group in groupby(rows, key=lambda item: item[1].get("order_ref") or ("", item[0])):
+            group = list(group)
+            first, last = group[0][0], group[-1][0]
+            try:
+                order = OrderCreate(
+                    promocode=group[0][1].get("promocode") or None,
+                    products=[OrderLine(product_id=row["product_id"], count=row.get("count") or 1)
+                              for _, row in group],
+                )
+            except ValidationError as exc:
+                yield first, last, _describe(exc)
+            else:
+                yield first, last, order
+    finally:
+        # иначе сборка обёртки закроет файл, у которого ещё спрашивают позицию
+        text.detach()
+
+
+PARSERS = {"csv": csv_orders, "ndjson": ndjson_orders}
+
+
+class OrderImporter:
+    def __init__(self, spool_dir: Path | None, max_bytes: int, chunk_size: int, max_errors: int, pause: float):
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.pause = pause
+        self.orders_created = 0
+        self.orders_rejected = 0
+        self._running: dict[int, asyncio.Task] = {}
+
+    async def spool(self, chunks: AsyncIterator[bytes]) -> tuple[str, int]:
+        """Записать тело запроса во временный файл; (путь, размер)"""
+        file = await run_sync(tempfile.NamedTemporaryFile, dir=self.spool_dir, suffix=".import", delete=False)
+        size = 0
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ImportTooLarge
+                buffer += chunk
+                if len(buffer) >= SPOOL_BUFFER:
+                    await run_sync(file.write, bytes(buffer))
+                    buffer.clear()
+            await run_sync(file.write, bytes(buffer))
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+        file.close()
+        return file.name, size
+
+    async def start(self, fmt: str, path: str, size: int) -> OrderImportJob:
+        async def operation(session: AsyncSession) -> OrderImportJob:
+            job = OrderImport(format=fmt, bytes_total=size)
+            session.add(job)
+            await session.flush()
+            return OrderImportJob.model_validate(job)
+
+        try:
+            job = await db_helper.run_write(operation)
+        except BaseException:
+            os.unlink(path)
+            raise
+        # задача переживает запрос - пустой контекст
+        task = asyncio.get_running_loop().create_task(self._run(job.id, fmt, path), context=contextvars.Context())
+        self._running[job.id] = task
+        task.add_done_callback(lambda _: self._running.pop(job.id, None))
+        return job
+
+    async def _run(self, job_id: int, fmt: str, path: str) -> None:
+        try:
+            with open(path, "rb") as file:
+                orders = PARSERS[fmt](file)
+                while chunk := await run_sync(lambda: list(islice(orders, self.chunk_size))):
+                    await self.import_chunk(job_id, chunk, file.tell())
+                    if self.pause:
+                        await asyncio.sleep(self.pause)
+        except ImportFormatError as exc:
+            await self._finish(job_id, "failed", str(exc))
+        except Exception as exc:
+            log.exception("Order import %s failed", job_id)
+            await self._finish(job_id, "failed", str(exc))
+        else:
+            await self._finish(job_id, "done")
+        finally:
+            os.unlink(path)
+
+    async def import_chunk(self, job_id: int, chunk: list[ParsedOrder], bytes_done: int) -> None:
+        async def operation(session: AsyncSession) -> tuple[int, int]:
+            errors = [(first, order) for first, _, order in chunk if isinstance(order, str)]
+            orders = []
+            for first, _, order in chunk:
+                if isinstance(order, str):
+                    continue
+                quantities: dict[int, int] = {}
+                for line in order.products:
+                    quantities[line.product_id] = quantities.get(line.product_id, 0) + line.count
+                orders.append((first, order.promocode, quantities))
+
+            # цены и остатки всей порции - один запрос; очередь писателя держит
+            # транзакцию, поэтому остатки не меняются до её фиксации
+            product_ids = {product_id for _, _, quantities in orders for product_id in quantities}
+            rows = await session.execute(
+                select(Product.id, Product.price, Product.stock).where(Product.id.in_(product_ids))
+            )
+            prices, stock = {}, {}
+            for product_id, price, left in rows:
+                prices[product_id] = price
+                stock[product_id] = left
+
+            accepted = []
+            for first, promocode, quantities in orders:
+                missing = sorted(quantities.keys() - prices.keys())
+                if missing:
+                    errors.append((first, f"Products {missing} not found"))
+                    continue
+                short = sorted(product_id for product_id, count in quantities.items() if stock[product_id] < count)
+                if short:
+                    errors.append((first, f"Not enough stock for products {short}"))
+                    continue
+                for product_id, count in quantities.items():
+                    stock[product_id] -= count
+                accepted.append((promocode, quantities))
+
+            if accepted:
+                # id заказов назначаются явно, как их выдал бы SQLite (max + 1):
+                # транзакция писателя исключает гонку, а вставка идёт пачкой,
+                # без построчного RETURNING
+                last_id = await session.scalar(select(func.max(Order.id))) or 0
+                order_ids = range(last_id + 1, last_id + 1 + len(accepted))
+                await session.execute(insert(Order), [
+                    {"id": order_id, "promocode": promocode}
+                    for order_id, (promocode, _) in zip(order_ids, accepted)
+                ])
+                await session.execute(insert(OrderProductAssociation), [
+                    {"orders_id": order_id, "product_id": product_id, "count": count,
+                     "unit_price": prices[product_id]}
+                    for order_id, (_, quantities) in zip(order_ids, accepted)
+                    for product_id, count in quantities.items()
+                ])
+                touched = sorted({product_id for _, quantities in accepted for product_id in quantities})
+                levels = [{"id": product_id, "stock": stock[product_id]} for product_id in touched]
+                await session.execute(update(Product), levels)
+                refresh_stock_after_commit(session)
+                await record_changes(session, "stock", levels)
+
+            # сохраняются первые max_errors ошибок задачи, остальные только считаются
+            errors.sort()
+            stored = await session.scalar(select(OrderImport.errors_count).where(OrderImport.id == job_id))
+            keep = errors[:max(0, self.max_errors - stored)]
+            if keep:
+                await session.execute(insert(OrderImportError), [
+                    {"import_id": job_id, "line": line, "message": message} for line, message in keep
+                ])
+            await session.execute(
+                update(OrderImport)
+                .where(OrderImport.id == job_id)
+                .values(
+                    bytes_done=bytes_done,
+                    lines_done=chunk[-1][1],
+                    orders_created=OrderImport.orders_created + len(accepted),
+                    errors_count=OrderImport.errors_count + len(errors),
+                )
+            )
+            return len(accepted), len(errors)
+
+        created, rejected = await db_helper.run_write(operation)
+        self.orders_created += created
+        self.orders_rejected += rejected
+
+    async def _finish(self, job_id: int, status: str, error: str | None = None) -> None:
+        async def operation(session: AsyncSession) -> None:
+            values = {"status": status, "error": error, "finished_at": datetime.now()}
+            if status == "done":
+                values["bytes_done"] = OrderImport.bytes_total
+            await session.execute(update(OrderImport).where(OrderImport.id == job_id).values(**values))
+
+        await db_helper.run_write(operation)
+
+    async def stop(self) -> None:
+        running = dict(self._running)
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+        for job_id in running:
+            await self._finish(job_id, "interrupted")
+
+    def metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        return [
+            "# TYPE order_imports_running gauge",
+            f"order_imports_running {len(self._running)}",
+            "# TYPE order_imports_orders_created_total counter",
+            f"order_imports_orders_created_total {self.orders_created}",
+            "# TYPE order_imports_orders_rejected_total counter",
+            f"order_imports_orders_rejected_total {self.orders_rejected}",
+        ]
+
+
+order_importer = OrderImporter(
+    spool_dir=setting.order_import.spool_dir,
+    max_bytes=setting.order_import.max_bytes,
+    chunk_size=setting.order_import.chunk_size,
+    max_errors=setting.order_import.max_errors,
+    pause=setting.order_import.pause,
+)
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from api_v1.products.schemas import Product
+
+
+class OrderProductDetail(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    product_id: int
+    count: int
+    unit_price: int
+    product: Product
+
+
+class Order(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    promocode: str | None
+    created_at: datetime
+    products_details: list[OrderProductDetail]
+
+
+class OrderLine(BaseModel):
+    product_id: int
+    count: int = Field(default=1, gt=0)
+
+
+class OrderCreate(BaseModel):
+    promocode: str | None = None
+    products: list[OrderLine] = Field(min_length=1)
+
+
+class OrderImportJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    format: str
+    status: str
+    bytes_total: int
+    bytes_done: int
+    lines_done: int
+    orders_created: int
+    errors_count: int
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+class OrderImportLineError(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    line: int
+    message: str
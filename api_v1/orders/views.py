@@ -0,0 +1,92 @@
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from api_v1.products.crud import InsufficientStock
+from core.models import db_helper
+from .dependencies import order_by_id, order_import_by_id
+from .importer import ImportTooLarge, order_importer
+from .schemas import Order, OrderCreate, OrderImportJob, OrderImportLineError
+
+router = APIRouter(tags=["Orders"])
+
+IMPORT_CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+
+
+@router.get("/", response_model=list[Order])
+async def get_orders(
+        after_id: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1, le=500)] = 50,
+        session: AsyncSession = Depends(db_helper.read_session),
+):
+    if db_helper.sharded:
+        return await crud.get_sharded_orders(session=session, after_id=after_id, limit=limit)
+    return await crud.get_orders(session=session, after_id=after_id, limit=limit)
+
+
+@router.post("/imports/", response_model=OrderImportJob, status_code=status.HTTP_202_ACCEPTED)
+async def import_orders(
+        request: Request,
+        response: Response,
+        format: Annotated[Literal["csv", "ndjson"] | None, Query()] = None,
+):
+    # тело не разбирается FastAPI: файл идёт на диск по частям, разбор - в фоне
+    if db_helper.sharded:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Order import is not supported with several database shards",
+        )
+    fmt = format or IMPORT_CONTENT_TYPES.get(request.headers.get("content-type", "").split(";")[0].strip())
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Send one of {sorted(IMPORT_CONTENT_TYPES)} or pass ?format=csv|ndjson",
+        )
+    try:
+        path, size = await order_importer.spool(request.stream())
+    except ImportTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Import files are limited to {order_importer.max_bytes} bytes",
+        )
+    job = await order_importer.start(fmt, path, size)
+    response.headers["location"] = request.url_for("get_order_import", job_id=job.id).path
+    return job
+
+
+@router.get("/imports/{job_id}/", response_model=OrderImportJob)
+async def get_order_import(job: OrderImportJob = Depends(order_import_by_id)):
+    return job
+
+
+@router.get("/imports/{job_id}/errors/", response_model=list[OrderImportLineError])
+async def get_order_import_errors(
+        job: OrderImportJob = Depends(order_import_by_id),
+        after_line: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+        session: AsyncSession = Depends(db_helper.read_session),
+):
+    return await crud.get_order_import_errors(session=session, job_id=job.id, after_line=after_line, limit=limit)
+
+
+@router.get("/{order_id}/", response_model=Order)
+async def get_order(order: Order = Depends(order_by_id)):
+    return order
+
+
+@router.post("/", response_model=Order, status_code=status.HTTP_201_CREATED)
+async def create_order(order_in: OrderCreate):
+    try:
+        return await crud.place_order(order_in=order_in)
+    except InsufficientStock as exc:
+        if exc.missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Products {sorted(exc.missing)} not found!",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Not enough stock", "available": exc.available},
+        )
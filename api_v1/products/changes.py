@@ -0,0 +1,202 @@
+"""
+Поток изменений товаров.
+
+crud пишет событие в таблицу product_changes в той же транзакции, что и само
+изменение (transactional outbox): событие есть тогда и только тогда, когда
+изменение зафиксировано. GET /products/changes отдаёт события как Server-Sent
+Events; id события - курсор, с которого клиент продолжает после обрыва
+(заголовок Last-Event-ID или ?since=). Если нужные события уже удалены
+по retention_hours, клиент получает событие reset и должен перечитать список.
+
+Таблицу опрашивает одна задача на воркер, новые события раздаются всем
+подписчикам из памяти. Изменения в этом же воркере будят её сразу после
+фиксации, из других воркеров - не позже poll_interval.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import ProductChange, db_helper
+from core.models.db_helper import on_commit
+
+log = logging.getLogger(__name__)
+
+PURGE_BATCH = 100
+RESET_EVENT = b"event: reset\ndata: {}\n\n"
+PING = b": ping\n\n"
+
+
+def render_event(change: ProductChange) -> bytes:
+    return f"id: {change.id}\nevent: {change.op}\ndata: {change.payload}\n\n".encode()
+
+
+class Subscription:
+    def __init__(self, queue_size: int, position: int):
+        # (событие, его SSE-представление); None - подписчик отстал и отключён
+        self.queue: asyncio.Queue[tuple[ProductChange, bytes] | None] = asyncio.Queue(queue_size)
+        self.position = position  # события с большим id придут через очередь
+
+
+class ChangeFeed:
+    def __init__(self, poll_interval: float, batch_size: int, queue_size: int, keepalive: float,
+                 retention_hours: int):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.retention = timedelta(hours=retention_hours)
+        self.polls = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._subscribers: set[Subscription] = set()
+        self._last_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    async def notify(self) -> None:
+        # вызывается после фиксации изменения в этом воркере
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def fetch(self, after: int, limit: int) -> list[ProductChange]:
+        async with db_helper.read_session_factory() as session:
+            return list(await session.scalars(
+                select(ProductChange).where(ProductChange.id > after).order_by(ProductChange.id).limit(limit)
+            ))
+
+    async def subscribe(self) -> Subscription:
+        if self._last_id is None:
+            async with db_helper.read_session_factory() as session:
+                last_id = await session.scalar(select(func.max(ProductChange.id))) or 0
+            if self._last_id is None:
+                self._last_id = last_id
+        subscription = Subscription(self.queue_size, self._last_id)
+        self._subscribers.add(subscription)
+        if self._task is None:
+            # опрос не относится ни к одному запросу - пустой контекст
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._poll(), context=contextvars.Context())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    async def _poll(self) -> None:
+        # работает, пока есть подписчики
+        try:
+            while self._subscribers:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    changes = await self.fetch(self._last_id, self.batch_size)
+                except Exception:
+                    log.exception("Polling product changes failed")
+                    continue
+                self.polls += 1
+                for change in changes:
+                    self._publish(change, render_event(change))
+                    self._last_id = change.id
+                if len(changes) == self.batch_size:
+                    self._wakeup.set()  # в таблице есть ещё
+        finally:
+            self._task = None
+            self._last_id = None
+
+    def _publish(self, change: ProductChange, event: bytes) -> None:
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait((change, event))
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # отставший подписчик отключается и догонит по Last-Event-ID из таблицы
+                self._subscribers.discard(subscription)
+                self.dropped += 1
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    async def stream(self, since: int | None) -> AsyncIterator[bytes]:
+        subscription = await self.subscribe()
+        try:
+            sent = subscription.position if since is None else since
+            # догоняющее чтение из таблицы до позиции, с которой идут живые события
+            while sent < subscription.position:
+                changes = await self.fetch(sent, self.batch_size)
+                # id без пропусков (AUTOINCREMENT), пропуск - события удалены очисткой
+                if not changes or changes[0].id != sent + 1:
+                    yield RESET_EVENT
+                for change in changes:
+                    if change.id > subscription.position:
+                        break
+                    yield render_event(change)
+                sent = changes[-1].id if changes else subscription.position
+            sent = max(sent, subscription.position)
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), self.keepalive)
+                except TimeoutError:
+                    yield PING
+                    continue
+                if item is None:
+                    return
+                change, event = item
+                if change.id > sent:
+                    sent = change.id
+                    yield event
+        finally:
+            self.unsubscribe(subscription)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        return [
+            "# TYPE product_changes_subscribers gauge",
+            f"product_changes_subscribers {len(self._subscribers)}",
+            "# TYPE product_changes_polls_total counter",
+            f"product_changes_polls_total {self.polls}",
+            "# TYPE product_changes_delivered_total counter",
+            f"product_changes_delivered_total {self.delivered}",
+            "# TYPE product_changes_dropped_subscribers_total counter",
+            f"product_changes_dropped_subscribers_total {self.dropped}",
+        ]
+
+
+change_feed = ChangeFeed(
+    poll_interval=setting.changes.poll_interval,
+    batch_size=setting.changes.batch_size,
+    queue_size=setting.changes.queue_size,
+    keepalive=setting.changes.keepalive,
+    retention_hours=setting.changes.retention_hours,
+)
+
+
+async def record_changes(session: AsyncSession, op: str, payloads: list[dict]) -> None:
+    """Записать события в транзакцию session; в каждом payload есть id товара"""
+    now = datetime.now()
+    # попутно удаляется порция устаревших событий - отдельная чистка не нужна
+    expired = (
+        select(ProductChange.id)
+        .where(ProductChange.created_at < now - change_feed.retention)
+        .order_by(ProductChange.id)
+        .limit(PURGE_BATCH)
+    )
+    await session.execute(delete(ProductChange).where(ProductChange.id.in_(expired)))
+    await session.execute(insert(ProductChange), [
+        {"product_id": payload["id"], "op": op, "payload": json.dumps(payload), "created_at": now}
+        for payload in payloads
+    ])
+    on_commit(session, change_feed.notify)
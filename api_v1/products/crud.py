@@ -1,9 +1,18 @@
-from sqlalchemy import select
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy import Row, case, select, update
 from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.models import Product
-from .schemas import ProductCreate, ProductUpdate, ProductUpdatePartial
+from core.models import Product, db_helper
+from .changes import record_changes
+from .schemas import Product as ProductSchema, ProductCreate, ProductUpdate, ProductUpdatePartial
+from .shards import mirror_after_commit, move_stock, next_shard, stock_shares, with_total_stock
+from .snapshot import rebuild_after_commit, refresh_stock_after_commit
+
+T = TypeVar("T")
+
+MOVE_ATTEMPTS = 3  # переносов остатка на одно списание при шардах
 
 
 async def get_products(session: AsyncSession) -> list[Product]:
@@ -13,6 +22,13 @@ async def get_products(session: AsyncSession) -> list[Product]:
     return list(products)
 
 
+async def warm_up(session: AsyncSession) -> None:
+    # прогрев кэша компиляции для get_products и get_product без выборки всех строк
+    result = await session.stream(select(Product).order_by(Product.id))
+    await result.close()
+    await session.get(Product, 0)
+
+
 async def get_product(session: AsyncSession, product_id: int) -> Product | None:
     return await session.get(Product, product_id)
 
@@ -20,7 +36,10 @@ async def get_product(session: AsyncSession, product_id: int) -> Product | None:
 async def create_product(session: AsyncSession, product_in: ProductCreate) -> Product:
     product: Product = Product(**product_in.model_dump())
     session.add(product)
-    await session.commit()
+    rebuild_after_commit(session)
+    await session.flush()  # транзакцию фиксирует write_session
+    mirror_after_commit(session, [product.id])
+    await record_changes(session, "created", [ProductSchema.model_validate(product).model_dump(mode="json")])
     # await session.refresh(product)
     return product
 
@@ -31,11 +50,92 @@ async def update_product(session: AsyncSession,
                          partial: bool = False) -> Product:
     for name, value in product_update.model_dump(exclude_unset=partial).items():  # Преобразовываем объект в словарь
         setattr(product, name, value)
-    await session.commit()
+    rebuild_after_commit(session)
+    mirror_after_commit(session, [product.id])
+    await session.flush()
+    await with_total_stock([product], session)
+    await record_changes(session, "updated", [ProductSchema.model_validate(product).model_dump(mode="json")])
     return product
 
 
 async def delete_product(session: AsyncSession,
                          product: Product) -> None:
     await session.delete(product)
-    await session.commit()
+    rebuild_after_commit(session)
+    mirror_after_commit(session, [product.id])
+    await session.flush()
+    await record_changes(session, "deleted", [{"id": product.id}])
+
+
+class InsufficientStock(Exception):
+    """Остатка не хватило хотя бы по одной строке резервирования"""
+
+    def __init__(self, available: dict[int, int], missing: set[int]):
+        super().__init__(available, missing)
+        self.available = available  # текущий остаток по не прошедшим строкам
+        self.missing = missing  # несуществующие товары
+
+
+async def reserve_stock(session: AsyncSession, quantities: dict[int, int]) -> dict[int, Row]:
+    # все строки списываются одним UPDATE ... WHERE stock >= n RETURNING:
+    # проверка и списание атомарны, между ними нет чтения, которое могло бы
+    # устареть. Если прошли не все строки, исключение откатывает транзакцию
+    # (в группе group commit - её SAVEPOINT) вместе с уже списанными
+    quantity = case(quantities, value=Product.id)
+    stmt = (
+        update(Product)
+        .where(Product.id.in_(quantities), Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .returning(Product.id, Product.stock, Product.price)
+        .execution_options(synchronize_session=False)
+    )
+    rows = {row.id: row for row in await session.execute(stmt)}
+    if len(rows) < len(quantities):
+        failed = quantities.keys() - rows.keys()
+        result = await session.execute(select(Product.id, Product.stock).where(Product.id.in_(failed)))
+        available = dict(result.tuples().all())
+        raise InsufficientStock(available, failed - available.keys())
+    refresh_stock_after_commit(session)
+    if not db_helper.sharded:
+        await record_changes(session, "stock", [{"id": row.id, "stock": row.stock} for row in rows.values()])
+    return rows
+
+
+async def restock(session: AsyncSession, product_id: int, quantity: int) -> int | None:
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock=Product.stock + quantity)
+        .returning(Product.stock)
+        .execution_options(synchronize_session=False)
+    )
+    stock = await session.scalar(stmt)
+    if stock is not None:
+        refresh_stock_after_commit(session)
+        if not db_helper.sharded:
+            await record_changes(session, "stock", [{"id": product_id, "stock": stock}])
+    return stock
+
+
+async def reserve_on_shard(quantities: dict[int, int],
+                           operation: Callable[[AsyncSession, int], Awaitable[T]]) -> T:
+    """
+    Выполнить operation(session, shard), списывающую quantities, в очереди писателя
+    шарда по кругу. Если его доли не хватило, а сумме долей хватает, недостающее
+    переносится из других шардов и операция повторяется (см. shards.py)
+    """
+    index = next_shard()
+    for attempt in range(MOVE_ATTEMPTS + 1):
+        try:
+            return await db_helper.shards[index].run_write(lambda session: operation(session, index))
+        except InsufficientStock as exc:
+            failed = exc.available.keys() | exc.missing
+        shares = await stock_shares(quantities)
+        totals = {product_id: sum(share.get(product_id, 0) for share in shares) for product_id in quantities}
+        missing = quantities.keys() - shares[0].keys()
+        short = {product_id for product_id, count in quantities.items() if totals[product_id] < count} - missing
+        if missing or short or attempt == MOVE_ATTEMPTS:
+            # параллельные списания успевали забрать перенесённое - остаток по сумме долей
+            available = {product_id: totals[product_id] for product_id in (short or failed - missing)}
+            raise InsufficientStock(available, missing)
+        await move_stock(index, quantities, shares)
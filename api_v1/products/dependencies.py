@@ -2,17 +2,61 @@ from typing import Annotated
 from fastapi import Path, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.batch import current_batch
+from core.dataloader import product_loader
 from core.models import db_helper, Product
+from core.singleflight import single_flight
 from . import crud
+from .shards import with_total_stock
 
+product_flight = single_flight("product_by_id")
+products_flight = single_flight("products_list")
 
-async def product_by_id(product_id: Annotated[int, Path],
-                        session: AsyncSession = Depends(db_helper.scope_session_dependency)
-                        ) -> Product:
-    product = await crud.get_product(session=session, product_id=product_id)
+
+def found_or_404(product: Product | None, product_id: int) -> Product:
     if product:
         return product
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail=f"Product {product_id} not found!",
     )
+
+
+async def load_products() -> list[Product]:
+    # своя сессия, а не сессия запроса: результат делят все ждущие запросы,
+    # а объекты остаются отсоединёнными после её закрытия
+    async with db_helper.read_session_factory() as session:
+        return await with_total_stock(await crud.get_products(session=session), session)
+
+
+def batch_session() -> AsyncSession | None:
+    # подзапрос POST /batch уже держит соединение читателя: своё брать нельзя,
+    # при занятом пуле его ожидание не кончилось бы
+    batch = current_batch.get()
+    return batch.session if batch is not None else None
+
+
+async def product_by_id(product_id: Annotated[int, Path]) -> Product:
+    if session := batch_session():
+        product = await crud.get_product(session=session, product_id=product_id)
+    else:
+        # одинаковые id схлопываются single-flight, разные собираются в один IN (...)
+        product = await product_flight.do(product_id, lambda: product_loader.load(product_id))
+    product = found_or_404(product, product_id)
+    # при шардах остаток - сумма долей всех шардов
+    await with_total_stock([product], session)
+    return product
+
+
+async def product_list() -> list[Product]:
+    if session := batch_session():
+        return await with_total_stock(await crud.get_products(session=session), session)
+    return await products_flight.do(None, load_products)
+
+
+async def product_by_id_for_write(product_id: Annotated[int, Path],
+                                  session: AsyncSession = Depends(db_helper.write_session)
+                                  ) -> Product:
+    # продукт загружается в сессию писателя, чтобы изменения попали в её транзакцию
+    product = await crud.get_product(session=session, product_id=product_id)
+    return found_or_404(product, product_id)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ProductBase(BaseModel):
@@ -8,14 +8,16 @@ class ProductBase(BaseModel):
 
 
 class ProductCreate(ProductBase):
-    pass
+    stock: int = Field(default=0, ge=0)
 
 
-class ProductUpdate(ProductCreate):
+# остаток не меняется через PUT/PATCH: запись прочитанного значения
+# затирала бы параллельные резервирования, для него есть /reserve и /restock
+class ProductUpdate(ProductBase):
     pass
 
 
-class ProductUpdatePartial(ProductCreate):
+class ProductUpdatePartial(ProductUpdate):
     name: str | None = None
     description: str | None = None
     price: int | None = None
@@ -24,3 +26,19 @@ class Product(ProductBase):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
+    stock: int
+
+
+class StockChange(BaseModel):
+    quantity: int = Field(gt=0)
+
+
+class StockLevel(BaseModel):
+    product_id: int
+    stock: int
+
+
+class Suggestion(BaseModel):
+    id: int
+    name: str
+    popularity: int
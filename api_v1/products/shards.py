@@ -0,0 +1,179 @@
+"""
+Товары при нескольких шардах (db.shards > 1).
+
+Каталог (название, описание, цена), его поток изменений и снимок живут
+в шарде 0; остальные шарды держат копию каталога (mirror_products после
+каждого изменения и полностью при старте). Остаток товара разделён между
+шардами: products.stock в шарде - его доля, остаток товара - сумма долей
+(stock_totals). Поэтому заказ вместе со списанием - одна транзакция в одном
+шарде, и записи заказов распределяются по писателям всех шардов.
+
+Если доли шарда не хватает, а сумме хватает, move_stock переносит
+недостающее (и до равной доли) из других шардов: сначала списание у донора,
+потом зачисление. Сбой между ними теряет перенесённое, но никогда не создаёт
+остатка, которого нет. События stock в потоке изменений при шардах не пишутся:
+доля одного шарда - не остаток товара.
+"""
+import asyncio
+import logging
+from itertools import cycle
+from typing import Collection, Iterable
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from core.models import Product, db_helper
+from core.models.db_helper import on_commit
+
+log = logging.getLogger(__name__)
+
+CATALOG_COLUMNS = (Product.id, Product.name, Product.description, Product.price)
+CHUNK = 500  # id в одном IN (...): у SQLite ограничено число параметров
+
+# шард для нового заказа выбирается по кругу, дальше его определяет id
+_round_robin = cycle(range(len(db_helper.shards)))
+
+
+def next_shard() -> int:
+    return next(_round_robin)
+
+
+def _chunks(ids: Iterable[int]) -> Iterable[list[int]]:
+    ids = sorted(ids)
+    return (ids[start:start + CHUNK] for start in range(0, len(ids), CHUNK))
+
+
+async def _shares(session: AsyncSession, product_ids: Collection[int] | None) -> dict[int, int]:
+    stmt = select(Product.id, Product.stock)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(product_ids))
+    return dict((await session.execute(stmt)).tuples().all())
+
+
+async def stock_shares(product_ids: Collection[int] | None = None,
+                       session: AsyncSession | None = None) -> list[dict[int, int]]:
+    """Доли остатков по шардам, в порядке шардов; session - уже открытая сессия шарда 0"""
+    return await db_helper.fan_out(lambda shard_session: _shares(shard_session, product_ids), session=session)
+
+
+async def stock_totals(product_ids: Collection[int] | None = None,
+                       session: AsyncSession | None = None) -> dict[int, int]:
+    """Остатки товаров шарда 0 - суммы долей всех шардов"""
+    shares = await stock_shares(product_ids, session)
+    return {
+        product_id: sum(share.get(product_id, 0) for share in shares)
+        for product_id in shares[0]
+    }
+
+
+async def with_total_stock(products: list[Product], session: AsyncSession | None = None) -> list[Product]:
+    # stock объектов шарда 0 заменяется суммой долей; значение абсолютное,
+    # поэтому повторный вызов для общего объекта (product_loader) безопасен
+    if db_helper.sharded and products:
+        totals = await stock_totals({product.id for product in products}, session)
+        for product in products:
+            set_committed_value(product, "stock", totals.get(product.id, 0))
+    return products
+
+
+async def mirror_products(product_ids: Collection[int] | None = None) -> None:
+    """Скопировать каталог шарда 0 в остальные шарды, не трогая их доли; None - весь каталог"""
+    if not db_helper.sharded:
+        return
+    async with db_helper.read_session_factory() as session:
+        stmt = select(*CATALOG_COLUMNS)
+        if product_ids is not None:
+            stmt = stmt.where(Product.id.in_(product_ids))
+        rows = [dict(row) for row in (await session.execute(stmt)).mappings()]
+    present = {row["id"] for row in rows}
+
+    async def apply(session: AsyncSession) -> None:
+        if rows:
+            # новый товар приходит с нулевой долей
+            stmt = insert(Product)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Product.id],
+                    set_={column.name: stmt.excluded[column.name] for column in CATALOG_COLUMNS[1:]},
+                ),
+                rows,
+            )
+        stale = (set(product_ids) if product_ids is not None else set(await session.scalars(select(Product.id))))
+        for chunk in _chunks(stale - present):
+            await session.execute(delete(Product).where(Product.id.in_(chunk)))
+
+    await asyncio.gather(*(shard.run_write(apply) for shard in db_helper.shards[1:]))
+
+
+async def _mirror_logged(product_ids: Collection[int]) -> None:
+    try:
+        await mirror_products(product_ids)
+    except Exception:
+        # копия догонит при следующем изменении товара или при старте
+        log.exception("Copying products %s to shards failed", sorted(product_ids))
+
+
+def mirror_after_commit(session: AsyncSession, product_ids: Collection[int]) -> None:
+    if db_helper.sharded:
+        on_commit(session, lambda: _mirror_logged(product_ids))
+
+
+async def _take(session: AsyncSession, quantities: dict[int, int]) -> dict[int, int]:
+    # транзакция писателя (BEGIN IMMEDIATE): доля не меняется между чтением и записью
+    shares = await _shares(session, quantities)
+    taken = {
+        product_id: min(count, shares[product_id])
+        for product_id, count in quantities.items()
+        if shares.get(product_id, 0) > 0
+    }
+    if taken:
+        await session.execute(update(Product), [
+            {"id": product_id, "stock": shares[product_id] - count} for product_id, count in taken.items()
+        ])
+    return taken
+
+
+async def _give(session: AsyncSession, quantities: dict[int, int]) -> None:
+    quantity = case(quantities, value=Product.id)
+    await session.execute(
+        update(Product)
+        .where(Product.id.in_(quantities))
+        .values(stock=Product.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def move_stock(target: int, quantities: dict[int, int], shares: list[dict[int, int]]) -> None:
+    """
+    Перенести в шард target из других шардов недостающее до quantities - и до равной
+    доли, чтобы следующие заказы шарда обходились без переноса. shares - доли по шардам
+    """
+    count_shards = len(db_helper.shards)
+    if quantities.keys() - shares[target].keys():
+        # копия каталога ещё не дошла до шарда
+        await mirror_products(quantities.keys())
+    plan: dict[int, dict[int, int]] = {}  # донор -> {товар: сколько взять}
+    for product_id, count in quantities.items():
+        local = shares[target].get(product_id, 0)
+        total = sum(share.get(product_id, 0) for share in shares)
+        want = min(max(count, total // count_shards), total) - local
+        donors = sorted((i for i in range(count_shards) if i != target), key=lambda i: -shares[i].get(product_id, 0))
+        for donor in donors:
+            take = min(want, shares[donor].get(product_id, 0))
+            if take <= 0:
+                break
+            plan.setdefault(donor, {})[product_id] = take
+            want -= take
+    # у каждого донора - одна транзакция на все товары, доноры параллельно
+    taken = await asyncio.gather(*(
+        db_helper.shards[donor].run_write(lambda session, part=part: _take(session, part))
+        for donor, part in plan.items()
+    ))
+    moved: dict[int, int] = {}
+    for part in taken:
+        for product_id, count in part.items():
+            moved[product_id] = moved.get(product_id, 0) + count
+    if moved:
+        await db_helper.shards[target].run_write(lambda session: _give(session, moved))
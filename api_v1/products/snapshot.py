@@ -0,0 +1,239 @@
+"""
+Снимок каталога товаров: весь список и постраничные срезы, заранее
+сериализованные в JSON и записанные в один файл.
+
+    [заголовок][таблица (начало, конец) по блокам][весь список][страница 1][страница 2]...
+
+Каждый блок - готовый JSON-массив, поэтому ответ - срез общего mmap без
+запроса к БД и без повторной сериализации. Файл пересобирается через
+rebuild_delay после фиксации изменений товаров - изменения за это время
+дают одну сборку. Изменения одних остатков (резервирования, возвраты,
+импорт заказов) пересборку не ускоряют: она не чаще stock_refresh_interval,
+поэтому остатки в списке могут отставать на это время, точные - в
+GET /products/{id}/. Строки читаются без ORM, сериализация и запись идут
+в пуле потоков; файл подменяется атомарно (os.replace), другие воркеры
+замечают новую версию по stat файла.
+"""
+import asyncio
+import contextvars
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Sequence
+
+from fastapi import Response
+from sqlalchemy import RowMapping, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import db_helper, Product
+from core.models.db_helper import on_commit
+from core.threadpool import run_sync
+from .schemas import Product as ProductSchema
+from .shards import stock_totals
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"CATSNAP1"
+HEADER = struct.Struct("<8sQIII")  # magic, версия, число товаров, размер страницы, число страниц
+SPAN = struct.Struct("<QQ")
+EMPTY_PAGE = memoryview(b"[]")
+COLUMNS = (Product.id, Product.name, Product.description, Product.price, Product.stock)
+
+
+def render_snapshot(items: list[bytes], page_size: int, version: int) -> bytes:
+    pages = [items[start:start + page_size] for start in range(0, len(items), page_size)]
+    blocks = [b"[" + b",".join(block) + b"]" for block in [items, *pages]]
+    offset = HEADER.size + SPAN.size * len(blocks)
+    spans = []
+    for block in blocks:
+        spans.append(SPAN.pack(offset, offset + len(block)))
+        offset += len(block)
+    header = HEADER.pack(MAGIC, version, len(items), page_size, len(pages))
+    return b"".join([header, *spans, *blocks])
+
+
+class SnapshotResponse(Response):
+    # тело - memoryview на mmap: передаётся в транспорт без копирования в bytes
+    media_type = "application/json"
+
+    def render(self, content) -> memoryview:
+        return content
+
+
+class CatalogSnapshot:
+    def __init__(self, path: Path, page_size: int, check_interval: float, rebuild_delay: float,
+                 stock_refresh_interval: float):
+        self.path = path
+        self.page_size = page_size
+        self.check_interval = check_interval
+        self.rebuild_delay = rebuild_delay
+        self.stock_refresh_interval = stock_refresh_interval
+        self.builds = 0
+        self.version = 0
+        self.count = 0
+        self.pages = 0
+        self._blocks: list[memoryview] = []
+        self._file_id: tuple[int, int] | None = None
+        self._checked_at = 0.0
+        self._rebuild_task: asyncio.Task | None = None
+        self._dirty = False
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _open(self) -> None:
+        try:
+            stat = os.stat(self.path)
+            with open(self.path, "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError - пустой файл, mmap нулевой длины невозможен
+            self._blocks = []
+            self._file_id = None
+            return
+        magic, version, count, _, pages = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            mapped.close()
+            raise RuntimeError(f"{self.path} is not a catalog snapshot")
+        view = memoryview(mapped)
+        self._blocks = [
+            view[start:end]
+            for start, end in SPAN.iter_unpack(view[HEADER.size:HEADER.size + SPAN.size * (pages + 1)])
+        ]
+        self.version, self.count, self.pages = version, count, pages
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+        # прежний mmap не закрывается явно: на него могут ссылаться ответы,
+        # которые ещё отправляются; он освободится вместе с последним срезом
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval and self._blocks:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns) != self._file_id:
+            self._open()
+
+    def block(self, page: int | None = None) -> memoryview | None:
+        """Весь список (page=None) или страница с 1; None - снимка нет"""
+        self._refresh()
+        if not self._blocks:
+            return None
+        if page is None:
+            return self._blocks[0]
+        return self._blocks[page] if page <= self.pages else EMPTY_PAGE
+
+    def response(self, page: int | None, if_none_match: str | None) -> Response | None:
+        body = self.block(page)
+        if body is None:
+            return None
+        etag = f'"{self.version}-{page or 0}"'
+        headers = {"etag": etag, "x-catalog-pages": str(self.pages)}
+        if if_none_match == etag:
+            return Response(status_code=304, headers=headers)
+        return SnapshotResponse(body, headers=headers)
+
+    async def rebuild(self) -> None:
+        # пересборки не накладываются: изменения во время сборки дают ещё одну
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            self._dirty = True
+            return await asyncio.shield(self._rebuild_task)
+        self._rebuild_task = asyncio.ensure_future(self._rebuild_loop())
+        await asyncio.shield(self._rebuild_task)
+
+    async def _rebuild_loop(self) -> None:
+        self._dirty = True
+        while self._dirty:
+            self._dirty = False
+            await self._build()
+
+    async def _build(self) -> None:
+        async with db_helper.read_session_factory() as session:
+            rows = (await session.execute(select(*COLUMNS).order_by(Product.id))).mappings().all()
+        # при шардах остаток - сумма долей всех шардов
+        totals = await stock_totals() if db_helper.sharded else None
+        await run_sync(self._write, rows, totals)
+        self.builds += 1
+        self._open()
+
+    def _write(self, rows: Sequence[RowMapping], totals: dict[int, int] | None) -> None:
+        items = [
+            ProductSchema.model_validate(
+                dict(row) if totals is None else {**row, "stock": totals.get(row["id"], row["stock"])}
+            ).model_dump_json().encode()
+            for row in rows
+        ]
+        data = render_snapshot(items, self.page_size, time.time_ns())
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path)
+
+    def schedule(self, delay: float) -> None:
+        """Пересобрать снимок не позже чем через delay; изменения до начала сборки попадут в неё же"""
+        loop = asyncio.get_running_loop()
+        due = loop.time() + delay
+        if self._timer is not None:
+            if self._timer.when() <= due:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(due, self._start_rebuild)
+
+    def _start_rebuild(self) -> None:
+        self._timer = None
+        # пустой контекст: сборка не относится к запросу, который её вызвал
+        asyncio.get_running_loop().create_task(self._rebuild_logged(), context=contextvars.Context())
+
+    async def _rebuild_logged(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception:
+            log.exception("Rebuilding the catalog snapshot failed")
+
+    async def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._rebuild_task is not None:
+            await asyncio.gather(self._rebuild_task, return_exceptions=True)
+
+    def metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        return [
+            "# TYPE catalog_snapshot_builds_total counter",
+            f"catalog_snapshot_builds_total {self.builds}",
+            "# TYPE catalog_snapshot_products gauge",
+            f"catalog_snapshot_products {self.count}",
+        ]
+
+
+catalog_snapshot = CatalogSnapshot(
+    setting.catalog.path,
+    setting.catalog.page_size,
+    setting.catalog.check_interval,
+    setting.catalog.rebuild_delay,
+    setting.catalog.stock_refresh_interval,
+)
+
+
+async def _schedule_rebuild() -> None:
+    catalog_snapshot.schedule(catalog_snapshot.rebuild_delay)
+
+
+async def _schedule_stock_refresh() -> None:
+    catalog_snapshot.schedule(catalog_snapshot.stock_refresh_interval)
+
+
+def rebuild_after_commit(session: AsyncSession) -> None:
+    if setting.catalog.enabled:
+        on_commit(session, _schedule_rebuild)
+
+
+def refresh_stock_after_commit(session: AsyncSession) -> None:
+    # изменились только остатки: пересборка откладывается, частые списания сливаются в одну
+    if setting.catalog.enabled:
+        on_commit(session, _schedule_stock_refresh)
@@ -0,0 +1,256 @@
+"""
+Подсказки по названиям товаров для GET /products/suggest.
+
+Индекс в памяти воркера - отсортированные пары (ключ, id), где ключи -
+название в нижнем регистре, начиная с каждого слова: "Gaming Mouse" находится
+и по "gam", и по "mou". Товары с префиксом - непрерывный диапазон, его границы
+ищутся бинарным поиском; из диапазона берутся самые популярные (сумма count
+по order_product_association), при равной популярности - с меньшим id. Ответы кэшируются по префиксу;
+изменение названия или популярности товара сбрасывает только те ответы,
+в которые он входит или мог бы войти.
+
+Индекс строится при старте и обновляется событиями из потока изменений
+товаров (changes.py), поэтому видит и записи других воркеров. Популярность
+пересчитывается раз в popularity_interval.
+"""
+import asyncio
+import contextvars
+import heapq
+import json
+import logging
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import OrderProductAssociation, Product, ProductChange, db_helper
+from .changes import Subscription, change_feed
+
+log = logging.getLogger(__name__)
+
+# верхняя граница диапазона: больше любого символа ключа
+PREFIX_END = "\U0010ffff"
+PREWARM_LENGTH = 2
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def index_keys(name: str) -> set[str]:
+    words = normalize(name).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words))} - {""}
+
+
+class SuggestIndex:
+    def __init__(self, max_limit: int, cache_size: int, popularity_interval: float):
+        self.max_limit = max_limit
+        self.cache_size = cache_size
+        self.popularity_interval = popularity_interval
+        self.lookups = 0
+        self.cache_hits = 0
+        self.rebuilds = 0
+        # пары (ключ, id) в двух параллельных списках: срез id диапазона
+        # превращается в множество без цикла на Python
+        self._keys: list[str] = []
+        self._ids: list[int] = []
+        self._names: dict[int, str] = {}
+        self._weights: dict[int, int] = {}
+        self._popular: set[int] = set()  # товары с ненулевой популярностью
+        self._cache: OrderedDict[str, list[int]] = OrderedDict()
+        self._tasks: list[asyncio.Task] = []
+
+    async def _popularity(self) -> dict[int, int]:
+        async def operation(session: AsyncSession) -> list[tuple[int, int]]:
+            rows = await session.execute(
+                select(OrderProductAssociation.product_id, func.sum(OrderProductAssociation.count))
+                .group_by(OrderProductAssociation.product_id)
+            )
+            return list(rows.tuples())
+
+        # строки заказов распределены по шардам - суммы складываются
+        weights: dict[int, int] = {}
+        for rows in await db_helper.fan_out(operation):
+            for product_id, count in rows:
+                weights[product_id] = weights.get(product_id, 0) + count
+        return weights
+
+    async def build(self) -> None:
+        async with db_helper.read_session_factory() as session:
+            names = dict((await session.execute(select(Product.id, Product.name))).tuples().all())
+        self.load(names, await self._popularity())
+
+    def load(self, names: dict[int, str], weights: dict[int, int]) -> None:
+        entries = sorted((key, product_id) for product_id, name in names.items() for key in index_keys(name))
+        self._keys = [key for key, _ in entries]
+        self._ids = [product_id for _, product_id in entries]
+        self._names = names
+        self._weights = weights
+        self._popular = {product_id for product_id, weight in weights.items() if weight > 0}
+        self._cache.clear()
+        self.rebuilds += 1
+        if self.cache_size:
+            # короткие префиксы покрывают большую часть индекса - считаются заранее
+            prefixes = {key[:length] for key in self._keys for length in range(1, PREWARM_LENGTH + 1)}
+            for prefix in prefixes:
+                self._cache[prefix] = self._top(prefix)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def upsert(self, product_id: int, name: str) -> None:
+        old = self._names.get(product_id)
+        if old == name:
+            return  # цена, описание и остаток на подсказки не влияют
+        if old is not None:
+            self._discard(product_id, old)
+        self._names[product_id] = name
+        for key in index_keys(name):
+            i = self._position(key, product_id)
+            self._keys.insert(i, key)
+            self._ids.insert(i, product_id)
+        self._invalidate(product_id, name)
+
+    def remove(self, product_id: int) -> None:
+        old = self._names.pop(product_id, None)
+        if old is not None:
+            self._discard(product_id, old)
+            self._weights.pop(product_id, None)
+            self._popular.discard(product_id)
+
+    def set_weights(self, weights: dict[int, int]) -> None:
+        changed = {
+            product_id for product_id in weights.keys() | self._weights.keys()
+            if weights.get(product_id, 0) != self._weights.get(product_id, 0)
+        }
+        old = self._weights
+        self._weights = weights
+        self._popular = {product_id for product_id, weight in weights.items() if weight > 0}
+        for product_id in changed & self._names.keys():
+            self._invalidate(product_id, self._names[product_id], old.get(product_id, 0))
+
+    def _discard(self, product_id: int, name: str) -> None:
+        for key in index_keys(name):
+            i = self._position(key, product_id)
+            if i < len(self._keys) and self._keys[i] == key and self._ids[i] == product_id:
+                del self._keys[i]
+                del self._ids[i]
+        self._invalidate(product_id, name)
+
+    def _position(self, key: str, product_id: int) -> int:
+        # внутри одинаковых ключей id тоже по возрастанию
+        lo = bisect_left(self._keys, key)
+        hi = bisect_right(self._keys, key, lo)
+        return bisect_left(self._ids, product_id, lo, hi)
+
+    def _rank(self, product_id: int) -> tuple[int, int]:
+        return self._weights.get(product_id, 0), -product_id
+
+    def _invalidate(self, product_id: int, name: str, old_weight: int | None = None) -> None:
+        # готовый ответ сбрасывается, только если товар в нём был или мог в него попасть:
+        # новые товары с нулевой популярностью обычно не трогают ни одного
+        rank = self._rank(product_id)
+        if old_weight is not None:
+            rank = max(rank, (old_weight, -product_id))
+        for key in index_keys(name):
+            for end in range(1, len(key) + 1):
+                ids = self._cache.get(key[:end])
+                if ids is not None and (
+                        product_id in ids or len(ids) < self.max_limit or rank > self._rank(ids[-1])
+                ):
+                    del self._cache[key[:end]]
+
+    def _top(self, prefix: str) -> list[int]:
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + PREFIX_END, lo)
+        # товар попадает в диапазон по каждому своему подходящему слову
+        candidates = set(self._ids[lo:hi])
+        # ранжируются только популярные, остальные добираются по меньшему id
+        top = heapq.nlargest(self.max_limit, candidates & self._popular, key=self._rank)
+        if len(top) < self.max_limit:
+            top += heapq.nsmallest(self.max_limit - len(top), candidates - self._popular)
+        return top
+
+    def suggest(self, prefix: str, limit: int) -> list[tuple[int, str, int]]:
+        """(id, название, популярность) самых популярных товаров с префиксом"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.lookups += 1
+        ids = self._cache.get(prefix)
+        if ids is None:
+            ids = self._top(prefix)
+            if self.cache_size:
+                self._cache[prefix] = ids
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        else:
+            self.cache_hits += 1
+            self._cache.move_to_end(prefix)
+        return [(product_id, self._names[product_id], self._weights.get(product_id, 0)) for product_id in ids[:limit]]
+
+    def apply(self, change: ProductChange) -> None:
+        if change.op in ("created", "updated"):
+            self.upsert(change.product_id, json.loads(change.payload)["name"])
+        elif change.op == "deleted":
+            self.remove(change.product_id)
+
+    async def _follow(self, subscription: Subscription) -> None:
+        while True:
+            try:
+                while (item := await subscription.queue.get()) is not None:
+                    self.apply(item[0])
+            finally:
+                change_feed.unsubscribe(subscription)
+            # отстали от потока и отключены - пропущенные события не восстановить
+            log.warning("Suggest index fell behind product changes, rebuilding")
+            subscription = await change_feed.subscribe()
+            await self.build()
+
+    async def _refresh_popularity(self) -> None:
+        while True:
+            await asyncio.sleep(self.popularity_interval)
+            try:
+                self.set_weights(await self._popularity())
+            except Exception:
+                log.exception("Refreshing product popularity failed")
+
+    async def start(self) -> None:
+        # подписка до загрузки: изменения во время загрузки придут событиями,
+        # повторное применение уже загруженного ничего не меняет
+        subscription = await change_feed.subscribe()
+        await self.build()
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._follow(subscription), context=contextvars.Context()),
+            loop.create_task(self._refresh_popularity(), context=contextvars.Context()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        return [
+            "# TYPE suggest_index_products gauge",
+            f"suggest_index_products {len(self._names)}",
+            "# TYPE suggest_index_keys gauge",
+            f"suggest_index_keys {len(self._keys)}",
+            "# TYPE suggest_lookups_total counter",
+            f"suggest_lookups_total {self.lookups}",
+            "# TYPE suggest_cache_hits_total counter",
+            f"suggest_cache_hits_total {self.cache_hits}",
+            "# TYPE suggest_index_rebuilds_total counter",
+            f"suggest_index_rebuilds_total {self.rebuilds}",
+        ]
+
+
+suggest_index = SuggestIndex(
+    max_limit=setting.suggest.max_limit,
+    cache_size=setting.suggest.cache_size,
+    popularity_interval=setting.suggest.popularity_interval,
+)
@@ -1,22 +1,68 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Path, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import crud
+from .changes import change_feed
+from core.config import setting
 from core.models import db_helper
-from .dependencies import product_by_id
-from .schemas import ProductCreate, Product, ProductUpdate, ProductUpdatePartial
+from .dependencies import found_or_404, product_by_id, product_by_id_for_write, product_list
+from .schemas import ProductCreate, Product, ProductUpdate, ProductUpdatePartial, StockChange, StockLevel, Suggestion
+from .shards import stock_totals
+from .snapshot import catalog_snapshot
+from .suggest import suggest_index
 
 router = APIRouter(tags=["Products"])
 
 
 @router.get("/", response_model=list[Product])
-async def ger_products(session: AsyncSession = Depends(db_helper.scope_session_dependency)):
-    return await crud.get_products(session=session)
+async def ger_products(
+        page: Annotated[int | None, Query(ge=1)] = None,
+        if_none_match: Annotated[str | None, Header()] = None,
+):
+    # основной путь - готовый JSON из снимка каталога, без БД и сериализации
+    response = catalog_snapshot.response(page, if_none_match) if setting.catalog.enabled else None
+    if response is not None:
+        return response
+    products = await product_list()
+    if page is not None:
+        size = setting.catalog.page_size
+        products = products[(page - 1) * size:page * size]
+    return products
+
+
+@router.get("/changes")
+async def get_product_changes(
+        since: Annotated[int | None, Query(ge=0)] = None,
+        last_event_id: Annotated[int | None, Header()] = None,
+):
+    # Server-Sent Events; переподключение браузера присылает Last-Event-ID
+    return StreamingResponse(
+        change_feed.stream(last_event_id if last_event_id is not None else since),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+@router.get("/suggest", response_model=list[Suggestion])
+async def suggest_products(
+        prefix: Annotated[str, Query(min_length=1, max_length=100)],
+        limit: Annotated[int, Query(ge=1, le=setting.suggest.max_limit)] = setting.suggest.max_limit,
+):
+    # подсказки на каждое нажатие клавиши - только из индекса в памяти, без БД
+    if not setting.suggest.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Suggestions are disabled")
+    return [
+        Suggestion(id=product_id, name=name, popularity=popularity)
+        for product_id, name, popularity in suggest_index.suggest(prefix, limit)
+    ]
 
 
 @router.post("/", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(product_in: ProductCreate,
-                         session: AsyncSession = Depends(db_helper.scope_session_dependency)):
+                         session: AsyncSession = Depends(db_helper.write_session)):
     return await crud.create_product(session=session, product_in=product_in)
 
 
@@ -28,8 +74,8 @@ async def get_product(product: Product = Depends(product_by_id)):
 @router.put("/{product_id}/")
 async def udate_product(
         product_update: ProductUpdate,
-        product: Product = Depends(product_by_id),
-        session: AsyncSession = Depends(db_helper.scope_session_dependency)
+        product: Product = Depends(product_by_id_for_write),
+        session: AsyncSession = Depends(db_helper.write_session)
 ):
     return await crud.update_product(
         session=session,
@@ -41,8 +87,8 @@ async def udate_product(
 @router.patch("/{product_id}/")
 async def udate_product_partial(
         product_update: ProductUpdatePartial,
-        product: Product = Depends(product_by_id),
-        session: AsyncSession = Depends(db_helper.scope_session_dependency)
+        product: Product = Depends(product_by_id_for_write),
+        session: AsyncSession = Depends(db_helper.write_session)
 ):
     return await crud.update_product(
         session=session,
@@ -54,7 +100,44 @@ async def udate_product_partial(
 
 @router.delete("/{product_id}/", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
-        product: Product = Depends(product_by_id),
-        session: AsyncSession = Depends(db_helper.scope_session_dependency)
+        product: Product = Depends(product_by_id_for_write),
+        session: AsyncSession = Depends(db_helper.write_session)
 ) -> None:
     await crud.delete_product(session=session, product=product)
+
+
+@router.post("/{product_id}/reserve/", response_model=StockLevel)
+async def reserve_product(product_id: Annotated[int, Path], change: StockChange):
+    # короткая операция в очереди писателя, а не write_session на весь запрос:
+    # при group commit резервирования параллельных запросов фиксируются вместе
+    quantities = {product_id: change.quantity}
+    try:
+        if db_helper.sharded:
+            await crud.reserve_on_shard(
+                quantities, lambda session, _: crud.reserve_stock(session=session, quantities=quantities)
+            )
+            stock = (await stock_totals(quantities)).get(product_id, 0)
+        else:
+            rows = await db_helper.run_write(lambda session: crud.reserve_stock(session=session, quantities=quantities))
+            stock = rows[product_id].stock
+    except crud.InsufficientStock as exc:
+        if exc.missing:
+            found_or_404(None, product_id)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Not enough stock for product {product_id}: {exc.available[product_id]} available",
+        )
+    return StockLevel(product_id=product_id, stock=stock)
+
+
+@router.post("/{product_id}/restock/", response_model=StockLevel)
+async def restock_product(product_id: Annotated[int, Path], change: StockChange):
+    stock = await db_helper.run_write(
+        lambda session: crud.restock(session=session, product_id=product_id, quantity=change.quantity)
+    )
+    if stock is None:
+        found_or_404(None, product_id)
+    if db_helper.sharded:
+        # поступление - в долю шарда 0, ответ - остаток по всем шардам
+        stock = (await stock_totals([product_id])).get(product_id, 0)
+    return StockLevel(product_id=product_id, stock=stock)
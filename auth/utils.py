@@ -1,5 +1,6 @@
 import uuid
 from datetime import timedelta, datetime
+from functools import cache
 
 import bcrypt
 import jwt
@@ -7,9 +8,20 @@ import jwt
 from core.config import setting
 
 
+# ключи читаются при первом использовании, а не при импорте модуля
+@cache
+def load_private_key() -> str:
+    return setting.auth_jwt.private_key_path.read_text()
+
+
+@cache
+def load_public_key() -> str:
+    return setting.auth_jwt.public_key_path.read_text()
+
+
 def encode_jwt(
         payload: dict,
-        private_key: str = setting.auth_jwt.private_key_path.read_text(),
+        private_key: str | None = None,
         algorithm: str = setting.auth_jwt.algorithm,
         expire_minutes: int = setting.auth_jwt.access_token_expire_minutes,
         expire_timedelta: timedelta | None = None,
@@ -25,16 +37,16 @@ def encode_jwt(
         iat=now,  # дата создания токена
         jti=str(uuid.uuid4()), # ID token
     )
-    encoded = jwt.encode(to_encode, private_key, algorithm=algorithm)
+    encoded = jwt.encode(to_encode, private_key or load_private_key(), algorithm=algorithm)
     return encoded
 
 
 def decode_jwt(
         token: str | bytes,
-        public_key: str = setting.auth_jwt.public_key_path.read_text(),
+        public_key: str | None = None,
         algorithm: str = setting.auth_jwt.algorithm,
 ):
-    decoded = jwt.decode(token, public_key, algorithms=[algorithm])
+    decoded = jwt.decode(token, public_key or load_public_key(), algorithms=[algorithm])
     return decoded
 
 
@@ -0,0 +1,199 @@
+"""
+Генератор синтетических данных для SQLite: пользователи, профили, посты,
+товары, заказы и строки заказов в объёмах до миллионов строк.
+
+Популярность товаров и активность авторов распределены по Ципфу, даты
+заказов смещены к текущему моменту. Вставка - пачками через Core
+в больших транзакциях, с PRAGMA для загрузки. Результат детерминирован
+значением --seed.
+
+    python -m benchmarks.dataset /tmp/bench.sqlite3 --users 1000000 --products 200000 \\
+        --orders 2000000 --lines-per-order 3 --seed 42
+"""
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.engine import Connection
+
+from core.models import Base, Order, OrderProductAssociation, Post, Product, Profile, User
+from core.models.db_helper import alembic_heads
+
+CHUNK = 10_000
+COMMIT_EVERY = 500_000  # строк на транзакцию - ограничивает рост WAL
+
+# на время загрузки: без fsync, большой кэш страниц, временные данные в памяти
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=OFF",
+)
+
+
+@dataclass
+class Volumes:
+    products: int = 1000
+    orders: int = 1000
+    lines_per_order: int = 3  # среднее число строк в заказе
+    users: int = 1000
+    posts: int = 1000
+
+
+@dataclass
+class Distribution:
+    zipf_s: float = 1.1  # показатель Ципфа для популярности товаров и авторов
+    days: int = 365  # глубина истории заказов
+    recency: float = 3.0  # > 1 - заказы сгущаются к текущему моменту
+
+
+class Zipf:
+    # выбор id с вероятностью ~ 1 / rank^s; ранги перемешаны, чтобы
+    # популярными были не только первые id
+    def __init__(self, ids: list[int], s: float, rnd: random.Random):
+        self.ids = ids[:]
+        rnd.shuffle(self.ids)
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(ids) + 1)))
+        self.rnd = rnd
+
+    def sample(self, k: int = 1) -> list[int]:
+        return self.rnd.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k: int) -> set[int]:
+        picked: set[int] = set()
+        while len(picked) < k:
+            picked.update(self.sample(k - len(picked)))
+        return picked
+
+
+def created_at_series(n: int, distribution: Distribution, rnd: random.Random, now: datetime) -> Iterator[datetime]:
+    # обратная функция распределения F(x) = x^recency по равномерной сетке
+    # квантилей: даты растут вместе с id, а плотность заказов - к концу периода
+    start = now - timedelta(days=distribution.days)
+    span = distribution.days * 86400
+    for i in range(n):
+        quantile = (i + rnd.random()) / n
+        yield start + timedelta(seconds=span * quantile ** (1 / distribution.recency))
+
+
+class Loader:
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.since_commit = 0
+        self.report: dict[str, dict] = {}
+
+    def load(self, name: str, table, rows: Iterable[dict]) -> int:
+        started = time.perf_counter()
+        total = 0
+        for chunk in _chunks(rows, CHUNK):
+            if not total:
+                # INSERT компилируется один раз по ключам первой строки, дальше
+                # строки уходят в executemany кортежами - без построения
+                # параметров SQLAlchemy на каждую строку
+                compiled = insert(table).compile(dialect=self.conn.dialect, column_keys=list(chunk[0]))
+                statement = str(compiled)
+                as_tuple = itemgetter(*compiled.positiontup)
+            self.conn.exec_driver_sql(statement, [as_tuple(row) for row in chunk])
+            total += len(chunk)
+            self.since_commit += len(chunk)
+            if self.since_commit >= COMMIT_EVERY:
+                self.conn.commit()
+                self.since_commit = 0
+        self.conn.commit()
+        self.since_commit = 0
+        elapsed = time.perf_counter() - started
+        rows_per_s = round(total / elapsed if elapsed else 0)
+        self.report[name] = {"rows": total, "seconds": round(elapsed, 2), "rows_per_s": rows_per_s}
+        print(f"{name:12} {total:>10} rows {elapsed:>8.2f} s {rows_per_s:>10} rows/s", file=sys.stderr)
+        return total
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def seed(path: str, volumes: Volumes, seed_value: int = 0, distribution: Distribution | None = None) -> dict:
+    distribution = distribution or Distribution()
+    rnd = random.Random(seed_value)
+    # фиксированная точка отсчёта - одинаковый seed даёт одинаковые данные
+    now = datetime(2024, 1, 1) + timedelta(days=seed_value % 365)
+    engine = create_engine(f"sqlite:///{path}")
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        for pragma in LOAD_PRAGMAS:
+            conn.exec_driver_sql(pragma)
+        Base.metadata.create_all(conn)
+        # схема соответствует последней ревизии - годится и для fast_boot
+        conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) PRIMARY KEY)")
+        for head in alembic_heads():
+            conn.execute(text("INSERT OR IGNORE INTO alembic_version VALUES (:head)"), {"head": head})
+        conn.commit()
+
+        loader = Loader(conn)
+        user_ids = list(range(1, volumes.users + 1))
+        loader.load("users", User.__table__, ({"id": i, "username": f"user{i}"} for i in user_ids))
+        loader.load("profiles", Profile.__table__, (
+            {"user_id": i, "first_name": f"First{i}", "last_name": f"Last{i}", "bio": None}
+            for i in user_ids
+        ))
+        if volumes.users:
+            authors = Zipf(user_ids, distribution.zipf_s, rnd)
+            loader.load("posts", Post.__table__, (
+                {"user_id": user_id, "title": f"Post {i}", "body": "lorem ipsum"}
+                for i, user_id in enumerate(authors.sample(volumes.posts), start=1)
+            ))
+
+        prices = [int(math.exp(rnd.uniform(math.log(100), math.log(100_000)))) for _ in range(volumes.products)]
+        loader.load("products", Product.__table__, (
+            {"id": i, "name": f"Product {i}", "description": "benchmark product", "price": price,
+             "stock": 1000}
+            for i, price in enumerate(prices, start=1)
+        ))
+        loader.load("orders", Order.__table__, (
+            {"id": i, "promocode": "promo" if rnd.random() < 0.05 else None,
+             "created_at": created_at.isoformat(" ", "microseconds")}
+            for i, created_at in enumerate(created_at_series(volumes.orders, distribution, rnd, now), start=1)
+        ))
+        if volumes.products:
+            popularity = Zipf(list(range(1, volumes.products + 1)), distribution.zipf_s, rnd)
+            max_lines = min(2 * volumes.lines_per_order - 1, volumes.products)
+            loader.load("order_lines", OrderProductAssociation.__table__, (
+                {"orders_id": order_id, "product_id": product_id, "count": rnd.randint(1, 5),
+                 "unit_price": prices[product_id - 1]}
+                for order_id in range(1, volumes.orders + 1)
+                for product_id in sorted(popularity.distinct(rnd.randint(1, max(max_lines, 1))))
+            ))
+        conn.exec_driver_sql("PRAGMA optimize")
+    engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    total = sum(table["rows"] for table in loader.report.values())
+    counts = {name: table["rows"] for name, table in loader.report.items()}
+    counts["seconds"] = round(elapsed, 2)
+    counts["rows_per_s"] = round(total / elapsed if elapsed else 0)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    for name, value in asdict(Volumes()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=value)
+    for name, value in asdict(Distribution()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    volumes = Volumes(**{name: getattr(args, name) for name in asdict(Volumes())})
+    distribution = Distribution(**{name: getattr(args, name) for name in asdict(Distribution())})
+    print(seed(args.path, volumes, args.seed, distribution))
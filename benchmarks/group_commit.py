@@ -0,0 +1,67 @@
+"""
+Записей в секунду через очередь писателя в зависимости от окна group commit.
+
+    python -m benchmarks.group_commit --clients 64 --seconds 5 --window 0 --window 2 --window 10
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from core.config import GroupCommitSetting, SqlitePragmas
+from core.models import Base, DatabaseHelper, Product
+
+
+async def create_product(session) -> None:
+    session.add(Product(name="bench", description="bench product", price=100))
+    await session.flush()
+
+
+async def client(helper: DatabaseHelper, deadline: float, stats: dict) -> None:
+    while time.perf_counter() < deadline:
+        await helper.run_write(create_product)
+        stats["writes"] += 1
+
+
+async def run(window_ms: float | None, args: argparse.Namespace) -> dict:
+    group_commit = GroupCommitSetting(
+        enabled=window_ms is not None,
+        window_ms=window_ms or 0,
+        max_batch=args.max_batch,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        helper = DatabaseHelper(
+            f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite3'}",
+            pragmas=SqlitePragmas(synchronous=args.synchronous),
+            group_commit=group_commit,
+        )
+        async with helper.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        stats = {"writes": 0}
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(*(client(helper, deadline, stats) for _ in range(args.clients)))
+        await helper.dispose()
+    return {
+        "window_ms": window_ms if window_ms is not None else "off",
+        "writes_per_sec": round(stats["writes"] / args.seconds, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    windows = [None, *(args.window or [0, 1, 2, 5, 10])]
+    results = [await run(window, args) for window in windows]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--window", type=float, action="append", help="окно в мс, можно несколько")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    # с synchronous=full каждый commit - это fsync, что и амортизирует group commit
+    parser.add_argument("--synchronous", default="full", choices=["off", "normal", "full", "extra"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,276 @@
+"""
+Нагрузочный тест приложения: наполняет временную БД, поднимает main.app
+в процессе (httpx + ASGI) или в настоящем uvicorn и прогоняет сценарии.
+Результат - JSON с пропускной способностью и p50/p95/p99 по сценариям.
+
+    python -m benchmarks.loadtest --products 100000 --orders 20000 --concurrency 32 \\
+        --duration 10 --out results/$(git rev-parse --short HEAD).json
+
+С --fail-on-errors код выхода 1, если хоть один запрос завершился ошибкой
+или не уложился в --timeout (зависший запрос иначе просто не попал бы в отчёт).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+# core и main импортируются только в main(): настройки читаются из
+# окружения при первом импорте, а окружение готовится там же
+BASE_DIR = Path(__file__).parent.parent
+
+Scenario = Callable[[httpx.AsyncClient, "Context"], Awaitable[httpx.Response]]
+
+
+class Context:
+    def __init__(self, volumes, prefix: str):
+        self.volumes = volumes
+        self.prefix = prefix
+        self.access_token: str | None = None
+
+
+async def product_get(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get(f"{ctx.prefix}/products/{random.randint(1, ctx.volumes.products)}/")
+
+
+async def products_list(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get(f"{ctx.prefix}/products/")
+
+
+async def product_create(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post(
+        f"{ctx.prefix}/products/",
+        json={"name": "load test", "description": "created by loadtest", "price": random.randint(1, 1000)},
+    )
+
+
+async def product_update(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.patch(
+        f"{ctx.prefix}/products/{random.randint(1, ctx.volumes.products)}/",
+        json={"price": random.randint(1, 1000)},
+    )
+
+
+async def product_suggest(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    # префикс названия из benchmarks.dataset, как при наборе в строке поиска
+    name = f"product {random.randint(1, ctx.volumes.products)}"
+    return await client.get(f"{ctx.prefix}/products/suggest", params={"prefix": name[:random.randint(1, len(name))]})
+
+
+async def order_get(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get(f"{ctx.prefix}/orders/{random.randint(1, ctx.volumes.orders)}/")
+
+
+async def orders_page(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    after_id = random.randint(0, max(ctx.volumes.orders - 20, 0))
+    return await client.get(f"{ctx.prefix}/orders/", params={"after_id": after_id, "limit": 20})
+
+
+async def jwt_login(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.post(f"{ctx.prefix}/jwt/login", data={"username": "john", "password": "qwerty"})
+
+
+async def jwt_me(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get(
+        f"{ctx.prefix}/jwt/users/me/",
+        headers={"Authorization": f"Bearer {ctx.access_token}"},
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "product_get": product_get,
+    "products_list": products_list,
+    "product_create": product_create,
+    "product_update": product_update,
+    "product_suggest": product_suggest,
+    "order_get": order_get,
+    "orders_page": orders_page,
+    "jwt_login": jwt_login,
+    "jwt_me": jwt_me,
+}
+DEFAULT_SCENARIOS = ["product_get", "order_get", "orders_page", "product_create", "jwt_me"]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, scenario: Scenario, args) -> dict:
+    latencies: list[float] = []
+    errors = timeouts = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def worker() -> None:
+        nonlocal errors, timeouts
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(scenario(client, ctx), args.timeout)
+            except (httpx.HTTPError, TimeoutError) as exc:
+                if isinstance(exc, TimeoutError):
+                    timeouts += 1
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "timeouts": timeouts,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def drive(client: httpx.AsyncClient, ctx: Context, args) -> dict:
+    login = await jwt_login(client, ctx)
+    login.raise_for_status()
+    ctx.access_token = login.json()["access_token"]
+    results = {}
+    for name in args.scenario or DEFAULT_SCENARIOS:
+        results[name] = await run_scenario(client, ctx, SCENARIOS[name], args)
+        print(name, results[name], file=sys.stderr)
+    return results
+
+
+async def run_in_process(ctx: Context, args) -> dict:
+    main = importlib.import_module("main")
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await drive(client, ctx, args)
+
+
+async def run_uvicorn(ctx: Context, args) -> dict:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR,
+        env=os.environ.copy(),
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await drive(client, ctx, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def write_keys(directory: Path) -> None:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    (directory / "jwt-private.pem").write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ))
+    (directory / "jwt-public.pem").write_bytes(key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db_path = tmp / "loadtest.sqlite3"
+        write_keys(tmp)
+        os.environ.update({
+            "DB__URL": f"sqlite+aiosqlite:///{db_path}",
+            "AUTH_JWT__PRIVATE_KEY_PATH": str(tmp / "jwt-private.pem"),
+            "AUTH_JWT__PUBLIC_KEY_PATH": str(tmp / "jwt-public.pem"),
+            "CATALOG__PATH": str(tmp / "catalog.snapshot"),
+        })
+        from benchmarks.dataset import Volumes, seed
+
+        volumes = Volumes(
+            products=args.products,
+            orders=args.orders,
+            lines_per_order=args.lines_per_order,
+            users=args.users,
+            posts=args.posts,
+        )
+        seeded = seed(str(db_path), volumes, args.seed)
+        print("seeded", seeded, file=sys.stderr)
+        ctx = Context(volumes, os.environ.get("API_V1_PREFIX", "/api/v1"))
+        runner = run_uvicorn if args.transport == "uvicorn" else run_in_process
+        scenarios = asyncio.run(runner(ctx, args))
+    return {
+        "revision": git_revision(),
+        "transport": args.transport,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "volumes": asdict(volumes),
+        "scenarios": scenarios,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--lines-per-order", type=int, default=3)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на сценарий")
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--timeout", type=float, default=30.0, help="секунд на запрос, дольше - ошибка")
+    parser.add_argument("--fail-on-errors", action="store_true")
+    parser.add_argument("--out", type=Path, help="файл для JSON-результата")
+    args = parser.parse_args()
+    result = main(args)
+    output = json.dumps(result, indent=2)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(output)
+    print(output)
+    if args.fail_on_errors:
+        failed = {name: stats["errors"] for name, stats in result["scenarios"].items() if stats["errors"]}
+        if failed:
+            print(f"errors in scenarios: {failed}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,210 @@
+"""
+Микробенчмарки горячих путей: JWT, bcrypt, валидация pydantic, гидрация ORM
+и сериализация from_attributes. Замеры через timeit, в одном процессе.
+
+    python -m benchmarks.micro run --save               # записать базовую линию
+    python -m benchmarks.micro run -k jwt               # только подходящие по имени
+    python -m benchmarks.micro compare --tolerance 0.1  # код выхода 1 при регрессии
+    python -m benchmarks.micro compare --result other.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "micro.json"
+ROWS = 1000
+
+Setup = Callable[[], Callable[[], object]]
+
+
+def _rsa_keys() -> tuple[str, str]:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return private, public
+
+
+def jwt_encode() -> Callable[[], object]:
+    from auth.utils import encode_jwt
+
+    private, _ = _rsa_keys()
+    payload = {"sub": "john", "username": "john", "email": "john@example.com"}
+    return lambda: encode_jwt(payload, private_key=private)
+
+
+def jwt_decode() -> Callable[[], object]:
+    from auth.utils import decode_jwt, encode_jwt
+
+    private, public = _rsa_keys()
+    token = encode_jwt({"sub": "john", "username": "john"}, private_key=private)
+    return lambda: decode_jwt(token, public_key=public)
+
+
+def password_hash() -> Callable[[], object]:
+    from auth.utils import hash_password
+
+    return lambda: hash_password("qwerty")
+
+
+def password_validate() -> Callable[[], object]:
+    from auth.utils import hash_password, validate_password
+
+    hashed = hash_password("qwerty")
+    return lambda: validate_password("qwerty", hashed)
+
+
+def product_create_validate() -> Callable[[], object]:
+    from api_v1.products.schemas import ProductCreate
+
+    data = {"name": "Product", "description": "benchmark product", "price": 100}
+    return lambda: ProductCreate.model_validate(data)
+
+
+def user_schema_validate() -> Callable[[], object]:
+    from users.schemas import UserSchema
+
+    data = {"username": "john", "password": b"$2b$12$hash", "email": "john@example.com"}
+    return lambda: UserSchema.model_validate(data)
+
+
+def _products_session():
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import Session
+
+    from core.models import Base, Product
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Product {i}", "description": "benchmark product", "price": i}
+            for i in range(1, ROWS + 1)
+        ])
+    return engine, Session, Product
+
+
+def orm_hydrate_products() -> Callable[[], object]:
+    from sqlalchemy import select
+
+    engine, Session, Product = _products_session()
+
+    def run():
+        # новая сессия на каждый вызов: объекты создаются заново, а не берутся из identity map
+        with Session(engine) as session:
+            return session.scalars(select(Product)).all()
+
+    return run
+
+
+def serialize_products() -> Callable[[], object]:
+    from sqlalchemy import select
+
+    from api_v1.products.schemas import Product as ProductSchema
+
+    engine, Session, Product = _products_session()
+    with Session(engine, expire_on_commit=False) as session:
+        products = session.scalars(select(Product)).all()
+    return lambda: [ProductSchema.model_validate(product) for product in products]
+
+
+BENCHMARKS: dict[str, Setup] = {
+    "jwt_encode": jwt_encode,
+    "jwt_decode": jwt_decode,
+    "password_hash": password_hash,
+    "password_validate": password_validate,
+    "product_create_validate": product_create_validate,
+    "user_schema_validate": user_schema_validate,
+    f"orm_hydrate_products_{ROWS}": orm_hydrate_products,
+    f"serialize_products_{ROWS}": serialize_products,
+}
+
+
+def measure(fn: Callable[[], object], repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    # autorange подбирает число вызовов так, чтобы замер занимал >= 0.2 с
+    number, _ = timer.autorange()
+    samples = [total / number for total in timer.repeat(repeat, number)]
+    return {
+        "min_us": round(min(samples) * 1e6, 3),
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(samples) * 1e6, 3) if len(samples) > 1 else 0.0,
+        "loops": number,
+    }
+
+
+def run(names: list[str], repeat: int) -> dict:
+    results = {}
+    for name in names:
+        results[name] = measure(BENCHMARKS[name](), repeat)
+        print(f"{name:32} {results[name]['min_us']:>12.1f} us", file=sys.stderr)
+    return results
+
+
+def compare(baseline: dict, result: dict, tolerance: float) -> list[str]:
+    # сравниваются минимумы - они меньше всего зависят от шума машины;
+    # бенчмарки, которых нет в одном из наборов, пропускаются
+    regressions = []
+    for name in sorted(baseline.keys() & result.keys()):
+        before, after = baseline[name]["min_us"], result[name]["min_us"]
+        change = after / before - 1 if before else 0.0
+        flag = "REGRESSION" if change > tolerance else ""
+        print(f"{name:32} {before:>12.1f} {after:>12.1f} {change:>+8.1%} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def select_names(patterns: list[str] | None) -> list[str]:
+    if not patterns:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(pattern in name for pattern in patterns)]
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.command == "compare" and not args.baseline.exists():
+        # без базовой линии сравнивать не с чем - это ошибка, а не успех
+        print(f"no baseline at {args.baseline}, run with --save first", file=sys.stderr)
+        return 1
+    if args.command == "compare" and args.result:
+        result = json.loads(args.result.read_text())
+    else:
+        result = run(select_names(args.k), args.repeat)
+
+    if args.command == "run":
+        print(json.dumps(result, indent=2))
+        if args.save:
+            args.baseline.parent.mkdir(parents=True, exist_ok=True)
+            args.baseline.write_text(json.dumps(result, indent=2))
+        return 0
+
+    regressions = compare(json.loads(args.baseline.read_text()), result, args.tolerance)
+    if regressions:
+        print(f"regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("-k", action="append", help="подстрока имени бенчмарка")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--result", type=Path, help="сравнить сохранённый результат вместо нового замера")
+    parser.add_argument("--save", action="store_true")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""
+Заказов в секунду через place_order в зависимости от числа шардов (DB__SHARDS).
+
+Каждое число шардов запускается в отдельном процессе: db_helper создаётся
+при импорте по настройкам окружения. Остаток каждого товара делится между
+шардами поровну, заказы - по одной строке случайного товара.
+
+    python -m benchmarks.shards --clients 64 --seconds 5 --shards 1 --shards 2 --shards 4
+
+--commit-latency-ms добавляет задержку перед каждой транзакцией писателя - модель
+fsync на медленном диске: потолок одного писателя тогда - 1000 / latency
+транзакций в секунду, и рост с числом шардов виден даже на одном ядре.
+--min-speedup - код выхода 1, если последний прогон быстрее первого меньше
+чем во столько раз:
+
+    python -m benchmarks.shards --shards 1 --shards 3 --commit-latency-ms 50 --min-speedup 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from core.config import BASE_DIR
+
+
+async def client(deadline: float, args: argparse.Namespace, rnd: random.Random, stats: dict) -> None:
+    from api_v1.orders.crud import place_order
+    from api_v1.orders.schemas import OrderCreate, OrderLine
+
+    while time.perf_counter() < deadline:
+        line = OrderLine(product_id=rnd.randint(1, args.products), count=1)
+        await place_order(OrderCreate(products=[line]))
+        # заказы, завершённые после конца замера, не считаются
+        if time.perf_counter() < deadline:
+            stats["orders"] += 1
+
+
+async def child(args: argparse.Namespace) -> dict:
+    from sqlalchemy import insert
+
+    from core.models import Base, Product, db_helper
+
+    count_shards = len(db_helper.shards)
+    rows = [
+        {"id": product_id, "name": f"bench {product_id}", "description": "bench product",
+         "price": 100, "stock": args.stock // count_shards}
+        for product_id in range(1, args.products + 1)
+    ]
+    for shard in db_helper.shards:
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await shard.run_write(lambda session: session.execute(insert(Product), rows))
+        if args.commit_latency_ms:
+            run_batch = shard._run_batch
+
+            async def slow_batch(batch, run_batch=run_batch):
+                await asyncio.sleep(args.commit_latency_ms / 1000)
+                await run_batch(batch)
+
+            shard._run_batch = slow_batch
+
+    stats = {"orders": 0}
+    rnd = random.Random(0)
+    deadline = time.perf_counter() + args.seconds
+    await asyncio.gather(*(client(deadline, args, rnd, stats) for _ in range(args.clients)))
+    await db_helper.dispose()
+    return {"shards": count_shards, "orders_per_sec": round(stats["orders"] / args.seconds, 1)}
+
+
+def run(shards: int, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DB__URL": f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite3'}",
+            "DB__SHARDS": str(shards),
+            "CATALOG__ENABLED": "false",
+        }
+        command = [
+            sys.executable, "-m", "benchmarks.shards", "--child",
+            "--clients", str(args.clients), "--seconds", str(args.seconds),
+            "--products", str(args.products), "--stock", str(args.stock),
+            "--commit-latency-ms", str(args.commit_latency_ms),
+        ]
+        output = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+        return 0
+    results = [run(shards, args) for shards in args.shards or [1, 2, 4]]
+    print(json.dumps(results, indent=2))
+    if args.min_speedup:
+        first, last = results[0], results[-1]
+        speedup = last["orders_per_sec"] / first["orders_per_sec"] if first["orders_per_sec"] else 0.0
+        if speedup < args.min_speedup:
+            print(
+                f"{last['shards']} shards are {speedup:.2f}x of {first['shards']}, "
+                f"expected at least {args.min_speedup}x",
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, action="append", help="число шардов, можно несколько")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--products", type=int, default=100)
+    # остатка хватает на весь прогон: переносы между шардами не мешают замеру
+    parser.add_argument("--stock", type=int, default=1_000_000)
+    parser.add_argument("--commit-latency-ms", type=float, default=0.0)
+    parser.add_argument("--min-speedup", type=float, help="ожидаемый рост последнего прогона к первому")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Пропускная способность чтения/записи SQLite для разных наборов PRAGMA.
+
+    python -m benchmarks.sqlite_profiles --writers 8 --readers 8 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from core.config import SqlitePragmas
+from core.models import Base, DatabaseHelper, Product
+
+PROFILES: dict[str, SqlitePragmas] = {
+    # значения по умолчанию самой SQLite (rollback journal, без таймаута)
+    "sqlite-default": SqlitePragmas(
+        journal_mode="delete",
+        synchronous="full",
+        mmap_size=0,
+        cache_size=-2000,
+        temp_store="default",
+        busy_timeout=0,
+        foreign_keys=False,
+    ),
+    "wal-full": SqlitePragmas(synchronous="full"),
+    "wal": SqlitePragmas(),
+}
+
+
+async def writer(helper: DatabaseHelper, deadline: float, stats: dict) -> None:
+    while time.perf_counter() < deadline:
+        async with helper.session_factory() as session:
+            session.add(Product(name="bench", description="bench product", price=100))
+            try:
+                await session.commit()
+            except Exception:
+                stats["write_errors"] += 1
+            else:
+                stats["writes"] += 1
+
+
+async def reader(helper: DatabaseHelper, deadline: float, stats: dict, max_id: int) -> None:
+    while time.perf_counter() < deadline:
+        # пул читателей (mode=ro): чтение не встаёт в очередь за единственным писателем
+        async with helper.read_session_factory() as session:
+            try:
+                await session.get(Product, random.randint(1, max_id))
+            except Exception:
+                stats["read_errors"] += 1
+            else:
+                stats["reads"] += 1
+
+
+async def run_profile(name: str, pragmas: SqlitePragmas, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        helper = DatabaseHelper(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite3'}", pragmas=pragmas)
+        async with helper.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(
+                Product.__table__.insert(),
+                [{"name": f"p{i}", "description": "seed", "price": i} for i in range(args.seed_rows)],
+            )
+        await helper.check_pragmas()
+
+        stats = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(writer(helper, deadline, stats) for _ in range(args.writers)),
+            *(reader(helper, deadline, stats, args.seed_rows) for _ in range(args.readers)),
+        )
+        await helper.dispose()
+    return {
+        "profile": name,
+        "writes_per_sec": round(stats["writes"] / args.seconds, 1),
+        "reads_per_sec": round(stats["reads"] / args.seconds, 1),
+        "write_errors": stats["write_errors"],
+        "read_errors": stats["read_errors"],
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    names = args.profile or list(PROFILES)
+    results = [await run_profile(name, PROFILES[name], args) for name in names]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", action="append", choices=list(PROFILES))
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed-rows", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""
+Время старта приложения: импорт main и вход в lifespan, в отдельном процессе.
+
+    python -m benchmarks.startup --save          # записать базовую линию
+    python -m benchmarks.startup --tolerance 0.2 # код выхода 1 при регрессии
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from core.config import BASE_DIR
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "startup.json"
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(boot())
+print(json.dumps({"import_s": imported - start, "lifespan_s": ready - imported, "total_s": ready - start}))
+"""
+
+
+def measure(repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=BASE_DIR,
+            env=os.environ.copy(),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main(args: argparse.Namespace) -> int:
+    if not args.save and not args.baseline.exists():
+        # без базовой линии сравнивать не с чем - это ошибка, а не успех
+        print(f"no baseline at {args.baseline}, run with --save first", file=sys.stderr)
+        return 1
+    result = measure(args.repeat)
+    print(json.dumps(result, indent=2))
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(result, indent=2))
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    limit = baseline["total_s"] * (1 + args.tolerance)
+    if result["total_s"] > limit:
+        print(
+            f"startup regression: {result['total_s']:.3f}s > {limit:.3f}s "
+            f"(baseline {baseline['total_s']:.3f}s + {args.tolerance:.0%})",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true")
+    sys.exit(main(parser.parse_args()))
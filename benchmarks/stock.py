@@ -0,0 +1,107 @@
+"""
+Резервирование остатков под конкурентной нагрузкой: проверка, что товар
+не продаётся сверх остатка, и число резервирований в секунду через очередь
+писателя в зависимости от окна group commit.
+
+    python -m benchmarks.stock --clients 64 --products 20 --stock 5000 --window 0 --window 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert, select
+
+from api_v1.products.crud import InsufficientStock, reserve_stock
+from core.config import GroupCommitSetting, SqlitePragmas, setting
+from core.models import Base, DatabaseHelper, Product
+
+
+async def client(helper: DatabaseHelper, args: argparse.Namespace, deadline: float,
+                 rnd: random.Random, stats: dict) -> None:
+    while time.perf_counter() < deadline:
+        # заказ из нескольких строк: все резервируются одним UPDATE или ни одна
+        lines = rnd.sample(range(1, args.products + 1), k=min(args.lines, args.products))
+        quantities = {product_id: rnd.randint(1, args.max_count) for product_id in lines}
+        try:
+            await helper.run_write(lambda session: reserve_stock(session=session, quantities=quantities))
+        except InsufficientStock:
+            stats["rejected"] += 1
+            continue
+        stats["reserved"] += 1
+        for product_id, count in quantities.items():
+            stats["sold"][product_id] += count
+
+
+async def run(window_ms: float | None, args: argparse.Namespace) -> dict:
+    group_commit = GroupCommitSetting(
+        enabled=window_ms is not None,
+        window_ms=window_ms or 0,
+        max_batch=args.max_batch,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        helper = DatabaseHelper(
+            f"sqlite+aiosqlite:///{Path(tmp) / 'bench.sqlite3'}",
+            pragmas=SqlitePragmas(synchronous=args.synchronous),
+            group_commit=group_commit,
+        )
+        async with helper.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Product), [
+                {"id": i, "name": f"Product {i}", "description": "bench product", "price": 100, "stock": args.stock}
+                for i in range(1, args.products + 1)
+            ])
+
+        stats = {"reserved": 0, "rejected": 0, "sold": {i: 0 for i in range(1, args.products + 1)}}
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        await asyncio.gather(*(
+            client(helper, args, deadline, random.Random(seed), stats) for seed in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+        async with helper.read_session_factory() as session:
+            left = dict((await session.execute(select(Product.id, Product.stock))).tuples().all())
+        await helper.dispose()
+
+    # перепродажа - отрицательный остаток или расхождение проданного со списанным
+    mismatched = [
+        product_id for product_id, sold in stats["sold"].items()
+        if left[product_id] < 0 or args.stock - sold != left[product_id]
+    ]
+    return {
+        "window_ms": window_ms if window_ms is not None else "off",
+        "reservations_per_sec": round(stats["reserved"] / elapsed, 1),
+        "attempts_per_sec": round((stats["reserved"] + stats["rejected"]) / elapsed, 1),
+        "reserved": stats["reserved"],
+        "rejected": stats["rejected"],
+        "sold_out": sum(1 for stock in left.values() if stock < args.max_count),
+        "oversold": mismatched,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    windows = [None, *(args.window or [0, 2])]
+    results = [await run(window, args) for window in windows]
+    print(json.dumps(results, indent=2))
+    if any(result["oversold"] for result in results):
+        raise SystemExit("stock invariant violated")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--window", type=float, action="append", help="окно в мс, можно несколько")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=3, help="строк в одном резервировании")
+    parser.add_argument("--max-count", type=int, default=3)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--synchronous", default="full", choices=["off", "normal", "full", "extra"])
+    # снимок каталога читает БД приложения, а не временную БД бенчмарка
+    setting.catalog.enabled = False
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+Задержка подсказок GET /products/suggest на уровне индекса в памяти:
+поиск по префиксам, как их набирает пользователь (1-8 символов начала
+слова), с кэшем ответов и без него, и обновление индекса при записи товара.
+Код выхода 1, если p99 выходит за цель.
+
+    python -m benchmarks.suggest --products 100000 --target lookup=0.5 --target upsert=2
+"""
+import argparse
+import json
+import random
+import time
+
+from api_v1.products.suggest import SuggestIndex
+from benchmarks.loadtest import percentile
+from core.config import setting
+
+# p99 в мс по умолчанию; uncached - справочно, без цели
+DEFAULT_TARGETS = {"lookup": 1.0, "lookup_after_writes": 1.0, "upsert": 5.0}
+
+
+def _names(count: int, rnd: random.Random) -> dict[int, str]:
+    syllables = ["ka", "ro", "mi", "te", "su", "lo", "na", "vi", "de", "po", "gra", "ster", "mon", "bel", "tri"]
+    words = list({"".join(rnd.choices(syllables, k=rnd.randint(2, 4))) for _ in range(5000)})
+    return {i: " ".join(rnd.choices(words, k=rnd.randint(1, 4))).title() for i in range(1, count + 1)}
+
+
+def _prefixes(names: dict[int, str], count: int, rnd: random.Random) -> list[str]:
+    # чаще короткие: каждое нажатие клавиши - отдельный запрос
+    words = [word for name in rnd.sample(list(names.values()), k=min(len(names), 2000)) for word in name.split()]
+    return [rnd.choice(words)[:rnd.randint(1, 8)] for _ in range(count)]
+
+
+def _measure(call, values: list) -> dict:
+    latencies = []
+    for value in values:
+        started = time.perf_counter()
+        call(value)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "ops": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4),
+    }
+
+
+def main(args: argparse.Namespace) -> dict:
+    rnd = random.Random(args.seed)
+    names = _names(args.products, rnd)
+    # популярность с длинным хвостом, как у заказов в benchmarks.dataset
+    weights = {product_id: int(rnd.paretovariate(1.2)) for product_id in names if rnd.random() < 0.3}
+    prefixes = _prefixes(names, args.lookups, rnd)
+    limit = setting.suggest.max_limit
+
+    started = time.perf_counter()
+    index = SuggestIndex(limit, setting.suggest.cache_size, setting.suggest.popularity_interval)
+    index.load(dict(names), dict(weights))
+    results = {"build_seconds": round(time.perf_counter() - started, 2)}
+
+    uncached = SuggestIndex(limit, 0, setting.suggest.popularity_interval)
+    uncached.load(dict(names), dict(weights))
+    results["uncached"] = _measure(lambda prefix: uncached.suggest(prefix, limit), prefixes)
+    results["lookup"] = _measure(lambda prefix: index.suggest(prefix, limit), prefixes)
+    results["lookup"]["cache_hit_ratio"] = round(index.cache_hits / max(index.lookups, 1), 3)
+
+    # новые товары и переименования существующих
+    renames = [(rnd.randint(1, args.products + args.upserts), names[rnd.randint(1, args.products)])
+               for _ in range(args.upserts)]
+
+    results["upsert"] = _measure(lambda change: index.upsert(*change), renames)
+    # поиск после записей: сброшенные ими ответы считаются заново
+    results["lookup_after_writes"] = _measure(lambda prefix: index.suggest(prefix, limit), prefixes)
+
+    targets = {**DEFAULT_TARGETS, **dict(args.target or [])}
+    results["failed"] = [name for name, target in targets.items() if results[name]["p99_ms"] > target]
+    results["targets_ms"] = targets
+    return results
+
+
+def _target(value: str) -> tuple[str, float]:
+    name, _, ms = value.partition("=")
+    if name not in DEFAULT_TARGETS:
+        raise argparse.ArgumentTypeError(f"unknown target {name!r}")
+    return name, float(ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--upserts", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", type=_target, action="append", help="имя=p99 в мс, например lookup=0.5")
+    result = main(parser.parse_args())
+    print(json.dumps(result, indent=2))
+    if result["failed"]:
+        raise SystemExit(1)
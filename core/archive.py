@@ -0,0 +1,154 @@
+"""
+Архив старых заказов.
+
+Заказы старше horizon_days вместе со строками переносятся порциями по
+batch_size из orders и order_product_association в одноимённые таблицы
+файла archive.sqlite3, подключённого к каждому соединению схемой archive
+(см. DatabaseHelper._apply_pragmas). Живые таблицы и их индексы перестают
+расти с историей, а GET /orders/{id} дочитывает перенесённые заказы из архива.
+
+Порция - две транзакции в очереди писателя: копирование в архив и, только
+после её фиксации, удаление из живых таблиц. Одна транзакция на оба файла
+не спасла бы: в режиме WAL SQLite фиксирует подключённые базы по отдельности,
+и сбой между фиксациями мог бы потерять заказы. Так после сбоя порция
+в худшем случае остаётся в обоих файлах; повторный перенос перезапишет
+архивные строки (INSERT OR REPLACE) и удалит живые. Схема архива создаётся по текущим
+колонкам моделей; новые колонки в уже созданный архив нужно добавлять вручную.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import Order, OrderProductAssociation, db_helper
+from core.models.db_helper import ARCHIVE_SCHEMA
+
+archive_metadata = MetaData()
+
+
+def _archive_table(table: Table) -> Table:
+    # те же колонки без внешних ключей: товаров в архиве нет
+    return Table(
+        table.name,
+        archive_metadata,
+        *(Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+          for column in table.columns),
+        schema=ARCHIVE_SCHEMA,
+    )
+
+
+archived_orders = _archive_table(Order.__table__)
+archived_order_lines = _archive_table(OrderProductAssociation.__table__)
+Index("ix_archive_order_lines_orders_id", archived_order_lines.c.orders_id)
+
+
+class OrderArchiver:
+    def __init__(self, horizon_days: int, batch_size: int, pause: float, interval: float):
+        self.horizon = timedelta(days=horizon_days)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.orders_moved = 0
+        self.lines_moved = 0
+        self.runs = 0
+        self.last_run_seconds = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def ensure_schema(self) -> None:
+        async with db_helper.engine.begin() as conn:
+            await conn.run_sync(archive_metadata.create_all)
+
+    async def archive_batch(self, before: datetime) -> int:
+        """Перенести одну порцию заказов старше before; возвращает число заказов"""
+
+        async def copy(session: AsyncSession) -> list[int]:
+            orders, lines = Order.__table__, OrderProductAssociation.__table__
+            # последний id не переносится никогда: SQLite без AUTOINCREMENT
+            # выдаёт новый id как max(id) + 1 и иначе повторил бы архивный.
+            # Старые заказы лежат в начале по id, поэтому выборка по первичному
+            # ключу с LIMIT заканчивается быстро и без индекса по created_at
+            ids = list(await session.scalars(
+                select(orders.c.id)
+                .where(orders.c.created_at < before, orders.c.id < select(func.max(orders.c.id)).scalar_subquery())
+                .order_by(orders.c.id)
+                .limit(self.batch_size)
+            ))
+            if not ids:
+                return ids
+            await session.execute(
+                insert(archived_orders).prefix_with("OR REPLACE").from_select(
+                    [column.name for column in orders.columns],
+                    select(orders).where(orders.c.id.in_(ids)),
+                )
+            )
+            result = await session.execute(
+                insert(archived_order_lines).prefix_with("OR REPLACE").from_select(
+                    [column.name for column in lines.columns],
+                    select(lines).where(lines.c.orders_id.in_(ids)),
+                )
+            )
+            self.lines_moved += result.rowcount
+            return ids
+
+        async def remove(session: AsyncSession) -> None:
+            orders, lines = Order.__table__, OrderProductAssociation.__table__
+            await session.execute(delete(lines).where(lines.c.orders_id.in_(ids)))
+            await session.execute(delete(orders).where(orders.c.id.in_(ids)))
+
+        # run_write возвращается после фиксации: удаление начнётся, когда копия
+        # уже в файле архива, и не попадёт с ней в одну группу group commit
+        ids = await db_helper.run_write(copy)
+        if ids:
+            await db_helper.run_write(remove)
+        self.orders_moved += len(ids)
+        return len(ids)
+
+    async def run_once(self) -> int:
+        started = time.perf_counter()
+        before = datetime.now() - self.horizon
+        total = 0
+        # короткие порции с паузами: очередь писателя не занята надолго
+        while moved := await self.archive_batch(before):
+            total += moved
+            await asyncio.sleep(self.pause)
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+        return total
+
+    async def _loop(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        return [
+            "# TYPE archive_orders_moved_total counter",
+            f"archive_orders_moved_total {self.orders_moved}",
+            "# TYPE archive_order_lines_moved_total counter",
+            f"archive_order_lines_moved_total {self.lines_moved}",
+            "# TYPE archive_runs_total counter",
+            f"archive_runs_total {self.runs}",
+            "# TYPE archive_last_run_seconds gauge",
+            f"archive_last_run_seconds {self.last_run_seconds:.3f}",
+        ]
+
+
+order_archiver = OrderArchiver(
+    horizon_days=setting.archive.horizon_days,
+    batch_size=setting.archive.batch_size,
+    pause=setting.archive.pause,
+    interval=setting.archive.interval,
+)
@@ -0,0 +1,160 @@
+"""
+Порционное заполнение данных в миграциях Alembic.
+
+Один большой UPDATE держит блокировку записи SQLite до самого конца.
+backfill() обновляет таблицу порциями по возрастанию ключа, каждая порция -
+отдельная короткая транзакция, а достигнутый ключ сохраняется в таблице
+_backfill_checkpoints. Прерванная миграция при повторном запуске продолжает
+с последней зафиксированной порции.
+
+Заполнение лучше выносить в отдельную ревизию, без DDL:
+
+    from core.backfill import backfill
+
+    def upgrade() -> None:
+        backfill(
+            "order_product_association.unit_price",
+            table="order_product_association",
+            values="unit_price = (SELECT price FROM products "
+                   "WHERE products.id = order_product_association.product_id)",
+            where="unit_price = 0",
+            batch_size=5000,
+            pause=0.05,
+        )
+"""
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+log = logging.getLogger("alembic.backfill")
+
+CHECKPOINT_TABLE = "_backfill_checkpoints"
+
+
+def _ensure_checkpoint_table(connection: Connection) -> None:
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} ("
+        "name VARCHAR PRIMARY KEY, "
+        "table_name VARCHAR NOT NULL, "
+        "last_key INTEGER, "
+        "rows_done INTEGER NOT NULL DEFAULT 0, "
+        "finished BOOLEAN NOT NULL DEFAULT 0, "
+        "updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+def _load_checkpoint(connection: Connection, name: str, table: str) -> tuple[int | None, int, bool]:
+    row = connection.execute(
+        text(f"SELECT last_key, rows_done, finished FROM {CHECKPOINT_TABLE} WHERE name = :name"),
+        {"name": name},
+    ).first()
+    if row is None:
+        connection.execute(
+            text(f"INSERT INTO {CHECKPOINT_TABLE} (name, table_name) VALUES (:name, :table)"),
+            {"name": name, "table": table},
+        )
+        return None, 0, False
+    return row.last_key, row.rows_done, bool(row.finished)
+
+
+def backfill(
+        name: str,
+        table: str,
+        values: str,
+        where: str | None = None,
+        key: str = "id",
+        batch_size: int = 1000,
+        pause: float = 0.0,
+        connection: Connection | None = None,
+) -> int:
+    """
+    Выполнить UPDATE table SET values [WHERE where] порциями по batch_size строк.
+    name - уникальное имя заполнения для контрольной точки, pause - секунды
+    между порциями, чтобы дать пройти другим писателям.
+    Без connection работает внутри миграции через op.get_bind(); переданное
+    соединение не должно быть в транзакции.
+    Возвращает общее число обновлённых строк.
+    """
+    if connection is None:
+        from alembic import op
+
+        # каждая порция фиксируется сама, поэтому транзакция миграции
+        # на время заполнения приостанавливается
+        with op.get_context().autocommit_block():
+            return _backfill(name, table, values, where, key, batch_size, pause, op.get_bind())
+
+    # как autocommit_block: без него sqlite3 открывает неявную транзакцию
+    # на записи контрольной точки, и BEGIN IMMEDIATE порции не проходит
+    isolation_level = connection.get_isolation_level()
+    connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        # autobegin SQLAlchemy: транзакциями управляют BEGIN IMMEDIATE/COMMIT порций
+        with connection.begin():
+            return _backfill(name, table, values, where, key, batch_size, pause, connection)
+    finally:
+        connection.execution_options(isolation_level=isolation_level)
+
+
+def _backfill(name: str, table: str, values: str, where: str | None, key: str,
+              batch_size: int, pause: float, connection: Connection) -> int:
+    condition = f" AND ({where})" if where else ""
+    _ensure_checkpoint_table(connection)
+    last_key, rows_done, finished = _load_checkpoint(connection, name, table)
+    if finished:
+        log.info("backfill %s already finished: %d rows", name, rows_done)
+        return rows_done
+    if last_key is not None:
+        log.info("backfill %s resumed after %s=%s (%d rows done)", name, key, last_key, rows_done)
+
+    lower_bound = f"{key} > :last_key" if last_key is not None else "1 = 1"
+    started = time.monotonic()
+    while True:
+        # верхняя граница порции по ключу: обновление идёт по диапазону,
+        # поэтому каждая порция использует индекс первичного ключа
+        upper_key = connection.execute(
+            text(
+                f"SELECT max({key}) FROM (SELECT {key} FROM {table} "
+                f"WHERE {lower_bound}{condition} ORDER BY {key} LIMIT :batch_size)"
+            ),
+            {"last_key": last_key, "batch_size": batch_size},
+        ).scalar()
+        if upper_key is None:
+            break
+
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            updated = connection.execute(
+                text(f"UPDATE {table} SET {values} WHERE {lower_bound} AND {key} <= :upper_key{condition}"),
+                {"last_key": last_key, "upper_key": upper_key},
+            ).rowcount
+            rows_done += max(updated, 0)
+            connection.execute(
+                text(
+                    f"UPDATE {CHECKPOINT_TABLE} SET last_key = :last_key, rows_done = :rows_done, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE name = :name"
+                ),
+                {"last_key": upper_key, "rows_done": rows_done, "name": name},
+            )
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+        last_key = upper_key
+        lower_bound = f"{key} > :last_key"
+        elapsed = time.monotonic() - started
+        log.info(
+            "backfill %s: %d rows, %s=%s, %.0f rows/s",
+            name, rows_done, key, last_key, rows_done / elapsed if elapsed else 0,
+        )
+        if pause:
+            time.sleep(pause)
+
+    connection.execute(
+        text(f"UPDATE {CHECKPOINT_TABLE} SET finished = 1, updated_at = CURRENT_TIMESTAMP WHERE name = :name"),
+        {"name": name},
+    )
+    log.info("backfill %s finished: %d rows", name, rows_done)
+    return rows_done
@@ -0,0 +1,50 @@
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+
+class SharedSession:
+    # одна сессия читателя на несколько одновременно выполняющихся подзапросов:
+    # AsyncSession не допускает параллельных операций, поэтому они идут по очереди
+    # (stream не разделяется: курсор остался бы открытым после снятия блокировки)
+    _serialized = {"execute", "scalar", "scalars", "get", "get_one", "refresh"}
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._lock = asyncio.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.session, name)
+        if name not in self._serialized:
+            return attr
+
+        async def locked(*args, **kwargs):
+            async with self._lock:
+                return await attr(*args, **kwargs)
+
+        return locked
+
+
+@dataclass
+class BatchScope:
+    # состояние, общее для подзапросов одного POST /batch
+    session: SharedSession | None = None  # есть, пока выполняется группа GET
+    cache: dict[Hashable, object] = field(default_factory=dict)
+
+
+current_batch: ContextVar[BatchScope | None] = ContextVar("current_batch", default=None)
+
+
+def batch_cached(key: Hashable, fn: Callable[[], T]) -> T:
+    """Результат fn() один на весь пакет; вне пакета - просто fn()"""
+    scope = current_batch.get()
+    if scope is None:
+        return fn()
+    if key not in scope.cache:
+        scope.cache[key] = fn()
+    return scope.cache[key]
@@ -1,15 +1,50 @@
 from pathlib import Path
-from pydantic_settings import BaseSettings
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import BaseModel, Field
 
 BASE_DIR = Path(__file__).parent.parent
 
 DB_PATH = BASE_DIR / "db.sqlite3"
 
 
+class SqlitePragmas(BaseModel):
+    # PRAGMA, выполняемые на каждом новом соединении с SQLite
+    journal_mode: Literal["delete", "truncate", "persist", "memory", "wal", "off"] = "wal"
+    synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+    mmap_size: int = Field(default=256 * 1024 * 1024, ge=0)  # байты
+    cache_size: int = -64 * 1024  # отрицательное значение - размер в KiB
+    temp_store: Literal["default", "file", "memory"] = "memory"
+    busy_timeout: int = Field(default=5000, ge=0)  # миллисекунды
+    foreign_keys: bool = True
+
+
+class GroupCommitSetting(BaseModel):
+    # запись нескольких операций одной транзакцией (один fsync на группу)
+    enabled: bool = False
+    window_ms: float = Field(default=2.0, ge=0)
+    max_batch: int = Field(default=64, ge=1)
+
+
+class SlowQuerySetting(BaseModel):
+    enabled: bool = True
+    threshold_ms: float = Field(default=100.0, ge=0)
+    max_entries: int = Field(default=500, ge=1)  # уникальных отпечатков запросов
+
+
 class DbSetting(BaseModel):
     url: str = f"sqlite+aiosqlite:///{DB_PATH}"
     echo: bool = False
+    pragmas: SqlitePragmas = SqlitePragmas()
+    # соединения только для чтения (mode=ro); писатель всегда один
+    read_pool_size: int = Field(default=5, ge=1)
+    group_commit: GroupCommitSetting = GroupCommitSetting()
+    slow_query: SlowQuerySetting = SlowQuerySetting()
+    # файлов SQLite, по которым распределяются заказы (id % shards) и доли остатков
+    # товаров, см. DatabaseHelper и api_v1/products/shards.py; число задаётся до
+    # первых заказов - перераспределения существующих строк нет
+    shards: int = Field(default=1, ge=1)
 
 
 class AuthJWT(BaseModel):
@@ -20,12 +55,132 @@ class AuthJWT(BaseModel):
     refresh_token_expire_day: int = 30
 
 
+class ProfilerSetting(BaseModel):
+    # сэмплирующий профайлер запросов, см. core/profiler.py
+    secret: str | None = None  # ключ HMAC для заголовка x-profile-token
+    sample_rate: float = Field(default=0.0, ge=0, le=1)  # доля запросов, профилируемых всегда
+    interval_ms: float = Field(default=5.0, gt=0)
+    max_profiles: int = Field(default=50, ge=1)
+    max_depth: int = Field(default=128, ge=1)
+
+
+class IdempotencySetting(BaseModel):
+    # заголовок Idempotency-Key для POST, см. core/idempotency.py
+    enabled: bool = True
+    ttl: int = Field(default=24 * 3600, ge=1)  # секунды хранения ответа
+    lock_timeout: int = Field(default=60, ge=1)  # после этого незавершённый ключ считается брошенным
+    wait_timeout: float = Field(default=10.0, ge=0)  # ожидание повтором выполняющегося запроса
+    max_body: int = Field(default=1024 ** 2, ge=0)  # тело с ключом держится в памяти, больше - 413
+
+
+class CatalogSetting(BaseModel):
+    # снимок каталога товаров для GET /products/, см. api_v1/products/snapshot.py
+    enabled: bool = True
+    path: Path = BASE_DIR / "catalog.snapshot"
+    page_size: int = Field(default=100, ge=1)
+    check_interval: float = Field(default=1.0, ge=0)  # как часто проверять, не пересобрал ли его другой воркер
+    rebuild_delay: float = Field(default=0.5, ge=0)  # изменения товаров за это время - одна пересборка
+    stock_refresh_interval: float = Field(default=30.0, ge=0)  # на столько могут отставать остатки в списке
+
+
+class ChangesSetting(BaseModel):
+    # outbox изменений товаров и GET /products/changes, см. api_v1/products/changes.py
+    poll_interval: float = Field(default=1.0, gt=0)  # изменения из других воркеров видны с этой задержкой
+    batch_size: int = Field(default=500, ge=1)
+    queue_size: int = Field(default=1000, ge=1)  # отстающий сильнее подписчик отключается
+    keepalive: float = Field(default=15.0, gt=0)  # секунды между комментариями-пингами
+    retention_hours: int = Field(default=7 * 24, ge=1)
+
+
+class OrderImportSetting(BaseModel):
+    # POST /orders/imports/, см. api_v1/orders/importer.py
+    spool_dir: Path | None = None  # None - системный каталог временных файлов
+    max_bytes: int = Field(default=1024 ** 3, ge=1)  # больший файл - 413
+    chunk_size: int = Field(default=500, ge=1)  # заказов в одной транзакции
+    max_errors: int = Field(default=1000, ge=0)  # сохраняемых ошибок строк, остальные только считаются
+    pause: float = Field(default=0.0, ge=0)  # секунды между порциями для других писателей
+
+
+class SuggestSetting(BaseModel):
+    # GET /products/suggest, см. api_v1/products/suggest.py
+    enabled: bool = True
+    max_limit: int = Field(default=10, ge=1)
+    cache_size: int = Field(default=10_000, ge=0)  # префиксов с готовым ответом
+    popularity_interval: float = Field(default=300.0, gt=0)  # секунды между пересчётами популярности
+
+
+class ArchiveSetting(BaseModel):
+    # перенос старых заказов в отдельный файл SQLite, см. core/archive.py
+    enabled: bool = False
+    path: Path = BASE_DIR / "archive.sqlite3"
+    horizon_days: int = Field(default=365, ge=1)  # заказы старше переносятся
+    batch_size: int = Field(default=500, ge=1)  # заказов в одной транзакции
+    pause: float = Field(default=0.05, ge=0)  # секунды между порциями для других писателей
+    interval: float = Field(default=3600.0, gt=0)  # секунды между проходами
+
+
+class BatchSetting(BaseModel):
+    # POST /api/v1/batch
+    max_requests: int = Field(default=20, ge=1)
+    max_concurrency: int = Field(default=8, ge=1)  # одновременно выполняемых GET
+    timeout: float = Field(default=5.0, gt=0)  # секунды на весь пакет
+
+
+class AdminSetting(BaseModel):
+    # служебные эндпоинты /admin/* выключены, пока токен не задан
+    token: str | None = None
+
+
+class ServerSetting(BaseModel):
+    # запуск через server.py; workers=None - по числу CPU
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int | None = Field(default=None, ge=1)
+    # auto - uvloop и httptools, если установлены
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    backlog: int = Field(default=2048, ge=1)
+    keep_alive: int = Field(default=5, ge=0)  # секунды
+    limit_concurrency: int | None = Field(default=None, ge=1)  # на воркер, сверх лимита - 503
+    graceful_timeout: int = Field(default=30, ge=0)  # секунды на завершение запросов при SIGTERM
+    # потоков AnyIO на воркер для def-маршрутов, def-зависимостей и run_sync
+    threadpool_size: int = Field(default=40, ge=1)
+    log_level: str = "info"
+    access_log: bool = True
+
+
 class Setting(BaseSettings):
+    # вложенные настройки задаются через окружение: DB__PRAGMAS__SYNCHRONOUS=full
+    model_config = SettingsConfigDict(env_nested_delimiter="__")
+
     api_v1_prefix: str = "/api/v1"
+    # быстрый старт: вместо create_all сверяется ревизия Alembic,
+    # пул соединений и горячие запросы прогреваются до первого запроса
+    fast_boot: bool = False
 
     db: DbSetting = DbSetting()
 
     auth_jwt: AuthJWT = AuthJWT()
 
+    admin: AdminSetting = AdminSetting()
+
+    profiler: ProfilerSetting = ProfilerSetting()
+
+    idempotency: IdempotencySetting = IdempotencySetting()
+
+    catalog: CatalogSetting = CatalogSetting()
+
+    changes: ChangesSetting = ChangesSetting()
+
+    suggest: SuggestSetting = SuggestSetting()
+
+    order_import: OrderImportSetting = OrderImportSetting()
+
+    batch: BatchSetting = BatchSetting()
+
+    archive: ArchiveSetting = ArchiveSetting()
+
+    server: ServerSetting = ServerSetting()
+
 
 setting = Setting()
@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import select
+
+from core.models import Product, db_helper
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class BatchLoader(Generic[K, V]):
+    # загрузчик в стиле DataLoader: ключи, запрошенные за один оборот цикла
+    # событий (или за window_ms), загружаются одним вызовом batch_fn
+
+    def __init__(
+            self,
+            name: str,
+            batch_fn: Callable[[list[K]], Awaitable[dict[K, V]]],
+            window_ms: float = 0.0,
+            max_batch: int = 500,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.keys_loaded = 0
+        # у каждого цикла событий своя копящаяся партия
+        self._pending: WeakKeyDictionary[asyncio.AbstractEventLoop, dict[K, asyncio.Future]] = WeakKeyDictionary()
+        self._timers: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Handle] = WeakKeyDictionary()
+
+    async def load(self, key: K) -> V | None:
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(loop)
+        if pending is None:
+            pending = self._pending[loop] = {}
+            # партия выполняется в контексте открывшего её запроса: её SQL
+            # попадает в его Server-Timing, как у SingleFlight
+            context = contextvars.copy_context()
+            if self.window:
+                self._timers[loop] = loop.call_later(self.window, self._dispatch, loop, pending, context)
+            else:
+                self._timers[loop] = loop.call_soon(self._dispatch, loop, pending, context)
+        future = pending.get(key)
+        if future is None:
+            future = pending[key] = loop.create_future()
+            if len(pending) >= self.max_batch:
+                self._dispatch(loop, pending, contextvars.copy_context())
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop, pending: dict[K, asyncio.Future],
+                  context: contextvars.Context) -> None:
+        # партия уходит один раз - по таймеру или раньше, набрав max_batch;
+        # таймер отправленной партии отменяется, чтобы не отправить следующую до срока
+        if self._pending.get(loop) is not pending:
+            return
+        del self._pending[loop]
+        self._timers.pop(loop).cancel()
+        loop.create_task(self._resolve(pending), context=context)
+
+    async def _resolve(self, pending: dict[K, asyncio.Future]) -> None:
+        self.batches += 1
+        self.keys_loaded += len(pending)
+        try:
+            values = await self.batch_fn(list(pending))
+        except BaseException as exc:
+            # и при отмене партии (остановка приложения) ждущие не должны висеть
+            for future in pending.values():
+                if future.done():
+                    continue
+                if isinstance(exc, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+    def metrics(self) -> list[str]:
+        labels = f'name="{self.name}"'
+        return [
+            f"dataloader_batches_total{{{labels}}} {self.batches}",
+            f"dataloader_keys_total{{{labels}}} {self.keys_loaded}",
+        ]
+
+
+loaders: list[BatchLoader] = []
+
+
+def model_loader(model, window_ms: float = 0.0, max_batch: int = 500) -> BatchLoader:
+    # загрузка по первичному ключу: WHERE id IN (...) в своей сессии читателя;
+    # объекты возвращаются отсоединёнными и годятся только для чтения.
+    # Вызывающий не должен держать своё соединение читателя: при занятом
+    # пуле партия ждала бы соединения, которое он не отдаст
+
+    async def batch(ids: list[int]) -> dict[int, object]:
+        async with db_helper.read_session_factory() as session:
+            rows = await session.scalars(select(model).where(model.id.in_(ids)))
+            return {row.id: row for row in rows}
+
+    loader = BatchLoader(model.__name__, batch, window_ms=window_ms, max_batch=max_batch)
+    loaders.append(loader)
+    return loader
+
+
+def dataloader_metrics() -> list[str]:
+    # сборщик для /metrics в формате Prometheus
+    lines = ["# TYPE dataloader_batches_total counter", "# TYPE dataloader_keys_total counter"]
+    for loader in loaders:
+        lines += loader.metrics()
+    return lines
+
+
+product_loader: BatchLoader[int, Product] = model_loader(Product)
@@ -0,0 +1,238 @@
+"""
+Заголовок Idempotency-Key для POST-запросов.
+
+Первый запрос с ключом занимает его в таблице idempotency_keys, выполняется
+и сохраняет ответ. Повтор с тем же ключом и тем же телом получает
+сохранённый ответ без обращения к доменным таблицам; с другим телом - 422.
+Пока первый запрос выполняется, повторы ждут его завершения (не дольше
+wait_timeout, затем 409). Ответы 5xx не сохраняются - ключ освобождается
+для следующей попытки.
+
+Тело запроса держится в памяти для отпечатка и повторной передачи, поэтому
+оно ограничено max_body (больше - 413). Маршруты с потоковым телом
+(импорт заказов до order_import.max_bytes) middleware пропускает как есть:
+заголовок на них не действует.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import setting
+from core.models import IdempotencyKey, db_helper
+
+HEADER = b"idempotency-key"
+# заголовки, относящиеся к конкретному выполнению, а не к ответу
+NOT_STORED_HEADERS = {b"server-timing", b"x-profile-id", b"date", b"server"}
+POLL_INTERVAL = 0.05
+PURGE_BATCH = 100
+# тело принимается потоком и в память не читается
+STREAMING_PATHS = {f"{setting.api_v1_prefix}/orders/imports/"}
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def request_fingerprint(scope, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope["query_string"], body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: int, lock_timeout: int):
+        self.ttl = timedelta(seconds=ttl)
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+
+    async def get(self, key: str) -> IdempotencyKey | None:
+        async with db_helper.read_session_factory() as session:
+            record = await session.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+        if record is None or record.expires_at < datetime.now():
+            return None
+        if record.status_code is None and record.locked_until < datetime.now():
+            # выполнявший запрос процесс, видимо, упал - ключ снова свободен
+            return None
+        return record
+
+    async def claim(self, key: str, fingerprint: str) -> bool:
+        now = datetime.now()
+
+        async def operation(session: AsyncSession) -> bool:
+            # попутно удаляется порция просроченных ключей - отдельная чистка не нужна
+            expired = select(IdempotencyKey.id).where(IdempotencyKey.expires_at < now).limit(PURGE_BATCH)
+            await session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired)))
+            await session.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.key == key,
+                    or_(
+                        IdempotencyKey.expires_at < now,
+                        IdempotencyKey.status_code.is_(None) & (IdempotencyKey.locked_until < now),
+                    ),
+                )
+            )
+            result = await session.execute(
+                insert(IdempotencyKey)
+                .values(
+                    key=key,
+                    fingerprint=fingerprint,
+                    locked_until=now + self.lock_timeout,
+                    expires_at=now + self.ttl,
+                )
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+            )
+            return result.rowcount == 1
+
+        return await db_helper.run_write(operation)
+
+    async def complete(self, key: str, status_code: int, headers: list, body: bytes) -> None:
+        async def operation(session: AsyncSession) -> None:
+            await session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(status_code=status_code, headers=json.dumps(headers), body=body)
+            )
+
+        await db_helper.run_write(operation)
+
+    async def release(self, key: str) -> None:
+        async def operation(session: AsyncSession) -> None:
+            await session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+            )
+
+        await db_helper.run_write(operation)
+
+
+async def _send_json(send, status_code: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    # ASGI middleware: работает только для POST с заголовком Idempotency-Key
+
+    def __init__(self, app, store: IdempotencyStore | None = None, wait_timeout: float | None = None,
+                 max_body: int | None = None):
+        self.app = app
+        self.store = store or IdempotencyStore(setting.idempotency.ttl, setting.idempotency.lock_timeout)
+        self.wait_timeout = setting.idempotency.wait_timeout if wait_timeout is None else wait_timeout
+        self.max_body = setting.idempotency.max_body if max_body is None else max_body
+        # ключи, выполняющиеся в этом процессе: повторы ждут future, а не опрашивают БД
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        key = next((value for name, value in scope["headers"] if name == HEADER), None)
+        if key is None or scope["path"].removeprefix(scope.get("root_path", "")) in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await self._idempotent(scope, receive, send, key.decode("latin-1"))
+
+    async def _idempotent(self, scope, receive, send, key: str):
+        try:
+            body = await self._read_body(scope, receive, self.max_body)
+        except BodyTooLarge:
+            await _send_json(send, 413, f"Requests with Idempotency-Key are limited to {self.max_body} bytes")
+            return
+        fingerprint = request_fingerprint(scope, body)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while True:
+            record = await self.store.get(key)
+            if record is not None and record.fingerprint != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was used with a different request")
+                return
+            if record is not None and record.status_code is not None:
+                await self._replay(send, record)
+                return
+            if record is None and await self.store.claim(key, fingerprint):
+                break
+            # ключ занят выполняющимся запросом
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                await _send_json(send, 409, "A request with this Idempotency-Key is in progress")
+                return
+            waiter = self._inflight.get(key)
+            if waiter is not None:
+                await asyncio.wait([waiter], timeout=remaining)
+            else:
+                await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+        done = loop.create_future()
+        self._inflight[key] = done
+        try:
+            await self._execute(scope, receive, send, key, body)
+        finally:
+            del self._inflight[key]
+            done.set_result(None)
+
+    async def _execute(self, scope, receive, send, key: str, body: bytes):
+        response = {"status": 500, "headers": [], "body": []}
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in NOT_STORED_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await asyncio.shield(self.store.release(key))
+            raise
+        if response["status"] >= 500:
+            await self.store.release(key)
+        else:
+            await self.store.complete(key, response["status"], response["headers"], b"".join(response["body"]))
+
+    @staticmethod
+    async def _read_body(scope, receive, limit: int) -> bytes:
+        length = next((value for name, value in scope["headers"] if name == b"content-length"), None)
+        if length is not None and length.isdigit() and int(length) > limit:
+            raise BodyTooLarge
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                raise BodyTooLarge
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _replay(send, record: IdempotencyKey) -> None:
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers)]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": record.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": record.body})
@@ -0,0 +1,213 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.slow_queries import normalize_sql, slow_query_log
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0  # секунды внутри cursor.execute
+    pool_wait: float = 0.0  # секунды ожидания соединения из пула
+    rows: int = 0  # загруженные ORM-объекты и строки, изменённые DML
+    scope: dict | None = field(default=None, repr=False)
+    # (начало, длительность, SQL) по каждому запросу - только для профилируемых запросов
+    timeline: list[tuple[float, float, str]] | None = field(default=None, repr=False)
+
+    @property
+    def route(self) -> str | None:
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path_format', None) or self.scope['path']}"
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements, {self.rows} rows"',
+            f"pool;dur={self.pool_wait * 1000:.2f}",
+            f"app;dur={total * 1000:.2f}",
+        ])
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = perf_counter() - conn.info["query_start_time"].pop()
+    stats = request_stats.get()
+    if slow_query_log.enabled and elapsed >= slow_query_log.threshold:
+        database = conn.engine.url.database if conn.dialect.name == "sqlite" else None
+        slow_query_log.record(
+            statement,
+            parameters,
+            elapsed,
+            route=stats.route if stats else None,
+            database=database and database.removeprefix("file:"),
+            executemany=executemany,
+        )
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_time += elapsed
+    if stats.timeline is not None:
+        stats.timeline.append((perf_counter() - elapsed, elapsed, normalize_sql(statement)))
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        stats.rows += max(cursor.rowcount, 0)
+
+
+def _on_load(target, context) -> None:
+    if (stats := request_stats.get()) is not None:
+        stats.rows += 1
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def instrument_orm(base: type) -> None:
+    event.listen(base, "load", _on_load, propagate=True)
+
+
+def record_pool_wait(elapsed: float) -> None:
+    if (stats := request_stats.get()) is not None:
+        stats.pool_wait += elapsed
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, **labels: str | int) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{{{_labels(**labels, le=bound)}}} {cumulative}")
+        suffix = f"{{{_labels(**labels)}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+def _labels(**labels: str | int) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class MetricsRegistry:
+    # агрегаты по маршрутам в формате Prometheus text exposition
+
+    def __init__(self):
+        self.latency: dict[tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.requests: dict[tuple[str, str, int], int] = defaultdict(int)
+        self.db: dict[tuple[str, str], RequestStats] = defaultdict(RequestStats)
+        self.collectors: list[Callable[[], Iterable[str]]] = []
+
+    def observe(self, method: str, route: str, status_code: int, elapsed: float, stats: RequestStats) -> None:
+        self.latency[method, route].observe(elapsed)
+        self.requests[method, route, status_code] += 1
+        db = self.db[method, route]
+        db.statements += stats.statements
+        db.db_time += stats.db_time
+        db.pool_wait += stats.pool_wait
+        db.rows += stats.rows
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        # collector возвращает готовые строки с метриками других подсистем
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines += histogram.render("http_request_duration_seconds", method=method, route=route)
+
+        lines += ["# TYPE http_requests_total counter"]
+        for (method, route, status_code), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status_code)}}} {count}")
+
+        lines += [
+            "# TYPE db_statements_total counter",
+            "# TYPE db_time_seconds_total counter",
+            "# TYPE db_pool_wait_seconds_total counter",
+            "# TYPE db_rows_total counter",
+        ]
+        for (method, route), db in sorted(self.db.items()):
+            labels = _labels(method=method, route=route)
+            lines += [
+                f"db_statements_total{{{labels}}} {db.statements}",
+                f"db_time_seconds_total{{{labels}}} {db.db_time}",
+                f"db_pool_wait_seconds_total{{{labels}}} {db.pool_wait}",
+                f"db_rows_total{{{labels}}} {db.rows}",
+            ]
+
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class SqlInstrumentationMiddleware:
+    # ASGI middleware: статистика SQL на запрос в заголовке Server-Timing
+    # и гистограммы задержек по маршрутам для /metrics
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope=scope)
+        token = request_stats.set(stats)
+        start = perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing(perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            route = scope.get("route")
+            self.registry.observe(
+                scope["method"],
+                getattr(route, "path_format", None) or getattr(route, "path", "<unmatched>"),
+                status_code,
+                perf_counter() - start,
+                stats,
+            )
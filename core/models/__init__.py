@@ -7,7 +7,11 @@ __all__ = {
     "Profile",
     "User",
     "Order",
-    "OrderProductAssociation"
+    "OrderProductAssociation",
+    "IdempotencyKey",
+    "ProductChange",
+    "OrderImport",
+    "OrderImportError",
     # "order_product_association_table"
 }
 
@@ -19,4 +23,7 @@ from .profile import Profile
 from .order import Order
 from .order_product_association import OrderProductAssociation
 # from .order_product_association import order_product_association_table
+from .idempotency_key import IdempotencyKey
+from .product_change import ProductChange
+from .order_import import OrderImport, OrderImportError
 from .db_helper import DatabaseHelper, db_helper
@@ -1,28 +1,464 @@
+import ast
+import asyncio
+import contextvars
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import (AsyncSession, create_async_engine,
                                     async_sessionmaker, async_scoped_session)
+from sqlalchemy.orm import Session
 from asyncio import current_task
 
-from core.config import setting
+from core.batch import current_batch
+from core.config import setting, BASE_DIR, SqlitePragmas, GroupCommitSetting
+from .pool import InstrumentedPool
+
+T = TypeVar("T")
+
+ARCHIVE_SCHEMA = "archive"
+SYNCHRONOUS_LEVELS = {"off": 0, "normal": 1, "full": 2, "extra": 3}
+TEMP_STORE_LEVELS = {"default": 0, "file": 1, "memory": 2}
+
+
+class WriteAborted(Exception):
+    """Запрос, удерживавший сессию писателя, завершился ошибкой"""
+
+
+def pragma_statements(pragmas: SqlitePragmas, read_only: bool = False) -> list[str]:
+    # journal_mode идёт первым: остальные PRAGMA от него не зависят,
+    # а смена режима журнала невозможна внутри транзакции.
+    # Соединение mode=ro режим журнала сменить не может - он хранится в файле.
+    statements = [] if read_only else [f"PRAGMA journal_mode={pragmas.journal_mode}"]
+    statements += [
+        f"PRAGMA synchronous={pragmas.synchronous}",
+        f"PRAGMA mmap_size={pragmas.mmap_size}",
+        f"PRAGMA cache_size={pragmas.cache_size}",
+        f"PRAGMA temp_store={pragmas.temp_store}",
+        f"PRAGMA busy_timeout={pragmas.busy_timeout}",
+        f"PRAGMA foreign_keys={'ON' if pragmas.foreign_keys else 'OFF'}",
+    ]
+    return statements
+
+
+def read_only_url(url: str | URL) -> URL | None:
+    # sqlite+aiosqlite:///path -> sqlite+aiosqlite:///file:path?mode=ro&uri=true
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.set(
+        database=f"file:{url.database}",
+        query={**url.query, "mode": "ro", "uri": "true"},
+    )
+
+
+def shard_url(url: str | URL, index: int) -> URL:
+    # шард 0 - основной файл, остальные рядом: db.sqlite3 -> db.shard1.sqlite3
+    url = make_url(url)
+    if index == 0:
+        return url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise ValueError("Sharding needs a file-based SQLite database")
+    path = Path(url.database)
+    return url.set(database=str(path.with_name(f"{path.stem}.shard{index}{path.suffix}")))
+
+
+def shard_urls(url: str | URL, shards: int) -> list[URL]:
+    return [shard_url(url, index) for index in range(shards)]
+
+
+async def next_shard_id(session: AsyncSession, column, shard: int, shards: int) -> int:
+    """Следующий id после max(column), попадающий в шард: id % shards == shard"""
+    last = await session.scalar(select(func.max(column))) or 0
+    return last + (shard - last - 1) % shards + 1
+
+
+def alembic_heads(versions_dir: Path = BASE_DIR / "alembic" / "versions") -> set[str]:
+    # головные ревизии по исходникам миграций: импорт alembic и выполнение
+    # скриптов стоят при старте заметно дороже разбора нескольких файлов
+    revisions: set[str] = set()
+    parents: set[str] = set()
+    for path in versions_dir.glob("*.py"):
+        values = {}
+        for node in ast.parse(path.read_text(encoding="utf-8")).body:
+            if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+                target, value = node.target.id, node.value
+            elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+                target, value = node.targets[0].id, node.value
+            else:
+                continue
+            if target in ("revision", "down_revision") and value is not None:
+                values[target] = ast.literal_eval(value)
+        if "revision" not in values:
+            continue
+        revisions.add(values["revision"])
+        down = values.get("down_revision")
+        parents.update(down if isinstance(down, (tuple, list)) else [down] if down else [])
+    return revisions - parents
+
+
+_on_commit_tasks: set[asyncio.Task] = set()
+
+
+def on_commit(session: AsyncSession | Session, callback: Callable[[], Awaitable[None]]) -> None:
+    """Запустить callback() отдельной задачей после фиксации транзакции сессии"""
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session) -> None:
+    callbacks = session.info.pop("on_commit", None)
+    if not callbacks:
+        return
+    loop = asyncio.get_running_loop()
+    for callback in callbacks:
+        # пустой контекст: работа после фиксации не относится к запросу, который уже мог завершиться
+        task = loop.create_task(callback(), context=contextvars.Context())
+        _on_commit_tasks.add(task)
+        task.add_done_callback(_on_commit_tasks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_commit(session: Session) -> None:
+    session.info.pop("on_commit", None)
 
 
 class DatabaseHelper:
-    def __init__(self, url: str, echo: bool = False):
-        self.engine = create_async_engine(
-            url=url,
-            echo=echo,
-        )
+    def __init__(
+            self,
+            url: str,
+            echo: bool = False,
+            pragmas: SqlitePragmas | None = None,
+            read_pool_size: int = 5,
+            group_commit: GroupCommitSetting | None = None,
+            archive_path: Path | None = None,
+            shards: int = 1,
+    ):
+        self.pragmas = pragmas or SqlitePragmas()
+        self.archive_path = archive_path
+        self.group_commit = group_commit or GroupCommitSetting()
+        if shards > 1 and archive_path is not None:
+            raise ValueError("Order archive is not supported with several shards")
+        ro_url = read_only_url(url)
+        if ro_url is None:
+            # не файловая БД: читатели и писатель работают через один движок
+            self.engine = create_async_engine(url=url, echo=echo)
+            self.read_engine = self.engine
+        else:
+            # SQLite допускает только одного писателя, поэтому у движка
+            # записи ровно одно соединение, а чтение идёт параллельно в WAL.
+            # isolation_level=None отключает неявные BEGIN драйвера sqlite3:
+            # транзакции и SAVEPOINT открывает сам SQLAlchemy (см. _begin)
+            self.engine = create_async_engine(
+                url=url,
+                echo=echo,
+                poolclass=InstrumentedPool,
+                pool_size=1,
+                max_overflow=0,
+                connect_args={"isolation_level": None},
+            )
+            event.listen(self.engine.sync_engine, "begin", self._begin)
+            self.read_engine = create_async_engine(
+                url=ro_url,
+                echo=echo,
+                poolclass=InstrumentedPool,
+                pool_size=read_pool_size,
+                max_overflow=0,
+            )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", self._apply_pragmas)
+            if self.read_engine is not self.engine:
+                event.listen(self.read_engine.sync_engine, "connect", self._apply_read_pragmas)
         self.session_factory = async_sessionmaker(
             bind=self.engine,
             autoflush=False,
             expire_on_commit=False,
         )
-
-    def get_scoped_session(self):
-        session = async_scoped_session(
+        self.read_session_factory = async_sessionmaker(
+            bind=self.read_engine,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+        # один реестр на приложение: все зависимости одного запроса (задачи)
+        # получают одну и ту же сессию; соединение берётся из пула только
+        # при первом запросе к БД
+        self.scoped_session = async_scoped_session(
             session_factory=self.session_factory,
             scopefunc=current_task,
         )
-        return session
+        self.read_scoped_session = async_scoped_session(
+            session_factory=self.read_session_factory,
+            scopefunc=current_task,
+        )
+        self._write_queue: asyncio.Queue | None = None
+        self._writer_task: asyncio.Task | None = None
+        # заказы распределены по файлам по id % shards, у каждого файла свой
+        # писатель; шард 0 - этот же помощник, в нём остаются все прочие таблицы.
+        # В остальных шардах - копия товаров с долей остатка, чтобы заказ
+        # списывал и записывался одной транзакцией своего шарда. Внешние ключи
+        # там не проверяются: копия удаляет товары независимо от строк заказов
+        self.shards: list[DatabaseHelper] = [self]
+        if shards > 1:
+            shard_pragmas = self.pragmas.model_copy(update={"foreign_keys": False})
+            self.shards += [
+                DatabaseHelper(shard_url(url, index), echo, shard_pragmas, read_pool_size, group_commit)
+                for index in range(1, shards)
+            ]
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def shard_for(self, key: int) -> "DatabaseHelper":
+        return self.shards[key % len(self.shards)]
+
+    async def fan_out(
+            self,
+            operation: Callable[[AsyncSession], Awaitable[T]],
+            session: AsyncSession | None = None,
+    ) -> list[T]:
+        """
+        Выполнить чтение operation(session) на всех шардах одновременно; результаты по порядку шардов.
+        session - уже открытая сессия шарда 0 (сессия запроса): второе соединение из его пула не берётся.
+        """
+
+        async def run(shard: DatabaseHelper) -> T:
+            if shard is self and session is not None:
+                return await operation(session)
+            async with shard.read_session_factory() as shard_session:
+                return await operation(shard_session)
+
+        return list(await asyncio.gather(*(run(shard) for shard in self.shards)))
+
+    def _apply_pragmas(self, dbapi_connection, connection_record, read_only: bool = False) -> None:
+        cursor = dbapi_connection.cursor()
+        for statement in pragma_statements(self.pragmas, read_only=read_only):
+            cursor.execute(statement)
+        if self.archive_path is not None:
+            # архив заказов подключается к каждому соединению схемой archive;
+            # файл создаёт соединение писателя, оно открывается при старте первым
+            path = f"file:{self.archive_path}?mode=ro" if read_only else str(self.archive_path)
+            cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+            if not read_only:
+                cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode={self.pragmas.journal_mode}")
+                cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.synchronous={self.pragmas.synchronous}")
+        cursor.close()
+
+    def _apply_read_pragmas(self, dbapi_connection, connection_record) -> None:
+        self._apply_pragmas(dbapi_connection, connection_record, read_only=True)
+
+    @staticmethod
+    def _begin(conn) -> None:
+        # блокировка записи берётся сразу, а не при первом UPDATE
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    async def check_pragmas(self) -> None:
+        # SQLite молча игнорирует часть PRAGMA (например, WAL для :memory:),
+        # поэтому при старте сверяем фактические значения с настройками
+        if self.engine.dialect.name != "sqlite":
+            return
+        expected = {
+            "journal_mode": self.pragmas.journal_mode,
+            "synchronous": SYNCHRONOUS_LEVELS[self.pragmas.synchronous],
+            "cache_size": self.pragmas.cache_size,
+            "temp_store": TEMP_STORE_LEVELS[self.pragmas.temp_store],
+            "busy_timeout": self.pragmas.busy_timeout,
+            "foreign_keys": int(self.pragmas.foreign_keys),
+        }
+        actual = {}
+        async with self.engine.connect() as conn:
+            for name in [*expected, "mmap_size"]:
+                value = await conn.scalar(text(f"PRAGMA {name}"))
+                actual[name] = value.lower() if isinstance(value, str) else value
+        mismatched = [
+            f"{name}={actual[name]!r} (expected {value!r})"
+            for name, value in expected.items()
+            if actual[name] != value
+        ]
+        # mmap_size может быть урезан лимитом SQLITE_MAX_MMAP_SIZE сборки
+        if self.pragmas.mmap_size and not actual["mmap_size"]:
+            mismatched.append(f"mmap_size=0 (expected {self.pragmas.mmap_size})")
+        if mismatched:
+            raise RuntimeError(f"SQLite pragmas are not applied: {', '.join(mismatched)}")
+        for shard in self.shards[1:]:
+            await shard.check_pragmas()
+
+    async def check_revision(self) -> None:
+        heads = alembic_heads()
+        async with self.engine.connect() as conn:
+            has_version_table = await conn.run_sync(
+                lambda sync_conn: sync_conn.dialect.has_table(sync_conn, "alembic_version")
+            )
+            current = set(await conn.scalars(text("SELECT version_num FROM alembic_version"))) \
+                if has_version_table else set()
+        if current != heads:
+            raise RuntimeError(
+                f"Database {self.engine.url.database} revision {sorted(current)} does not match "
+                f"Alembic head {sorted(heads)}, run 'alembic upgrade head'"
+            )
+        for shard in self.shards[1:]:
+            await shard.check_revision()
+
+    async def prewarm(self, *operations: Callable[[AsyncSession], Awaitable[None]]) -> None:
+        # открываем все соединения читателей сразу и выполняем на каждом
+        # горячие запросы: SQLAlchemy кэширует их компиляцию, а sqlite3 -
+        # подготовленные выражения на уровне соединения
+        size = self.read_engine.pool.size() if isinstance(self.read_engine.pool, InstrumentedPool) else 1
+
+        async def warm_connection() -> None:
+            async with self.read_session_factory() as session:
+                for operation in operations:
+                    await operation(session)
+
+        await asyncio.gather(*(warm_connection() for _ in range(size)))
+
+    def _ensure_writer(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._writer_task is None or self._writer_task.done() or self._writer_task.get_loop() is not loop:
+            self._write_queue = asyncio.Queue()
+            # у писателя свой пустой контекст: операции выполняются в контексте вызвавшего
+            self._writer_task = loop.create_task(self._writer(self._write_queue), context=contextvars.Context())
+        return self._write_queue
+
+    async def _writer(self, queue: asyncio.Queue) -> None:
+        # единственный потребитель очереди: операции записи выполняются
+        # строго по одной; в режиме group commit - группой в одной транзакции
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                if self.group_commit.enabled:
+                    if self.group_commit.window_ms and queue.qsize() < self.group_commit.max_batch - 1:
+                        await asyncio.sleep(self.group_commit.window_ms / 1000)
+                    while len(batch) < self.group_commit.max_batch and not queue.empty():
+                        batch.append(queue.get_nowait())
+                await self._run_batch([job for job in batch if not job[1].done()])
+        finally:
+            # писатель остановлен (dispose): ждущие в очереди не должны висеть вечно
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            for _, future, _ in batch:
+                future.cancel()
+
+    @staticmethod
+    async def _run_operation(operation, session: AsyncSession, context: contextvars.Context):
+        # контекст вызывающего нужен метрикам запроса и журналу медленных запросов
+        return await asyncio.create_task(operation(session), context=context)
+
+    @staticmethod
+    def _stops_writer(exc: BaseException) -> bool:
+        # CancelledError самой операции - её ошибка, писатель продолжает работу;
+        # отмена писателя и прочие BaseException (KeyboardInterrupt) его останавливают
+        if isinstance(exc, asyncio.CancelledError):
+            return asyncio.current_task().cancelling() > 0
+        return not isinstance(exc, Exception)
+
+    async def _run_batch(self, batch: list[tuple[Callable, asyncio.Future, contextvars.Context]]) -> None:
+        if not batch:
+            return
+        outcomes: list[tuple[asyncio.Future, object, BaseException | None]] = []
+        stop: BaseException | None = None
+        try:
+            async with self.session_factory() as session:
+                if len(batch) == 1:
+                    operation, future, context = batch[0]
+                    outcomes.append((future, await self._run_operation(operation, session, context), None))
+                else:
+                    for operation, future, context in batch:
+                        # SAVEPOINT изолирует ошибку одной операции от остальных в группе
+                        try:
+                            async with session.begin_nested():
+                                result = await self._run_operation(operation, session, context)
+                        except BaseException as exc:
+                            if self._stops_writer(exc):
+                                raise
+                            outcomes.append((future, None, exc))
+                        else:
+                            outcomes.append((future, result, None))
+                await session.commit()
+        except BaseException as exc:
+            outcomes = [(future, None, exc) for _, future, _ in batch]
+            if self._stops_writer(exc):
+                stop = exc
+        # вызывающие узнают о результате только после общей фиксации
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            elif exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+        if stop is not None:
+            raise stop
+
+    async def run_write(self, operation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        Выполнить operation(session) в очереди писателя и зафиксировать транзакцию.
+        Операция не должна сама вызывать commit() и ждать другие записи.
+        """
+        queue = self._ensure_writer()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((operation, future, contextvars.copy_context()))
+        return await future
+
+    async def dispose(self) -> None:
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        await self.engine.dispose()
+        if self.read_engine is not self.engine:
+            await self.read_engine.dispose()
+        for shard in self.shards[1:]:
+            await shard.dispose()
+
+    def get_scoped_session(self):
+        return self.scoped_session
+
+    def pool_stats(self) -> dict:
+        stats = {"writer": self._pool_snapshot(self.engine)}
+        if self.read_engine is not self.engine:
+            stats["reader"] = self._pool_snapshot(self.read_engine)
+        stats["write_queue"] = self._write_queue.qsize() if self._write_queue else 0
+        return stats
+
+    def pool_metrics(self) -> list[str]:
+        # сборщик для /metrics в формате Prometheus
+        lines = [
+            "# TYPE db_pool_checked_out gauge",
+            "# TYPE db_pool_waiting gauge",
+            "# TYPE db_pool_checkouts_total counter",
+            "# TYPE db_pool_timeouts_total counter",
+            "# TYPE db_pool_checkout_seconds_total counter",
+        ]
+        stats = self.pool_stats()
+        for name in ("writer", "reader"):
+            if "checkouts" not in (snapshot := stats.get(name, {})):
+                continue
+            lines += [
+                f'db_pool_checked_out{{pool="{name}"}} {snapshot["checked_out"]}',
+                f'db_pool_waiting{{pool="{name}"}} {snapshot["waiting"]}',
+                f'db_pool_checkouts_total{{pool="{name}"}} {snapshot["checkouts"]}',
+                f'db_pool_timeouts_total{{pool="{name}"}} {snapshot["timeouts"]}',
+                f'db_pool_checkout_seconds_total{{pool="{name}"}} {snapshot["checkout_time_total"]}',
+            ]
+        lines += ["# TYPE db_write_queue_depth gauge", f"db_write_queue_depth {stats['write_queue']}"]
+        if self.sharded:
+            lines.append("# TYPE db_shard_write_queue_depth gauge")
+            lines += [
+                f'db_shard_write_queue_depth{{shard="{index}"}} {shard.pool_stats()["write_queue"]}'
+                for index, shard in enumerate(self.shards)
+            ]
+        return lines
+
+    @staticmethod
+    def _pool_snapshot(engine) -> dict:
+        pool = engine.pool
+        if isinstance(pool, InstrumentedPool):
+            return pool.snapshot()
+        return {"status": pool.status()}
 
 # разные варианты генерации сессии с БД
     async def session_dependency(self) -> AsyncSession:
@@ -31,12 +467,54 @@ class DatabaseHelper:
             await session.close()
 
     async def scope_session_dependency(self) -> AsyncSession:
-        session = self.get_scoped_session()
-        yield session
-        await session.close()
+        try:
+            yield self.scoped_session()
+        finally:
+            await self.scoped_session.remove()
+
+    async def read_session(self) -> AsyncSession:
+        batch = current_batch.get()
+        if batch is not None and batch.session is not None:
+            # подзапрос POST /batch: сессией владеет пакет
+            yield batch.session
+            return
+        try:
+            yield self.read_scoped_session()
+        finally:
+            await self.read_scoped_session.remove()
+
+    async def write_session(self) -> AsyncSession:
+        # сессия писателя удерживается на всё время запроса: запрос ждёт
+        # своей очереди, а фиксация транзакции происходит при выходе
+        loop = asyncio.get_running_loop()
+        acquired = loop.create_future()
+        released = loop.create_future()
+
+        async def hold(session: AsyncSession) -> None:
+            if acquired.cancelled():
+                raise WriteAborted
+            acquired.set_result(session)
+            await released
+
+        job = asyncio.ensure_future(self.run_write(hold))
+        job.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            session = await acquired
+            yield session
+        except BaseException:
+            if not released.done():
+                released.set_exception(WriteAborted())
+            raise
+        released.set_result(None)
+        await job
 
 
 db_helper = DatabaseHelper(
     setting.db.url,
     setting.db.echo,
+    setting.db.pragmas,
+    setting.db.read_pool_size,
+    setting.db.group_commit,
+    setting.archive.path if setting.archive.enabled else None,
+    setting.db.shards,
 )
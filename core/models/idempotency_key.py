@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class IdempotencyKey(Base):
+    # ответ на запрос с заголовком Idempotency-Key, см. core/idempotency.py
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(255), unique=True)
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    # пока status_code пуст, запрос выполняется и ключ занят до locked_until
+    status_code: Mapped[int | None]
+    headers: Mapped[str] = mapped_column(Text, default="[]", server_default="[]")
+    body: Mapped[bytes] = mapped_column(default=b"", server_default="")
+    locked_until: Mapped[datetime]
+    expires_at: Mapped[datetime] = mapped_column(index=True)
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Index, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class OrderImport(Base):
+    # задача импорта заказов из файла, см. api_v1/orders/importer.py
+    __tablename__ = "order_imports"
+
+    format: Mapped[str] = mapped_column(String(8))  # csv, ndjson
+    status: Mapped[str] = mapped_column(String(16), default="running")  # running, done, failed, interrupted
+    bytes_total: Mapped[int]
+    # счётчики меняются в одной транзакции с порцией заказов
+    bytes_done: Mapped[int] = mapped_column(default=0, server_default="0")
+    lines_done: Mapped[int] = mapped_column(default=0, server_default="0")
+    orders_created: Mapped[int] = mapped_column(default=0, server_default="0")
+    errors_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    error: Mapped[str | None] = mapped_column(Text)  # причина статуса failed
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    finished_at: Mapped[datetime | None]
+
+
+class OrderImportError(Base):
+    # отклонённая строка файла импорта
+    __tablename__ = "order_import_errors"
+    __table_args__ = (Index("ix_order_import_errors_import_id_line", "import_id", "line"),)
+
+    import_id: Mapped[int] = mapped_column(ForeignKey("order_imports.id"))
+    line: Mapped[int]
+    message: Mapped[str] = mapped_column(Text)
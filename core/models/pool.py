@@ -0,0 +1,68 @@
+from dataclasses import dataclass, asdict
+from time import perf_counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.instrumentation import record_pool_wait
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    checkins: int = 0
+    timeouts: int = 0
+    waiting: int = 0  # сейчас ждут соединение
+    checkout_time_total: float = 0.0  # секунды, включая открытие новых соединений
+    checkout_time_max: float = 0.0
+
+    def record_checkout(self, elapsed: float) -> None:
+        self.checkouts += 1
+        self.checkout_time_total += elapsed
+        self.checkout_time_max = max(self.checkout_time_max, elapsed)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["checkout_time_avg"] = self.checkout_time_total / self.checkouts if self.checkouts else 0.0
+        return data
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # пул соединений, считающий выдачи и время ожидания свободного соединения
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        self.stats.waiting += 1
+        start = perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.waiting -= 1
+        elapsed = perf_counter() - start
+        self.stats.record_checkout(elapsed)
+        record_pool_wait(elapsed)
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        self.stats.checkins += 1
+        super()._do_return_conn(record)
+
+    def recreate(self) -> "InstrumentedPool":
+        # dispose() пересоздаёт пул - статистика должна пережить это
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def snapshot(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            **self.stats.as_dict(),
+        }
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
 
@@ -15,6 +15,8 @@ class Product(Base):
     name: Mapped[str]
     description: Mapped[str]
     price: Mapped[int]
+    # меняется только атомарными UPDATE из crud.reserve_stock / restock
+    stock: Mapped[int] = mapped_column(default=0, server_default="0")
 
     # orders: Mapped[list["Order"]] = relationship(
     #     # secondary=order_product_association_table,
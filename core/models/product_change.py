@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy import String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ProductChange(Base):
+    # outbox изменений товаров, см. api_v1/products/changes.py;
+    # AUTOINCREMENT: id - курсор подписчиков и не должен повторяться после очистки
+    __tablename__ = "product_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    product_id: Mapped[int]
+    op: Mapped[str] = mapped_column(String(16))  # created, updated, deleted, stock
+    payload: Mapped[str] = mapped_column(Text)  # JSON
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now, index=True)
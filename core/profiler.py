@@ -0,0 +1,265 @@
+"""
+Сэмплирующий профайлер отдельных запросов.
+
+Запрос профилируется, если в нём есть подписанный заголовок x-profile-token,
+профайлер включён через /admin/profiler или запрос попал в долю sample_rate.
+Остальные запросы проходят через middleware без дополнительной работы.
+
+Фоновый поток раз в interval_ms снимает стек задачи запроса: если задача
+выполняется - стек потока цикла событий, если ждёт - цепочку await её
+корутин с пометкой [await]. Получается профиль по настенному времени
+в формате collapsed stacks (flamegraph.pl, speedscope) и хронология SQL.
+"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from time import perf_counter
+
+from core.config import BASE_DIR, setting
+from core.instrumentation import request_stats
+
+TOKEN_HEADER = b"x-profile-token"
+
+
+def make_token(secret: str, ttl: int = 300) -> str:
+    # токен вида "<expires>:<hmac>", действует ttl секунд
+    expires = str(int(time.time()) + ttl)
+    signature = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}:{signature}"
+
+
+def verify_token(secret: str, token: str) -> bool:
+    expires, _, signature = token.partition(":")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+@lru_cache(maxsize=4096)
+def _label(code) -> str:
+    path = code.co_filename
+    # самый длинный подходящий префикс: site-packages лежит внутри каталога stdlib
+    prefixes = sorted((str(BASE_DIR), *(p for p in sys.path if p)), key=len, reverse=True)
+    for prefix in (prefix + os.sep for prefix in prefixes):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    # ';' разделяет кадры в collapsed stacks
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+@dataclass
+class SqlEvent:
+    offset_ms: float
+    duration_ms: float
+    statement: str
+
+
+@dataclass
+class Profile:
+    id: int
+    method: str
+    path: str
+    trigger: str
+    started_at: datetime = field(default_factory=datetime.now)
+    route: str | None = None
+    status_code: int | None = None
+    duration_ms: float = 0.0
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter, repr=False)
+    sql: list[SqlEvent] = field(default_factory=list, repr=False)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "trigger": self.trigger,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": self.samples,
+            "sql_statements": len(self.sql),
+        }
+
+
+class _Active:
+    # профилируемый запрос, который видит поток-сэмплер
+    def __init__(self, profile: Profile, task: asyncio.Task, loop: asyncio.AbstractEventLoop, root_code):
+        self.profile = profile
+        self.task = task
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.root_code = root_code
+
+
+class Profiler:
+    def __init__(self, sample_rate: float, interval_ms: float, max_profiles: int, max_depth: int,
+                 secret: str | None = None):
+        self.enabled = False  # переключатель из /admin/profiler: профилировать все запросы
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.secret = secret
+        self.profiles: deque[Profile] = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._active: dict[int, _Active] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def trigger(self, scope) -> str | None:
+        # вызывается на каждый запрос - только дешёвые проверки
+        if self.enabled:
+            return "admin"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        if self.secret is not None:
+            for name, value in scope["headers"]:
+                if name == TOKEN_HEADER:
+                    return "token" if verify_token(self.secret, value.decode("latin-1")) else None
+        return None
+
+    def get(self, profile_id: int) -> Profile | None:
+        return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+    def start(self, scope, trigger: str, root_code) -> Profile:
+        profile = Profile(next(self._ids), scope["method"], scope["path"], trigger)
+        active = _Active(profile, asyncio.current_task(), asyncio.get_running_loop(), root_code)
+        with self._lock:
+            self._active[profile.id] = active
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def finish(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.pop(profile.id, None)
+        self.profiles.append(profile)
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                # пока профилировать нечего, поток спит и не берёт GIL
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            frames = sys._current_frames()
+            for item in active:
+                try:
+                    stack = self._sample(item, frames)
+                except Exception:
+                    # кадры и корутины меняются под ногами у потока-сэмплера;
+                    # неудачный сэмпл пропускается, поток продолжает работу
+                    continue
+                if stack:
+                    item.profile.stacks[stack] += 1
+                    item.profile.samples += 1
+
+    def _sample(self, item: _Active, frames: dict) -> str | None:
+        if item.task.done():
+            return None
+        if asyncio.current_task(item.loop) is item.task:
+            return self._thread_stack(item, frames.get(item.thread_id))
+        return self._await_stack(item)
+
+    def _thread_stack(self, item: _Active, frame) -> str | None:
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(_label(frame.f_code))
+            if frame.f_code is item.root_code:
+                break
+            frame = frame.f_back
+        return ";".join(reversed(labels)) or None
+
+    def _await_stack(self, item: _Active) -> str:
+        labels = []
+        awaitable = item.task.get_coro()
+        while awaitable is not None and len(labels) < self.max_depth:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) \
+                or getattr(awaitable, "ag_frame", None)
+            if frame is None:
+                labels.append(f"[await {type(awaitable).__name__}]")
+                break
+            if frame.f_code is item.root_code:
+                # всё, что выше middleware (сервер, другие middleware), отбрасывается
+                labels.clear()
+            labels.append(_label(frame.f_code))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) \
+                or getattr(awaitable, "ag_await", None)
+        else:
+            labels.append("[await]")
+        return ";".join(labels)
+
+
+profiler = Profiler(
+    sample_rate=setting.profiler.sample_rate,
+    interval_ms=setting.profiler.interval_ms,
+    max_profiles=setting.profiler.max_profiles,
+    max_depth=setting.profiler.max_depth,
+    secret=setting.profiler.secret,
+)
+
+
+class ProfilerMiddleware:
+    # ASGI middleware: профилирует выбранные запросы, должна стоять
+    # внутри SqlInstrumentationMiddleware, чтобы видеть статистику SQL
+
+    def __init__(self, app, registry: Profiler = profiler):
+        self.app = app
+        self.profiler = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (trigger := self.profiler.trigger(scope)) is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profiled(scope, receive, send, trigger)
+
+    async def _profiled(self, scope, receive, send, trigger):
+        profile = self.profiler.start(scope, trigger, ProfilerMiddleware._profiled.__code__)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.timeline = []
+        start = perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile.id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profile.duration_ms = (perf_counter() - start) * 1000
+            route = scope.get("route")
+            profile.route = getattr(route, "path_format", None)
+            if stats is not None:
+                profile.sql = [
+                    SqlEvent(round((at - start) * 1000, 3), round(elapsed * 1000, 3), statement)
+                    for at, elapsed, statement in stats.timeline
+                ]
+                stats.timeline = None
+            self.profiler.finish(profile)
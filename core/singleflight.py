@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    # одновременные вызовы с одним ключом ждут одно выполнение и получают
+    # общий результат (или общее исключение); после завершения ключ свободен
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0  # фактические выполнения
+        self.coalesced = 0  # вызовы, дождавшиеся чужого выполнения
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            # отдельная задача: отмена первого вызвавшего не отменяет
+            # выполнение для остальных
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def metrics(self) -> list[str]:
+        labels = f'name="{self.name}"'
+        return [
+            f"singleflight_calls_total{{{labels}}} {self.calls}",
+            f"singleflight_coalesced_total{{{labels}}} {self.coalesced}",
+            f"singleflight_inflight{{{labels}}} {len(self._inflight)}",
+        ]
+
+
+flights: list[SingleFlight] = []
+
+
+def single_flight(name: str) -> SingleFlight:
+    flight = SingleFlight(name)
+    flights.append(flight)
+    return flight
+
+
+def singleflight_metrics() -> list[str]:
+    # сборщик для /metrics в формате Prometheus
+    lines = [
+        "# TYPE singleflight_calls_total counter",
+        "# TYPE singleflight_coalesced_total counter",
+        "# TYPE singleflight_inflight gauge",
+    ]
+    for flight in flights:
+        lines += flight.metrics()
+    return lines
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from core.config import setting
+
+log = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\bVALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def normalize_sql(statement: str) -> str:
+    # литералы и списки параметров схлопываются, чтобы одинаковые
+    # по форме запросы попадали в одну запись журнала
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    statement = _VALUES_ROWS.sub(r"\1, ...", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def params_shape(parameters: Any, executemany: bool = False) -> str:
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {params_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (tuple, list)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return "()"
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    statement: str
+    params_shape: str
+    count: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    last_time: float = 0.0
+    routes: dict[str, int] = field(default_factory=dict)
+    plan: list[str] | None = None
+    first_seen: datetime = field(default_factory=datetime.now)
+    last_seen: datetime = field(default_factory=datetime.now)
+
+
+class SlowQueryLog:
+    # журнал медленных запросов, сгруппированных по отпечатку нормализованного SQL
+
+    def __init__(self, threshold_ms: float = 100.0, max_entries: int = 500, enabled: bool = True):
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, SlowQuery] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def record(
+            self,
+            statement: str,
+            parameters: Any,
+            elapsed: float,
+            route: str | None,
+            database: str | None,
+            executemany: bool = False,
+    ) -> None:
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = SlowQuery(key, normalized, params_shape(parameters, executemany))
+            self.entries[key] = entry
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if database and normalized.upper().startswith(_EXPLAINABLE):
+                sample = list(parameters)[0] if executemany and parameters else parameters
+                self._explain_later(entry, statement, sample, database)
+        self.entries.move_to_end(key)
+        entry.count += 1
+        entry.total_time += elapsed
+        entry.max_time = max(entry.max_time, elapsed)
+        entry.last_time = elapsed
+        entry.last_seen = datetime.now()
+        route = route or "<background>"
+        entry.routes[route] = entry.routes.get(route, 0) + 1
+        log.warning("slow query %.1f ms [%s] %s %s", elapsed * 1000, route, normalized, entry.params_shape)
+
+    def _explain_later(self, entry: SlowQuery, statement: str, parameters: Any, database: str) -> None:
+        # план снимается один раз на отпечаток, в потоке и на отдельном
+        # соединении только для чтения - пул приложения не задействуется
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(asyncio.to_thread(explain_query_plan, database, statement, parameters))
+        self._tasks.add(task)
+
+        def done(finished: asyncio.Task) -> None:
+            self._tasks.discard(finished)
+            if not finished.cancelled() and finished.exception() is None:
+                entry.plan = finished.result()
+
+        task.add_done_callback(done)
+
+    def top(self, order_by: str = "total_time", limit: int = 50) -> list[SlowQuery]:
+        return sorted(self.entries.values(), key=lambda entry: getattr(entry, order_by), reverse=True)[:limit]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+def explain_query_plan(database: str, statement: str, parameters: Any) -> list[str]:
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        rows = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    except sqlite3.Error as exc:
+        return [f"explain failed: {exc}"]
+    finally:
+        connection.close()
+    # строки плана: (id, parent, notused, detail)
+    depth = {0: 0}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        plan.append("  " * (depth[node_id] - 1) + detail)
+    return plan
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=setting.db.slow_query.threshold_ms,
+    max_entries=setting.db.slow_query.max_entries,
+    enabled=setting.db.slow_query.enabled,
+)
@@ -0,0 +1,56 @@
+"""
+Пул потоков AnyIO: в нём выполняются синхронные (def) маршруты и зависимости
+FastAPI и явные вызовы run_sync. Число потоков ограничено общим лимитером
+(по умолчанию 40), сверх лимита вызовы ждут в очереди - это видно в /metrics.
+Лёгкие по CPU зависимости объявляются async def и в поток не уходят; в потоке
+остаётся только блокирующая или тяжёлая работа (bcrypt, подпись RSA).
+"""
+from time import perf_counter
+from typing import Callable, TypeVar
+
+from anyio import to_thread
+
+from core.instrumentation import Histogram
+
+T = TypeVar("T")
+
+wait_time = Histogram()  # ожидание свободного потока вызовами run_sync
+
+
+def configure_threadpool(size: int) -> None:
+    # лимитер свой у каждого цикла событий - вызывается из lifespan
+    to_thread.current_default_thread_limiter().total_tokens = size
+
+
+async def run_sync(func: Callable[..., T], *args, **kwargs) -> T:
+    """Выполнить func в пуле потоков, учитывая ожидание потока в метриках"""
+    submitted = perf_counter()
+    started = 0.0
+
+    def call() -> T:
+        nonlocal started
+        started = perf_counter()
+        return func(*args, **kwargs)
+
+    try:
+        return await to_thread.run_sync(call)
+    finally:
+        # в гистограмму пишет только поток цикла событий
+        if started:
+            wait_time.observe(started - submitted)
+
+
+def threadpool_metrics() -> list[str]:
+    # сборщик для /metrics в формате Prometheus
+    limiter = to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    return [
+        "# TYPE threadpool_threads gauge",
+        f"threadpool_threads {limiter.total_tokens}",
+        "# TYPE threadpool_busy gauge",
+        f"threadpool_busy {statistics.borrowed_tokens}",
+        "# TYPE threadpool_waiting gauge",
+        f"threadpool_waiting {statistics.tasks_waiting}",
+        "# TYPE threadpool_wait_seconds histogram",
+        *wait_time.render("threadpool_wait_seconds"),
+    ]
@@ -1,3 +1,4 @@
+# Учебные примеры запросов. Для наполнения БД большими объёмами - python -m benchmarks.dataset
 import asyncio
 
 from sqlalchemy.orm import joinedload, selectinload
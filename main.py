@@ -1,25 +1,97 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import uvicorn
 
 from core.models import Base, db_helper
 from core.config import setting
+from core.instrumentation import (metrics, instrument_engine, instrument_orm,
+                                  SqlInstrumentationMiddleware)
+from core.profiler import ProfilerMiddleware
+from core.idempotency import IdempotencyMiddleware
+from core.singleflight import singleflight_metrics
+from core.dataloader import dataloader_metrics
+from core.archive import order_archiver
+from core.threadpool import configure_threadpool, threadpool_metrics
 from api_v1 import router as router_v1
+from api_v1.products import crud as products_crud
+from api_v1.products.shards import mirror_products
+from api_v1.products.snapshot import catalog_snapshot
+from api_v1.products.changes import change_feed
+from api_v1.products.suggest import suggest_index
+from api_v1.orders.importer import order_importer
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with db_helper.engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
+    configure_threadpool(setting.server.threadpool_size)
+    # проверки старта могут упасть: соединения (потоки aiosqlite) и фоновые
+    # задачи закрываются и тогда, иначе процесс не завершится
+    try:
+        await db_helper.check_pragmas()
+        if setting.fast_boot:
+            # схема уже создана миграциями - достаточно проверить ревизию
+            await db_helper.check_revision()
+            await db_helper.prewarm(products_crud.warm_up)
+        else:
+            for shard in db_helper.shards:
+                async with shard.engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+        if db_helper.sharded:
+            # копии каталога в шардах могли отстать, если процесс упал до их обновления
+            await mirror_products()
+        if setting.catalog.enabled:
+            await catalog_snapshot.rebuild()
+        if setting.archive.enabled:
+            await order_archiver.ensure_schema()
+            order_archiver.start()
+        if setting.suggest.enabled:
+            await suggest_index.start()
+        yield
+    finally:
+        await order_importer.stop()
+        await suggest_index.stop()
+        await change_feed.stop()
+        await order_archiver.stop()
+        await catalog_snapshot.stop()
+        await db_helper.dispose()
 
 
+for shard in db_helper.shards:
+    instrument_engine(shard.engine)
+    if shard.read_engine is not shard.engine:
+        instrument_engine(shard.read_engine)
+instrument_orm(Base)
+metrics.register_collector(db_helper.pool_metrics)
+metrics.register_collector(singleflight_metrics)
+metrics.register_collector(dataloader_metrics)
+metrics.register_collector(change_feed.metrics)
+metrics.register_collector(threadpool_metrics)
+metrics.register_collector(order_importer.metrics)
+if setting.catalog.enabled:
+    metrics.register_collector(catalog_snapshot.metrics)
+if setting.archive.enabled:
+    metrics.register_collector(order_archiver.metrics)
+if setting.suggest.enabled:
+    metrics.register_collector(suggest_index.metrics)
+
 app = FastAPI(lifespan=lifespan)
 app.include_router(router=router_v1, prefix=setting.api_v1_prefix)
+# порядок важен: профайлер внутри, чтобы видеть статистику SQL запроса
+if setting.idempotency.enabled:
+    app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(SqlInstrumentationMiddleware)
 
 @app.get("/")
-def main():
+async def main():
     return "Hello World"
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
+
+
 if __name__ == "__main__":
+    # запуск для разработки; в продакшене - python server.py
     uvicorn.run("main:app", reload=True)
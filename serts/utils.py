@@ -1,24 +1,37 @@
+from functools import cache
+
 import bcrypt
 import jwt
 
 from core.config import setting
 
 
+# ключи читаются при первом использовании, а не при импорте модуля
+@cache
+def load_private_key() -> str:
+    return setting.auth_jwt.private_key_path.read_text()
+
+
+@cache
+def load_public_key() -> str:
+    return setting.auth_jwt.public_key_path.read_text()
+
+
 def encode_jwt(
         payload: dict,
-        private_key: str = setting.auth_jwt.private_key_path.read_text(),
+        private_key: str | None = None,
         algorithm: str = setting.auth_jwt.algorithm,
 ):
-    encoded = jwt.encode(payload, private_key, algorithm=algorithm)
+    encoded = jwt.encode(payload, private_key or load_private_key(), algorithm=algorithm)
     return encoded
 
 
 def decode_jwt(
         token: str | bytes,
-        public_key: str = setting.auth_jwt.public_key_path.read_text(),
+        public_key: str | None = None,
         algorithm: str = setting.auth_jwt.algorithm,
 ):
-    decoded = jwt.decode(token, public_key, algorithms=[algorithm])
+    decoded = jwt.decode(token, public_key or load_public_key(), algorithms=[algorithm])
     return decoded
 
 
@@ -0,0 +1,141 @@
+"""
+Запуск в продакшене: несколько воркеров uvicorn на общем сокете.
+
+Приложение импортируется в мастер-процессе до fork, поэтому код модулей
+и настройки разделяются воркерами через copy-on-write. Соединения с БД
+мастер не открывает - пулы создаются в воркерах в lifespan.
+
+По SIGTERM/SIGINT мастер пересылает сигнал воркерам; каждый перестаёт
+принимать соединения, дожидается текущих запросов (не дольше
+server.graceful_timeout) и в завершении lifespan закрывает движки БД.
+
+    SERVER__WORKERS=4 SERVER__PORT=8080 FAST_BOOT=true python server.py
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from core.config import ServerSetting, setting
+from main import app
+
+log = logging.getLogger("uvicorn.error")
+
+# воркер, упавший быстрее этого, считается сломанным, а не случайно упавшим:
+# перезапуск его в цикле ничего не даст
+MIN_WORKER_LIFETIME = 1.0
+
+
+def make_config(server: ServerSetting) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=server.host,
+        port=server.port,
+        loop=server.loop,
+        http=server.http,
+        backlog=server.backlog,
+        timeout_keep_alive=server.keep_alive,
+        limit_concurrency=server.limit_concurrency,
+        timeout_graceful_shutdown=server.graceful_timeout,
+        log_level=server.log_level,
+        access_log=server.access_log,
+    )
+
+
+class Supervisor:
+    # pre-fork мастер: держит заданное число воркеров и останавливает их по сигналу
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, graceful_timeout: int):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: dict[int, float] = {}  # pid -> время запуска
+        self.exit_signal: int | None = None
+        self.failed = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # воркер: обработчики мастера не нужны, сигналы ловит uvicorn.Server
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[self.sock])
+        except BaseException:
+            log.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def handle_exit(self, signum, frame) -> None:
+        self.exit_signal = signum
+
+    def reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None or self.exit_signal is not None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            log.warning("worker %d exited with code %d", pid, code)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                log.error("worker %d failed on startup, shutting down", pid)
+                self.failed = True
+                self.exit_signal = signal.SIGTERM
+                return
+            self.spawn()
+
+    def stop(self) -> None:
+        for pid in self.children:
+            os.kill(pid, self.exit_signal or signal.SIGTERM)
+        # запас сверх graceful_timeout - на завершение lifespan
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            log.warning("worker %d did not stop in time, killing", pid)
+            os.kill(pid, signal.SIGKILL)
+        self.reap()
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        log.info("master %d starting %d workers", os.getpid(), self.workers)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.exit_signal is None:
+            self.reap()
+            time.sleep(0.2)
+        log.info("master %d stopping workers", os.getpid())
+        self.stop()
+        return 1 if self.failed else 0
+
+
+def main() -> int:
+    server = setting.server
+    workers = server.workers or os.cpu_count() or 1
+    config = make_config(server)
+    sock = config.bind_socket()
+    if workers == 1 or not hasattr(os, "fork"):
+        uvicorn.Server(config).run(sockets=[sock])
+        return 0
+    return Supervisor(config, sock, workers, server.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
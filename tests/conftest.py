@@ -0,0 +1,66 @@
+"""
+Приложение поднимается один раз на сессию во временном каталоге: настройки
+и db_helper читают окружение при первом импорте, поэтому оно готовится до
+импорта main. Сценарии с другими настройками (шарды) идут в подпроцессе.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import httpx
+import pytest
+
+from benchmarks.loadtest import write_keys
+
+TMP = Path(tempfile.mkdtemp(prefix="tests-"))
+write_keys(TMP)
+TEST_ENV = {
+    "DB__URL": f"sqlite+aiosqlite:///{TMP / 'db.sqlite3'}",
+    "AUTH_JWT__PRIVATE_KEY_PATH": str(TMP / "jwt-private.pem"),
+    "AUTH_JWT__PUBLIC_KEY_PATH": str(TMP / "jwt-public.pem"),
+    "CATALOG__PATH": str(TMP / "catalog.snapshot"),
+    "CATALOG__REBUILD_DELAY": "0",
+    "CHANGES__POLL_INTERVAL": "0.1",
+    "ORDER_IMPORT__SPOOL_DIR": str(TMP),
+    "ADMIN__TOKEN": "test-admin-token",
+    "PROFILER__SECRET": "test-profiler-secret",
+    # архив включён, но проходы по расписанию тестам не мешают: заказы свежие
+    "ARCHIVE__ENABLED": "true",
+    "ARCHIVE__PATH": str(TMP / "archive.sqlite3"),
+}
+os.environ.update(TEST_ENV)
+PREFIX = "/api/v1"
+ADMIN_HEADERS = {"x-admin-token": TEST_ENV["ADMIN__TOKEN"]}
+
+
+def subprocess_env(**overrides: str) -> dict[str, str]:
+    # окружение без настроек этой сессии: подпроцесс готовит свои
+    return {**{name: value for name, value in os.environ.items() if name not in TEST_ENV}, **overrides}
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def app():
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        yield main.app
+
+
+@pytest.fixture(scope="session")
+async def client(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=f"http://test{PREFIX}") as client:
+        yield client
+
+
+@pytest.fixture
+async def product(client):
+    response = await client.post("/products/", json={
+        "name": "Gaming Mouse", "description": "test product", "price": 50, "stock": 100,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from core.archive import archived_order_lines, archived_orders, order_archiver
+from core.models import Order, OrderProductAssociation, db_helper
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_old_orders_move_to_archive_and_stay_readable(client, product):
+    lines = [{"product_id": product["id"], "count": 1}]
+    orders = [(await client.post("/orders/", json={"products": lines})).json() for _ in range(3)]
+    old_ids = [order["id"] for order in orders[:2]]
+
+    async def backdate(session):
+        await session.execute(
+            update(Order).where(Order.id.in_(old_ids)).values(created_at=datetime.now() - timedelta(days=400))
+        )
+
+    await db_helper.run_write(backdate)
+    assert await order_archiver.archive_batch(datetime.now() - timedelta(days=365)) == 2
+
+    async with db_helper.read_session_factory() as session:
+        assert not list(await session.scalars(select(Order.id).where(Order.id.in_(old_ids))))
+        assert not list(await session.scalars(
+            select(OrderProductAssociation.id).where(OrderProductAssociation.orders_id.in_(old_ids))
+        ))
+        assert set(await session.scalars(select(archived_orders.c.id))) >= set(old_ids)
+        assert set(await session.scalars(
+            select(archived_order_lines.c.orders_id).where(archived_order_lines.c.orders_id.in_(old_ids))
+        )) == set(old_ids)
+
+    archived = await client.get(f"/orders/{old_ids[0]}/")
+    assert archived.status_code == 200
+    assert archived.json()["products_details"][0]["product"]["id"] == product["id"]
+    live = await client.get(f"/orders/{orders[2]['id']}/")
+    assert live.status_code == 200
+    # повторный проход переносить нечего
+    assert await order_archiver.archive_batch(datetime.now() - timedelta(days=365)) == 0
@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine, text
+
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+
+from core.backfill import CHECKPOINT_TABLE, backfill
+
+
+def make_engine(tmp_path, rows: int = 25):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.sqlite3'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+        conn.execute(text("INSERT INTO items (id) VALUES (:id)"), [{"id": i} for i in range(1, rows + 1)])
+    return engine
+
+
+def fill(connection=None) -> int:
+    return backfill("items.value", table="items", values="value = id * 2", where="value = 0",
+                    batch_size=10, connection=connection)
+
+
+def check(engine, rows: int) -> None:
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM items WHERE value != id * 2")).scalar() == 0
+        checkpoint = conn.execute(text(f"SELECT last_key, rows_done, finished FROM {CHECKPOINT_TABLE}")).one()
+    assert tuple(checkpoint) == (rows, rows, 1)
+
+
+def test_backfill_with_connection(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.connect() as conn:
+        assert fill(conn) == 25
+        # повторный запуск видит завершённую контрольную точку
+        assert fill(conn) == 25
+        assert not conn.in_transaction()
+    check(engine, 25)
+
+
+def test_backfill_resumes_after_checkpoint(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            f"CREATE TABLE {CHECKPOINT_TABLE} (name VARCHAR PRIMARY KEY, table_name VARCHAR NOT NULL, "
+            "last_key INTEGER, rows_done INTEGER NOT NULL DEFAULT 0, finished BOOLEAN NOT NULL DEFAULT 0, "
+            "updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        # прерванный запуск: первая порция зафиксирована вместе с контрольной точкой
+        conn.execute(text("UPDATE items SET value = id * 2 WHERE id <= 10"))
+        conn.execute(text(f"INSERT INTO {CHECKPOINT_TABLE} (name, table_name, last_key, rows_done) "
+                          "VALUES ('items.value', 'items', 10, 10)"))
+        conn.commit()
+        assert fill(conn) == 25
+    check(engine, 25)
+
+
+def test_backfill_in_migration(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn)
+        with Operations.context(context), context.begin_transaction():
+            assert fill() == 25
+    check(engine, 25)
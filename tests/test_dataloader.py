@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from core.dataloader import BatchLoader
+
+pytestmark = pytest.mark.anyio
+
+
+def recording_loader(window_ms: float = 0.0, max_batch: int = 500) -> tuple[BatchLoader, list[list[int]]]:
+    calls: list[list[int]] = []
+
+    async def batch(keys: list[int]) -> dict[int, int]:
+        calls.append(sorted(keys))
+        return {key: key * 10 for key in keys if key > 0}
+
+    return BatchLoader("test", batch, window_ms=window_ms, max_batch=max_batch), calls
+
+
+async def test_keys_of_one_tick_load_in_one_batch():
+    loader, calls = recording_loader()
+    assert await loader.load_many([3, 1, 3, 2, -1]) == [30, 10, 30, 20, None]
+    assert calls == [[-1, 1, 2, 3]]
+    assert await loader.load(4) == 40
+    assert calls[-1] == [4]
+
+
+async def test_early_dispatch_cancels_window_timer():
+    loader, calls = recording_loader(window_ms=50, max_batch=2)
+    first = asyncio.ensure_future(loader.load_many([1, 2]))
+    await asyncio.sleep(0.03)
+    third = asyncio.ensure_future(loader.load(3))
+    # таймер первой партии (50 мс) не должен отправить вторую раньше её окна
+    await asyncio.sleep(0.03)
+    assert calls == [[1, 2]]
+    assert await first == [10, 20]
+    assert await third == 30
+    assert calls == [[1, 2], [3]]
+
+
+async def test_cancelled_batch_settles_waiters():
+    async def batch(keys):
+        raise asyncio.CancelledError
+
+    loader = BatchLoader("test", batch)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(loader.load(key) for key in range(3)), return_exceptions=True), 1,
+    )
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+async def test_batch_error_reaches_every_waiter():
+    async def batch(keys):
+        raise ValueError("boom")
+
+    loader = BatchLoader("test", batch)
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError, ValueError]
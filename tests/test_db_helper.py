@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, select, text
+
+from core.config import GroupCommitSetting
+from core.models import Base, DatabaseHelper, Product
+from core.models.db_helper import alembic_heads
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def helper(tmp_path, request):
+    group_commit = getattr(request, "param", GroupCommitSetting())
+    helper = DatabaseHelper(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}", group_commit=group_commit)
+    async with helper.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield helper
+    await helper.dispose()
+
+
+def add_product(name: str):
+    async def operation(session):
+        product = Product(name=name, description="test", price=1)
+        session.add(product)
+        await session.flush()
+        return product.id
+
+    return operation
+
+
+async def product_names(helper: DatabaseHelper) -> set[str]:
+    async with helper.read_session_factory() as session:
+        return set(await session.scalars(select(Product.name)))
+
+
+async def cancelled(session):
+    raise asyncio.CancelledError
+
+
+async def test_cancelled_operation_does_not_stop_writer(helper):
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(helper.run_write(cancelled), 5)
+    # раньше писатель умирал, и следующая запись ждала вечно
+    assert await asyncio.wait_for(helper.run_write(add_product("after")), 5) > 0
+    assert await product_names(helper) == {"after"}
+
+
+async def test_dispose_cancels_queued_writes(helper):
+    async def slow(session):
+        await asyncio.sleep(10)
+
+    queued = [asyncio.ensure_future(helper.run_write(slow)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    await helper.dispose()
+    results = await asyncio.wait_for(asyncio.gather(*queued, return_exceptions=True), 1)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+async def failing(session):
+    session.add(Product(name="failed", description="test", price=1))
+    await session.flush()
+    raise ValueError("rejected")
+
+
+@pytest.mark.parametrize("helper", [GroupCommitSetting(enabled=True, window_ms=20)], indirect=True)
+async def test_group_commit_isolates_failed_operation(helper):
+    commits = []
+    event.listen(helper.engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    operations = [add_product(f"p{i}") for i in range(5)]
+    operations.insert(2, failing)
+    results = await asyncio.gather(*(helper.run_write(op) for op in operations), return_exceptions=True)
+
+    assert isinstance(results[2], ValueError)
+    assert all(isinstance(result, int) for index, result in enumerate(results) if index != 2)
+    # одна транзакция на группу; изменения упавшей операции откатил её SAVEPOINT
+    assert len(commits) == 1
+    assert await product_names(helper) == {f"p{i}" for i in range(5)}
+
+
+async def test_writes_without_group_commit_run_one_per_transaction(helper):
+    commits = []
+    event.listen(helper.engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    await asyncio.gather(*(helper.run_write(add_product(f"p{i}")) for i in range(3)))
+    assert len(commits) == 3
+
+
+async def test_check_pragmas(helper):
+    await helper.check_pragmas()
+    # WAL для базы в памяти SQLite молча не включает
+    memory = DatabaseHelper("sqlite+aiosqlite:///:memory:")
+    try:
+        with pytest.raises(RuntimeError, match="journal_mode='memory'"):
+            await memory.check_pragmas()
+    finally:
+        await memory.dispose()
+
+
+async def test_check_revision(helper):
+    with pytest.raises(RuntimeError, match="does not match Alembic head"):
+        await helper.check_revision()
+    async with helper.engine.begin() as conn:
+        await conn.exec_driver_sql("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+        await conn.exec_driver_sql("INSERT INTO alembic_version VALUES ('0000old')")
+    with pytest.raises(RuntimeError, match="0000old"):
+        await helper.check_revision()
+    async with helper.engine.begin() as conn:
+        await conn.exec_driver_sql("DELETE FROM alembic_version")
+        await conn.execute(
+            text("INSERT INTO alembic_version VALUES (:head)"), [{"head": head} for head in alembic_heads()],
+        )
+    await helper.check_revision()
@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from core.idempotency import IdempotencyMiddleware
+from core.models import Product, db_helper
+
+pytestmark = pytest.mark.anyio
+
+
+def key_headers() -> dict[str, str]:
+    return {"idempotency-key": uuid.uuid4().hex}
+
+
+async def test_replay_returns_stored_response(client):
+    headers = key_headers()
+    body = {"name": "Idempotent", "description": "test", "price": 7}
+    first = await client.post("/products/", json=body, headers=headers)
+    replay = await client.post("/products/", json=body, headers=headers)
+    assert first.status_code == replay.status_code == 201
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json() == first.json()
+    # повтор не создал второй товар
+    async with db_helper.read_session_factory() as session:
+        ids = list(await session.scalars(select(Product.id).where(Product.name == "Idempotent")))
+    assert ids == [first.json()["id"]]
+
+
+async def test_same_key_with_other_body_is_rejected(client):
+    headers = key_headers()
+    await client.post("/products/", json={"name": "A", "description": "test", "price": 1}, headers=headers)
+    other = await client.post("/products/", json={"name": "B", "description": "test", "price": 1}, headers=headers)
+    assert other.status_code == 422
+
+
+async def test_body_over_limit_is_rejected(client):
+    response = await client.post("/products/", content=b"x" * (1024 ** 2 + 1), headers=key_headers())
+    assert response.status_code == 413
+
+
+async def test_concurrent_request_with_same_key_conflicts(app):
+    # app - только ради схемы idempotency_keys; запросы идут в медленное приложение
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await receive()
+        await release.wait()
+        await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"created"})
+
+    middleware = IdempotencyMiddleware(slow_app, wait_timeout=0.2)
+    headers = key_headers()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test") as client:
+        first = asyncio.ensure_future(client.post("/slow", content=b"1", headers=headers))
+        await asyncio.sleep(0.05)
+        second = await client.post("/slow", content=b"1", headers=headers)
+        assert second.status_code == 409
+        release.set()
+        assert (await first).status_code == 201
+        third = await client.post("/slow", content=b"1", headers=headers)
+        assert third.status_code == 201 and third.headers["idempotent-replayed"] == "true"
+        assert third.text == "created"
@@ -0,0 +1,25 @@
+"""
+Короткий конкурентный прогон benchmarks.loadtest: любой ответ с ошибкой или
+запрос дольше --timeout валит тест (так ловится, например, взаимная блокировка
+пула соединений, при которой запросы просто зависают).
+"""
+import subprocess
+import sys
+
+from benchmarks.loadtest import BASE_DIR
+from tests.conftest import subprocess_env
+
+# jwt_login не входит: bcrypt на одном ядре под нагрузкой дольше любого разумного таймаута
+SCENARIOS = ["product_get", "products_list", "product_create", "product_update",
+             "product_suggest", "order_get", "orders_page", "jwt_me"]
+
+
+def test_concurrent_loadtest_has_no_errors():
+    command = [
+        sys.executable, "-m", "benchmarks.loadtest",
+        "--products", "200", "--orders", "200", "--users", "50", "--posts", "50",
+        "--concurrency", "16", "--duration", "1", "--timeout", "10", "--fail-on-errors",
+        *(argument for name in SCENARIOS for argument in ("--scenario", name)),
+    ]
+    result = subprocess.run(command, cwd=BASE_DIR, env=subprocess_env(), capture_output=True, text=True, timeout=180)
+    assert result.returncode == 0, result.stderr[-2000:]
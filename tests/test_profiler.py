@@ -0,0 +1,59 @@
+import time
+
+import httpx
+import pytest
+
+from core.profiler import Profiler, ProfilerMiddleware, make_token, verify_token
+from tests.conftest import ADMIN_HEADERS, TEST_ENV
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "secret"
+
+
+def test_verify_token():
+    assert verify_token(SECRET, make_token(SECRET))
+    assert not verify_token("other", make_token(SECRET))
+    assert not verify_token(SECRET, make_token(SECRET, ttl=-1))
+    expires, _, _ = make_token(SECRET).partition(":")
+    assert not verify_token(SECRET, f"{expires}:{'0' * 64}")
+    assert not verify_token(SECRET, "garbage")
+
+
+def test_trigger_needs_valid_token():
+    def scope(token: str | None) -> dict:
+        return {"headers": [] if token is None else [(b"x-profile-token", token.encode())]}
+
+    registry = Profiler(sample_rate=0, interval_ms=5, max_profiles=10, max_depth=32, secret=SECRET)
+    assert registry.trigger(scope(make_token(SECRET))) == "token"
+    assert registry.trigger(scope(make_token("other"))) is None
+    assert registry.trigger(scope(None)) is None
+    # без секрета заголовок не действует
+    without_secret = Profiler(sample_rate=0, interval_ms=5, max_profiles=10, max_depth=32)
+    assert without_secret.trigger(scope(make_token(SECRET))) is None
+
+
+async def test_middleware_profiles_only_signed_requests():
+    async def app(scope, receive, send):
+        time.sleep(0.02)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    registry = Profiler(sample_rate=0, interval_ms=1, max_profiles=10, max_depth=32, secret=SECRET)
+    transport = httpx.ASGITransport(app=ProfilerMiddleware(app, registry))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        plain = await client.get("/")
+        forged = await client.get("/", headers={"x-profile-token": make_token("other")})
+        signed = await client.get("/", headers={"x-profile-token": make_token(SECRET)})
+    assert "x-profile-id" not in plain.headers and "x-profile-id" not in forged.headers
+    profile = registry.get(int(signed.headers["x-profile-id"]))
+    assert (profile.trigger, profile.status_code) == ("token", 200)
+    assert len(registry.profiles) == 1
+
+
+async def test_profile_is_listed_in_admin_api(client):
+    token = make_token(TEST_ENV["PROFILER__SECRET"])
+    response = await client.get("/products/", headers={"x-profile-token": token})
+    profile_id = int(response.headers["x-profile-id"])
+    assert (await client.get(f"/admin/profiler/{profile_id}", headers=ADMIN_HEADERS)).status_code == 200
+    assert (await client.get(f"/admin/profiler/{profile_id}")).status_code == 401
@@ -0,0 +1,74 @@
+"""
+Заказы при нескольких шардах (DB__SHARDS) - в подпроцессе: db_helper
+создаётся при импорте, а тесты в этом процессе работают с одним шардом.
+Пропускная способность проверяется бенчмарком: python -m benchmarks.shards --min-speedup
+"""
+import json
+import subprocess
+import sys
+
+from benchmarks.loadtest import BASE_DIR, write_keys
+from tests.conftest import subprocess_env
+
+
+PROBE = """
+import asyncio, json, httpx, main
+from sqlalchemy import select
+from core.models import Order, db_helper
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test/api/v1") as client:
+            products = [
+                (await client.post("/products/", json={"name": f"p{i}", "description": "d", "price": 10, "stock": 30})).json()
+                for i in range(2)
+            ]
+            ids = [product["id"] for product in products]
+            orders = []
+            for i in range(9):
+                response = await client.post("/orders/", json={"products": [{"product_id": ids[i % 2], "count": 3}]})
+                orders.append([response.status_code, response.json()["id"]])
+            short = await client.post("/orders/", json={"products": [{"product_id": ids[0], "count": 100}]})
+            details = [(await client.get(f"/orders/{order_id}/")).json() for _, order_id in orders]
+            page = (await client.get("/orders/", params={"limit": 100})).json()
+            by_shard = []
+            for shard in db_helper.shards:
+                async with shard.read_session_factory() as session:
+                    by_shard.append(list(await session.scalars(select(Order.id))))
+            print(json.dumps({
+                "orders": orders, "short": short.status_code, "page": [order["id"] for order in page],
+                "details": [detail["products_details"][0]["product"]["id"] for detail in details],
+                "by_shard": by_shard,
+                "stock": [(await client.get(f"/products/{product_id}/")).json()["stock"] for product_id in ids],
+            }))
+
+asyncio.run(run())
+"""
+
+
+def test_sharded_orders(tmp_path):
+    write_keys(tmp_path)
+    env = subprocess_env(
+        DB__URL=f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}",
+        DB__SHARDS="3",
+        AUTH_JWT__PRIVATE_KEY_PATH=str(tmp_path / "jwt-private.pem"),
+        AUTH_JWT__PUBLIC_KEY_PATH=str(tmp_path / "jwt-public.pem"),
+        CATALOG__PATH=str(tmp_path / "catalog.snapshot"),
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=60, check=True,
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    statuses, order_ids = zip(*result["orders"])
+    assert set(statuses) == {201}
+    # заказы распределены по всем шардам, и каждый лежит в шарде id % 3
+    by_shard = result["by_shard"]
+    assert all(by_shard)
+    assert all(order_id % 3 == index for index, ids in enumerate(by_shard) for order_id in ids)
+    assert sorted(sum(by_shard, [])) == sorted(order_ids)
+    assert result["page"] == sorted(order_ids)
+    assert len(result["details"]) == len(order_ids)
+    assert result["short"] == 409
+    # остаток - сумма долей всех шардов: 30 - 5 * 3 и 30 - 4 * 3
+    assert result["stock"] == [15, 18]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    assert await asyncio.gather(*(flight.do("key", load) for _ in range(5))) == [1] * 5
+    assert (flight.calls, flight.coalesced) == (1, 4)
+    # после завершения ключ свободен - следующий вызов выполняется заново
+    assert await flight.do("key", load) == 2
+
+
+async def test_error_is_shared_and_key_released():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert flight.calls == 1
+    assert not flight._inflight
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight("test")
+
+    async def load():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    first = asyncio.ensure_future(flight.do("key", load))
+    second = asyncio.ensure_future(flight.do("key", load))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "value"
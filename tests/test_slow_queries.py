@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from core.slow_queries import SlowQueryLog, normalize_sql, slow_query_log
+from tests.conftest import ADMIN_HEADERS
+
+pytestmark = pytest.mark.anyio
+
+
+def test_normalize_sql_groups_literals():
+    assert normalize_sql("SELECT * FROM t WHERE a = 'x''y' AND b IN (?, ?, ?)  AND c = 10") == \
+        "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?"
+    assert normalize_sql("INSERT INTO t (a) VALUES (?), (?), (?)") == "INSERT INTO t (a) VALUES (?), ..."
+
+
+def test_entries_are_grouped_and_bounded():
+    log = SlowQueryLog(threshold_ms=0, max_entries=2)
+    log.record("SELECT 1 FROM t WHERE id = 1", None, 0.2, "GET /a", None)
+    log.record("SELECT 1 FROM t WHERE id = 2", None, 0.4, "GET /b", None)
+    (entry,) = log.entries.values()
+    assert (entry.count, entry.max_time) == (2, 0.4)
+    assert entry.routes == {"GET /a": 1, "GET /b": 1} and entry.statement == "SELECT ? FROM t WHERE id = ?"
+    # сверх max_entries вытесняется давно не встречавшийся запрос
+    log.record("SELECT a FROM u", None, 0.1, None, None)
+    log.record("SELECT b FROM v", None, 0.1, None, None)
+    assert [entry.statement for entry in log.entries.values()] == ["SELECT a FROM u", "SELECT b FROM v"]
+
+
+async def test_slow_request_queries_are_logged(client, product, monkeypatch):
+    monkeypatch.setattr(slow_query_log, "threshold", 0)
+    slow_query_log.clear()
+    await client.get(f"/products/{product['id'] + 10 ** 6}/")
+    await asyncio.sleep(0.2)  # план снимается в потоке
+    response = await client.get("/admin/slow-queries", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    route = "GET /api/v1/products/{product_id}/"
+    (select_product,) = [query for query in queries
+                         if query["statement"].startswith("SELECT products.") and route in query["routes"]]
+    assert select_product["plan"]
+    assert (await client.get("/admin/slow-queries")).status_code == 401
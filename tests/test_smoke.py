@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+
+from tests.conftest import PREFIX
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch(client, product):
+    response = await client.post("/batch", json={"requests": [
+        {"id": "get", "path": f"/products/{product['id']}/"},
+        {"id": "list", "path": "/products/"},
+        {"id": "missing", "path": "/products/999999/"},
+        {"id": "patch", "method": "PATCH", "path": f"/products/{product['id']}/", "body": {"price": 55}},
+    ]})
+    assert response.status_code == 200, response.text
+    by_id = {item["id"]: item for item in response.json()["responses"]}
+    assert by_id["get"]["status"] == 200 and by_id["get"]["body"]["name"] == product["name"]
+    assert by_id["list"]["status"] == 200
+    assert by_id["missing"]["status"] == 404
+    assert by_id["patch"]["status"] == 200 and by_id["patch"]["body"]["price"] == 55
+
+    too_many = await client.post("/batch", json={"requests": [{"path": "/products/"}] * 50})
+    assert too_many.status_code == 422
+
+
+async def test_suggest(client, product):
+    from main import suggest_index
+
+    await suggest_index.build()
+    response = await client.get("/products/suggest", params={"prefix": "gaming m"})
+    assert response.status_code == 200
+    assert product["id"] in [item["id"] for item in response.json()]
+    assert (await client.get("/products/suggest", params={"prefix": ""})).status_code == 422
+
+
+async def read_events(app, path: str, action, until, timeout: float = 5.0) -> list[dict]:
+    # SSE не заканчивается: тело читается прямо из ASGI, action - после начала ответа,
+    # чтение - пока until(события) ложно
+    chunks: list[bytes] = []
+    received = asyncio.Event()
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200
+        chunks.append(message.get("body", b""))
+        received.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("test", 0), "server": ("test", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        async with asyncio.timeout(timeout):
+            await received.wait()
+            await action()
+            while True:
+                blocks = b"".join(chunks).decode().split("\n\n")
+                events = [dict(line.split(": ", 1) for line in block.splitlines())
+                          for block in blocks if block.startswith("id:")]
+                if until(events):
+                    break
+                received.clear()
+                await received.wait()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return events
+
+
+async def test_changes(app, client, product):
+    async def update():
+        await client.patch(f"/products/{product['id']}/", json={"price": 77})
+
+    def updated(events):
+        return [json.loads(event["data"]) for event in events if event["event"] == "updated"]
+
+    events = await read_events(app, f"{PREFIX}/products/changes", action=update, until=updated)
+    assert {"id": product["id"], "price": 77}.items() <= updated(events)[-1].items()
+    ids = [int(event["id"]) for event in events]
+    assert ids == sorted(ids)
+
+
+async def test_order_import(client, product):
+    body = (
+        "order_ref,product_id,count,promocode\n"
+        f"A,{product['id']},2,PROMO\n"
+        f"A,{product['id']},1,\n"
+        f"B,999999,1,\n"
+        f"C,{product['id']},x,\n"
+    )
+    response = await client.post("/orders/imports/", content=body, headers={"content-type": "text/csv"})
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+    for _ in range(50):
+        job = (await client.get(f"/orders/imports/{job_id}/")).json()
+        if job["status"] != "running":
+            break
+        await asyncio.sleep(0.1)
+    assert job["status"] == "done", job
+    assert job["orders_created"] == 1
+    errors = (await client.get(f"/orders/imports/{job_id}/errors/")).json()
+    assert [error["line"] for error in errors] == [4, 5]
+    stock = (await client.get(f"/products/{product['id']}/")).json()["stock"]
+    assert stock == product["stock"] - 3
+
+
+async def test_orders(client, product):
+    lines = [{"product_id": product["id"], "count": 2}]
+    created = await client.post("/orders/", json={"products": lines})
+    assert created.status_code == 201, created.text
+    order = created.json()
+    assert order["products_details"][0]["product"]["stock"] == product["stock"] - 2
+
+    fetched = await client.get(f"/orders/{order['id']}/")
+    assert fetched.status_code == 200 and fetched.json()["id"] == order["id"]
+    page = (await client.get("/orders/", params={"after_id": order["id"] - 1, "limit": 5})).json()
+    assert page[0]["id"] == order["id"]
+
+    short = await client.post("/orders/", json={"products": [{"product_id": product["id"], "count": 1000}]})
+    assert short.status_code == 409
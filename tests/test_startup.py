@@ -0,0 +1,40 @@
+"""Старт приложения в подпроцессе: настройки читаются при импорте main."""
+import subprocess
+import sys
+
+from benchmarks.loadtest import BASE_DIR, write_keys
+from tests.conftest import subprocess_env
+
+PROBE = """
+import asyncio, main
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(boot())
+"""
+
+
+def start(tmp_path, **overrides: str) -> subprocess.CompletedProcess:
+    write_keys(tmp_path)
+    env = subprocess_env(
+        DB__URL=f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}",
+        AUTH_JWT__PRIVATE_KEY_PATH=str(tmp_path / "jwt-private.pem"),
+        AUTH_JWT__PUBLIC_KEY_PATH=str(tmp_path / "jwt-public.pem"),
+        CATALOG__PATH=str(tmp_path / "catalog.snapshot"),
+        **overrides,
+    )
+    # timeout: упавшая проверка не должна оставлять процесс висеть
+    return subprocess.run([sys.executable, "-c", PROBE], cwd=BASE_DIR, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_fast_boot_refuses_database_behind_migrations(tmp_path):
+    result = start(tmp_path, FAST_BOOT="true")
+    assert result.returncode != 0
+    assert "does not match Alembic head" in result.stderr
+
+
+def test_regular_boot_creates_schema(tmp_path):
+    assert start(tmp_path).returncode == 0
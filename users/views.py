@@ -10,5 +10,5 @@ router = APIRouter(
 
 
 @router.post("/")
-def create_user(user: CreateUser):
+async def create_user(user: CreateUser):
     return crud.create_user(user_in=user)
\ No newline at end of file